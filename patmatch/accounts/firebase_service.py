@@ -6,6 +6,9 @@ import os
 
 logger = logging.getLogger(__name__)
 
+# الحد الأقصى لعدد الـ tokens في طلب multicast واحد لدى FCM
+MULTICAST_MAX_TOKENS = 500
+
 class FirebaseService:
     """خدمة Firebase للإشعارات"""
     
@@ -70,8 +73,8 @@ class FirebaseService:
             self.app = None
             self.is_initialized = False
     
-    def send_notification(self, fcm_token, title, body, data=None):
-        """إرسال إشعار لـ FCM token واحد"""
+    def send_notification(self, fcm_token, title, body, data=None, collapse_key=None):
+        """إرسال إشعار لـ FCM token واحد (collapse_key: الإشعارات بنفس المفتاح تستبدل بعضها على الجهاز)"""
         if not self.is_initialized:
             logger.warning("⚠️ Firebase not initialized - notification not sent")
             return False
@@ -83,7 +86,14 @@ class FirebaseService:
                     body=body
                 ),
                 data=data or {},
-                token=fcm_token
+                token=fcm_token,
+                android=messaging.AndroidConfig(
+                    collapse_key=collapse_key,
+                    notification=messaging.AndroidNotification(tag=collapse_key),
+                ) if collapse_key else None,
+                apns=messaging.APNSConfig(
+                    headers={'apns-collapse-id': collapse_key},
+                ) if collapse_key else None,
             )
             
             response = messaging.send(message)
@@ -117,7 +127,49 @@ class FirebaseService:
         except Exception as e:
             logger.error(f"❌ Failed to send multicast notification: {str(e)}")
             return False
-    
+
+    def send_multicast_batch(self, fcm_tokens, title, body, data=None):
+        """
+        إرسال إشعار لعدة FCM tokens (حتى MULTICAST_MAX_TOKENS) مع إرجاع نتيجة كل token.
+
+        Returns:
+            list[tuple[str, bool, str]]: (token, success, error_code) بنفس ترتيب fcm_tokens
+        """
+        if not fcm_tokens:
+            return []
+
+        if not self.is_initialized:
+            logger.warning("⚠️ Firebase not initialized - multicast batch not sent")
+            return [(token, False, 'not_initialized') for token in fcm_tokens]
+
+        if len(fcm_tokens) > MULTICAST_MAX_TOKENS:
+            raise ValueError(f"FCM multicast accepts at most {MULTICAST_MAX_TOKENS} tokens per call")
+
+        try:
+            message = messaging.MulticastMessage(
+                notification=messaging.Notification(
+                    title=title,
+                    body=body
+                ),
+                data=data or {},
+                tokens=list(fcm_tokens)
+            )
+            response = messaging.send_each_for_multicast(message)
+        except Exception as e:
+            logger.error(f"❌ Failed to send multicast batch: {str(e)}")
+            return [(token, False, 'request_failed') for token in fcm_tokens]
+
+        results = []
+        for token, item in zip(fcm_tokens, response.responses):
+            if item.success:
+                results.append((token, True, ''))
+            else:
+                error_code = getattr(item.exception, 'code', '') or type(item.exception).__name__
+                results.append((token, False, str(error_code)))
+
+        logger.info(f"✅ Multicast batch sent: {response.success_count} successful, {response.failure_count} failed")
+        return results
+
     def send_topic_notification(self, topic, title, body, data=None):
         """إرسال إشعار لموضوع معين"""
         if not self.is_initialized:
@@ -142,5 +194,28 @@ class FirebaseService:
             logger.error(f"❌ Failed to send topic notification: {str(e)}")
             return False
 
+    def subscribe_to_topic(self, fcm_tokens, topic):
+        """اشتراك tokens في موضوع (حتى 1000 token في الطلب)"""
+        return self._manage_topic(messaging.subscribe_to_topic, fcm_tokens, topic)
+
+    def unsubscribe_from_topic(self, fcm_tokens, topic):
+        """إلغاء اشتراك tokens من موضوع"""
+        return self._manage_topic(messaging.unsubscribe_from_topic, fcm_tokens, topic)
+
+    def _manage_topic(self, operation, fcm_tokens, topic):
+        if not self.is_initialized:
+            logger.warning("⚠️ Firebase not initialized - topic subscription not changed")
+            return False
+
+        try:
+            response = operation(list(fcm_tokens), topic)
+            if response.failure_count:
+                logger.warning(f"⚠️ Topic {topic}: {response.failure_count} token(s) failed")
+            return response.success_count > 0
+
+        except Exception as e:
+            logger.error(f"❌ Failed to update topic {topic}: {str(e)}")
+            return False
+
 # إنشاء instance واحد للاستخدام في التطبيق
 firebase_service = FirebaseService() 
\ No newline at end of file
@@ -0,0 +1,141 @@
+"""
+استعلامات خريطة العيادات على فهرس (latitude, longitude):
+- مستطيل العرض: العيادات مجمّعة داخل قاعدة البيانات في خلايا شبكة حسب مستوى التكبير،
+  والخلية التي فيها عيادة واحدة تُعاد كعيادة منفردة
+- أقرب العيادات لموقع مرتبة حسب المسافة
+
+حجم الاستجابة محدود مهما كان المستطيل: الخلية لا تصغر عن 1/MAX_GRID من عرضه أو ارتفاعه.
+"""
+import math
+
+import numpy as np
+from django.db.models import Avg, Count, Exists, FloatField, Max, Min, OuterRef, Q
+from django.db.models.functions import Cast, Floor
+
+from pets.matching import bounding_box, haversine_km_array
+from .models import Clinic, ClinicStaff
+
+# حجم الخلية بالبكسل على الشاشة (بلاطات 256 بكسل)
+CLUSTER_CELL_PIXELS = 64
+MAX_GRID = 16
+MAX_ZOOM = 22
+# من هذا المستوى تُعاد العيادات منفردة بدون تجميع
+CLUSTER_MAX_ZOOM = 17
+MAX_MAP_CLINICS = 300
+
+NEAREST_DEFAULT_RADIUS_KM = 25.0
+NEAREST_MAX_RADIUS_KM = 200.0
+NEAREST_DEFAULT_LIMIT = 20
+NEAREST_MAX_LIMIT = 50
+
+
+def visible_clinics():
+    """العيادات الظاهرة للعامة (نفس شرط قائمة العيادات) بدون join و distinct على فريق العمل."""
+    return Clinic.objects.filter(
+        Q(owner__isnull=False) | Exists(ClinicStaff.objects.filter(clinic=OuterRef('pk'))),
+        is_active=True,
+    )
+
+
+def parse_bbox(value):
+    """
+    'min_lng,min_lat,max_lng,max_lat' إلى tuple، أو ValueError إذا كانت غير صالحة.
+    min_lng أكبر من max_lng يعني أن المستطيل يعبر خط 180.
+    """
+    parts = [float(part) for part in value.split(',')]
+    if len(parts) != 4 or not all(math.isfinite(part) for part in parts):
+        raise ValueError(value)
+    min_lng, min_lat, max_lng, max_lat = parts
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lng <= 180 and -180 <= max_lng <= 180):
+        raise ValueError(value)
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def in_bbox(queryset, min_lng, min_lat, max_lng, max_lat):
+    queryset = queryset.filter(latitude__range=(min_lat, max_lat))
+    if min_lng <= max_lng:
+        return queryset.filter(longitude__range=(min_lng, max_lng))
+    return queryset.filter(Q(longitude__gte=min_lng) | Q(longitude__lte=max_lng))
+
+
+def cell_degrees(zoom, min_lng, min_lat, max_lng, max_lat):
+    width = max_lng - min_lng if min_lng <= max_lng else max_lng + 360 - min_lng
+    height = max_lat - min_lat
+    return max(CLUSTER_CELL_PIXELS * 360 / (256 * 2 ** zoom), width / MAX_GRID, height / MAX_GRID)
+
+
+def _coordinate(value):
+    return round(float(value), 6)
+
+
+def cluster_clinics(queryset, cell):
+    """
+    تجميع العيادات في خلايا cell درجة باستعلام GROUP BY واحد.
+
+    Returns:
+        tuple: (قائمة التجمعات، معرفات العيادات المنفردة)
+    """
+    cells = (
+        queryset
+        .annotate(
+            cell_lat=Floor(Cast('latitude', FloatField()) / cell),
+            cell_lng=Floor(Cast('longitude', FloatField()) / cell),
+        )
+        .values('cell_lat', 'cell_lng')
+        .annotate(
+            count=Count('id'),
+            clinic_id=Min('id'),
+            center_lat=Avg('latitude'),
+            center_lng=Avg('longitude'),
+            min_lat=Min('latitude'),
+            max_lat=Max('latitude'),
+            min_lng=Min('longitude'),
+            max_lng=Max('longitude'),
+        )
+        .order_by()
+    )
+    clusters = []
+    single_ids = []
+    for row in cells:
+        if row['count'] == 1:
+            single_ids.append(row['clinic_id'])
+            continue
+        clusters.append({
+            'latitude': _coordinate(row['center_lat']),
+            'longitude': _coordinate(row['center_lng']),
+            'count': row['count'],
+            'bounds': [
+                _coordinate(row['min_lng']), _coordinate(row['min_lat']),
+                _coordinate(row['max_lng']), _coordinate(row['max_lat']),
+            ],
+        })
+    clusters.sort(key=lambda cluster: -cluster['count'])
+    return clusters, single_ids
+
+
+def nearest_clinics(queryset, latitude, longitude, radius_km, limit):
+    """
+    أقرب العيادات داخل radius_km: فلتر المستطيل على الفهرس ثم المسافة الدقيقة بـ NumPy.
+
+    Returns:
+        list: [(clinic_id, distance_km), ...] مرتبة من الأقرب
+    """
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    queryset = queryset.filter(latitude__range=(min_lat, max_lat))
+    if min_lng is not None:
+        queryset = queryset.filter(longitude__range=(min_lng, max_lng))
+    else:
+        queryset = queryset.filter(longitude__isnull=False)
+    candidates = list(queryset.values_list('id', 'latitude', 'longitude'))
+    if not candidates:
+        return []
+
+    ids, lats, lngs = zip(*candidates)
+    distances = haversine_km_array(
+        math.radians(latitude),
+        math.radians(longitude),
+        np.radians(np.array(lats, dtype=float)),
+        np.radians(np.array(lngs, dtype=float)),
+    )
+    order = [index for index in np.argsort(distances, kind='stable') if distances[index] <= radius_km]
+    return [(ids[index], float(distances[index])) for index in order[:limit]]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinics', '0007_clinicpatientrecord_linked_pet'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='clinic',
+            index=models.Index(fields=['latitude', 'longitude'], name='clinic_location_idx'),
+        ),
+    ]
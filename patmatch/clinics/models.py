@@ -47,6 +47,10 @@ class Clinic(models.Model):
         verbose_name = "عيادة بيطرية"
         verbose_name_plural = "العيادات البيطرية"
         ordering = ['name']
+        indexes = [
+            # استعلامات الخريطة (مستطيل العرض وأقرب العيادات)
+            models.Index(fields=['latitude', 'longitude'], name='clinic_location_idx'),
+        ]
 
 
 class ClinicStaff(models.Model):
@@ -2,6 +2,9 @@ from django.contrib.auth import get_user_model
 from django.utils import timezone
 from rest_framework import serializers
 
+from pets.images import derivative_urls, name_from_media_url
+from pets.serializers import ImageVariantsField
+
 from .invite_service import build_invite_link, build_invite_message, create_invite_for_patient
 from .models import (
     Clinic,
@@ -61,22 +64,26 @@ def _calculate_age_text(date_of_birth):
 
 
 class ClinicSerializer(serializers.ModelSerializer):
+    logo_variants = ImageVariantsField(source='logo')
+
     class Meta:
         model = Clinic
         fields = [
             'id', 'name', 'description', 'address', 'phone', 'emergency_phone',
-            'email', 'website', 'logo', 'opening_hours', 'services', 'storefront_primary_color',
+            'email', 'website', 'logo', 'logo_variants', 'opening_hours', 'services', 'storefront_primary_color',
             'latitude', 'longitude', 'is_active', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'is_active', 'created_at', 'updated_at']
 
 
 class ClinicPublicSerializer(serializers.ModelSerializer):
+    logo_variants = ImageVariantsField(source='logo')
+
     class Meta:
         model = Clinic
         fields = [
             'id', 'name', 'description', 'address', 'phone',
-            'email', 'website', 'logo', 'opening_hours', 'services', 'storefront_primary_color'
+            'email', 'website', 'logo', 'logo_variants', 'opening_hours', 'services', 'storefront_primary_color'
         ]
         read_only_fields = fields
 
@@ -84,12 +91,13 @@ class ClinicPublicSerializer(serializers.ModelSerializer):
 class ClinicListSerializer(serializers.ModelSerializer):
     has_dashboard = serializers.SerializerMethodField()
     service_categories = serializers.SerializerMethodField()
+    logo_variants = ImageVariantsField(source='logo')
 
     class Meta:
         model = Clinic
         fields = [
             'id', 'name', 'description', 'address', 'phone', 'email', 'website',
-            'logo', 'opening_hours', 'services', 'storefront_primary_color',
+            'logo', 'logo_variants', 'opening_hours', 'services', 'storefront_primary_color',
             'latitude', 'longitude', 'is_active', 'has_dashboard', 'service_categories'
         ]
         read_only_fields = fields
@@ -111,6 +119,16 @@ class ClinicListSerializer(serializers.ModelSerializer):
         return [key for key in ordered if key in categories]
 
 
+class ClinicMapSerializer(serializers.ModelSerializer):
+    """بيانات مختصرة لعلامة العيادة على الخريطة"""
+    logo_variants = ImageVariantsField(source='logo')
+
+    class Meta:
+        model = Clinic
+        fields = ['id', 'name', 'address', 'phone', 'logo_variants', 'latitude', 'longitude']
+        read_only_fields = fields
+
+
 class ClinicStaffSerializer(serializers.ModelSerializer):
     user_full_name = serializers.SerializerMethodField()
     user_email = serializers.EmailField(source='user.email', read_only=True)
@@ -223,22 +241,33 @@ class ClinicProductSerializer(serializers.ModelSerializer):
     """Serializer for clinic storefront products"""
     category_display = serializers.CharField(source='get_category_display', read_only=True)
     image = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = ClinicProduct
         fields = [
             'id', 'clinic', 'name', 'description', 'category', 'category_display',
             'price', 'cost_price', 'stock_quantity', 'sku', 'low_stock_threshold',
-            'is_active', 'images', 'image',
+            'is_active', 'images', 'image', 'image_variants',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'clinic', 'category_display', 'image', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'clinic', 'category_display', 'image', 'image_variants', 'created_at', 'updated_at']
 
     def get_image(self, obj):
         if isinstance(obj.images, list) and obj.images:
             return obj.images[0]
         return None
 
+    def get_image_variants(self, obj):
+        image = self.get_image(obj)
+        if not image:
+            return None
+        # Only images stored under MEDIA_ROOT have derivatives; external URLs are returned as-is
+        name = name_from_media_url(image)
+        if not name:
+            return {'thumb': image, 'card': image, 'full': image}
+        return derivative_urls(name, request=self.context.get('request'))
+
 
 class StorefrontOrderItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
@@ -4,9 +4,10 @@ from django.dispatch import receiver
 from django.db.models import Q
 
 from accounts.models import User
+from pets.images import generate_derivatives_on_commit
 
 from .invite_service import claim_invites_for_user, create_invite_for_patient
-from .models import ClinicPatientRecord, ClinicClientRecord, VeterinaryAppointment
+from .models import Clinic, ClinicPatientRecord, ClinicClientRecord, VeterinaryAppointment
 from django.utils import timezone
 
 
@@ -88,3 +89,12 @@ def update_last_visit_when_appointment_completed(sender, instance: VeterinaryApp
     except Exception:
         # Avoid breaking save flow due to analytics/backfill issues
         pass
+
+
+@receiver(post_save, sender=Clinic)
+def build_clinic_logo_derivatives(sender, instance: Clinic, update_fields=None, **kwargs):
+    """Generate thumb/card/full derivatives for an uploaded clinic logo."""
+    if update_fields is not None and 'logo' not in update_fields:
+        return
+    if instance.logo:
+        generate_derivatives_on_commit([instance.logo.name])
@@ -1,3 +1,61 @@
+from decimal import Decimal
+
+from django.db.models.signals import post_save
 from django.test import TestCase
 
-# Create your tests here.
+from accounts.models import User
+from .models import Clinic
+from .signals import claim_invites_when_user_updates
+
+
+class ClinicMapTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        post_save.disconnect(receiver=claim_invites_when_user_updates, sender=User)
+
+    @classmethod
+    def tearDownClass(cls):
+        post_save.connect(receiver=claim_invites_when_user_updates, sender=User)
+        super().tearDownClass()
+
+    def setUp(self):
+        owner = User.objects.create_user(username='map-owner', email='map-owner@example.com', password='x')
+
+        def clinic(name, latitude, longitude, **fields):
+            return Clinic.objects.create(
+                owner=owner, name=name, address='a', phone='1', opening_hours='9-5', services='s',
+                latitude=Decimal(latitude), longitude=Decimal(longitude), **fields
+            )
+
+        # ثلاث عيادات متقاربة في القاهرة، وواحدة في الإسكندرية
+        self.downtown = clinic('Downtown', '30.0444', '31.2357')
+        self.garden = clinic('Garden City', '30.0370', '31.2310')
+        self.zamalek = clinic('Zamalek', '30.0609', '31.2197')
+        self.alex = clinic('Alexandria', '31.2001', '29.9187')
+        clinic('Hidden', '30.0450', '31.2350', is_active=False)
+        Clinic.objects.create(name='No dashboard', address='a', phone='1', opening_hours='9-5', services='s',
+                              latitude=Decimal('30.0440'), longitude=Decimal('31.2360'))
+
+    def test_viewport_clusters_at_low_zoom_and_splits_at_high_zoom(self):
+        response = self.client.get('/api/clinics/map/', {'bbox': '29,29,33,32', 'zoom': 7})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([cluster['count'] for cluster in data['clusters']], [3])
+        self.assertEqual([clinic['id'] for clinic in data['clinics']], [self.alex.id])
+
+        data = self.client.get('/api/clinics/map/', {'bbox': '31.2,30.03,31.24,30.07', 'zoom': 17}).json()
+        self.assertEqual(data['clusters'], [])
+        self.assertEqual(
+            {clinic['id'] for clinic in data['clinics']}, {self.downtown.id, self.garden.id, self.zamalek.id}
+        )
+
+    def test_nearest_sorted_by_distance_within_radius(self):
+        data = self.client.get('/api/clinics/map/', {'lat': '30.0450', 'lng': '31.2360', 'radius': 10}).json()
+        self.assertEqual([clinic['id'] for clinic in data['results']], [self.downtown.id, self.garden.id, self.zamalek.id])
+        self.assertLess(data['results'][0]['distance_km'], 0.2)
+
+    def test_invalid_parameters_are_rejected(self):
+        self.assertEqual(self.client.get('/api/clinics/map/').status_code, 400)
+        self.assertEqual(self.client.get('/api/clinics/map/', {'bbox': '1,2,3'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/clinics/map/', {'bbox': '29,29,33,32', 'zoom': 40}).status_code, 400)
@@ -46,6 +46,7 @@ from .serializers import (
     ClinicSerializer,
     ClinicPublicSerializer,
     ClinicListSerializer,
+    ClinicMapSerializer,
     ClinicServiceSerializer,
     ClinicProductSerializer,
     StorefrontOrderSerializer,
@@ -65,6 +66,7 @@ from .serializers import (
     ClinicInviteSerializer,
     VeterinarianSerializer,
 )
+from . import clinic_map
 from .invite_service import claim_invites_for_user, respond_to_invite, _build_phone_lookup_query, _normalize_email, _normalize_phone
 
 
@@ -551,6 +553,82 @@ class PublicClinicListView(APIView):
         serializer = ClinicListSerializer(page, many=True, context={'request': request})
         return paginator.get_paginated_response(serializer.data)
 
+class ClinicMapView(APIView):
+    """
+    عيادات الخريطة:
+    - ?bbox=min_lng,min_lat,max_lng,max_lat&zoom=12: تجمعات وعيادات منفردة داخل مستطيل العرض
+    - ?lat=..&lng=..[&radius=25&limit=20]: أقرب العيادات مرتبة حسب المسافة
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        params = request.query_params
+        clinics = clinic_map.visible_clinics()
+        if params.get('bbox'):
+            return self._viewport(request, clinics, params)
+        if params.get('lat') and params.get('lng'):
+            return self._nearest(request, clinics, params)
+        raise ValidationError({'detail': 'يجب تحديد bbox أو lat و lng'})
+
+    def _number(self, params, name, default, minimum, maximum, cast=float):
+        value = params.get(name)
+        if value in (None, ''):
+            return default
+        try:
+            number = cast(value)
+        except (TypeError, ValueError):
+            raise ValidationError({name: ['قيمة غير صالحة']})
+        if not minimum <= number <= maximum:
+            raise ValidationError({name: [f'يجب أن تكون القيمة بين {minimum} و {maximum}']})
+        return number
+
+    def _viewport(self, request, clinics, params):
+        try:
+            bbox = clinic_map.parse_bbox(params['bbox'])
+        except ValueError:
+            raise ValidationError({'bbox': ['الصيغة المطلوبة: min_lng,min_lat,max_lng,max_lat']})
+        zoom = self._number(params, 'zoom', 0, 0, clinic_map.MAX_ZOOM, cast=int)
+        clinics = clinic_map.in_bbox(clinics, *bbox)
+
+        if zoom >= clinic_map.CLUSTER_MAX_ZOOM:
+            clusters = []
+            singles = list(clinics.order_by('id')[:clinic_map.MAX_MAP_CLINICS + 1])
+            truncated = len(singles) > clinic_map.MAX_MAP_CLINICS
+            singles = singles[:clinic_map.MAX_MAP_CLINICS]
+        else:
+            clusters, single_ids = clinic_map.cluster_clinics(clinics, clinic_map.cell_degrees(zoom, *bbox))
+            singles = Clinic.objects.filter(id__in=single_ids).order_by('id')
+            truncated = False
+
+        return Response({
+            'zoom': zoom,
+            'clusters': clusters,
+            'clinics': ClinicMapSerializer(singles, many=True, context={'request': request}).data,
+            'truncated': truncated,
+        })
+
+    def _nearest(self, request, clinics, params):
+        latitude = self._number(params, 'lat', None, -90, 90)
+        longitude = self._number(params, 'lng', None, -180, 180)
+        radius_km = self._number(
+            params, 'radius', clinic_map.NEAREST_DEFAULT_RADIUS_KM, 0.1, clinic_map.NEAREST_MAX_RADIUS_KM
+        )
+        limit = self._number(
+            params, 'limit', clinic_map.NEAREST_DEFAULT_LIMIT, 1, clinic_map.NEAREST_MAX_LIMIT, cast=int
+        )
+
+        nearest = clinic_map.nearest_clinics(clinics, latitude, longitude, radius_km, limit)
+        by_id = Clinic.objects.in_bulk([clinic_id for clinic_id, _ in nearest])
+        results = []
+        for clinic_id, distance in nearest:
+            if clinic_id not in by_id:
+                continue
+            data = ClinicMapSerializer(by_id[clinic_id], context={'request': request}).data
+            data['distance_km'] = round(distance, 2)
+            results.append(data)
+        return Response({'results': results, 'radius_km': radius_km})
+
+
 class PublicStorefrontOrderView(APIView):
     permission_classes = [AllowAny]
 
@@ -1536,6 +1614,8 @@ class ClinicBroadcastStatsView(ClinicContextMixin, APIView):
         base_qs = Notification.objects.filter(
             type='clinic_broadcast',
             extra_data__clinic_id=str(clinic.id),
+            # no broadcast predates the clinic; lets PostgreSQL skip older partitions
+            created_at__gte=clinic.created_at,
         )
         total = base_qs.count()
         delivered_total = base_qs.filter(extra_data__delivered=True).count()
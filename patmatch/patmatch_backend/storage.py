@@ -0,0 +1,91 @@
+"""
+Content-hashed media storage and the cache policy that goes with it.
+
+Every file saved through a FileField gets its content hash in the name
+(``pets/main/rex.3f2a9c0d1b4e5f60.jpg``), so a stored key never changes content and
+can be served with a year-long ``immutable`` Cache-Control. Names that already carry
+a hash (chat images, presigned uploads) are saved as-is, and so are image derivatives
+(``<name>__<size>.webp``): their name is derived from the parent's, which is how they are
+looked up, so they follow the parent's hash (or lack of one for legacy originals).
+That also means a derivative can be re-encoded in place (``generate_image_derivatives
+--overwrite``), so derivatives get the short max-age even when the parent hash is in their
+name; nginx/nginx.conf applies the same rule to /media/.
+"""
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+
+from pets.images import is_derivative_name
+
+HASH_LENGTH = 16
+# A dot- or underscore-delimited run of 16+ hex chars in the file name (uuid4().hex and sha256 included)
+HASHED_NAME_RE = re.compile(r'(?:^|[._])[0-9a-f]{16,64}(?=$|[._])')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+IMMUTABLE_CACHE_CONTROL = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+MUTABLE_MAX_AGE = 60 * 60
+
+
+def is_hashed_name(name) -> bool:
+    return bool(HASHED_NAME_RE.search(os.path.basename(str(name or ''))))
+
+
+def is_immutable_name(name) -> bool:
+    return is_hashed_name(name) and not is_derivative_name(str(name or ''))
+
+
+def cache_control_for(name) -> str:
+    if is_immutable_name(name):
+        return IMMUTABLE_CACHE_CONTROL
+    return f'public, max-age={MUTABLE_MAX_AGE}'
+
+
+def content_hash(content, length=HASH_LENGTH) -> str:
+    """Hash of a django File (chunks() rewinds it first); the file is left rewound."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()[:length]
+
+
+def hashed_name(name: str, content) -> str:
+    directory, filename = os.path.split(name)
+    stem, extension = os.path.splitext(filename)
+    # Keep names well under the default FileField max_length (100)
+    stem = stem[:40] or 'file'
+    return os.path.join(directory, f'{stem}.{content_hash(content)}{extension.lower()}')
+
+
+class HashedMediaStorage(FileSystemStorage):
+    """FileSystemStorage that stores uploads under content-hashed, never-overwritten names."""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        if not is_hashed_name(name) and not is_derivative_name(name):
+            name = hashed_name(name, content)
+            if self.exists(name):
+                # Identical bytes are already stored under this name
+                return name
+        return super().save(name, content, max_length=max_length)
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """django.views.static.serve with the media cache policy applied."""
+    response = serve(request, path, document_root=document_root, show_indexes=show_indexes)
+    if response.status_code == 200:
+        patch_cache_control(response, **_cache_kwargs(path))
+    return response
+
+
+def _cache_kwargs(path):
+    if is_immutable_name(path):
+        return {'public': True, 'max_age': IMMUTABLE_MAX_AGE, 'immutable': True}
+    return {'public': True, 'max_age': MUTABLE_MAX_AGE}
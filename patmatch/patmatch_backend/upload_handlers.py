@@ -0,0 +1,143 @@
+"""
+Upload handler that keeps multipart uploads within a fixed memory ceiling.
+
+Small files stay in memory only while the process-wide budget allows it; anything
+larger (or anything arriving while the budget is exhausted) is streamed to a
+temporary file. Oversize parts and requests are rejected as soon as the limit is
+crossed instead of after the whole body has been read.
+"""
+import threading
+import weakref
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+MB = 1024 * 1024
+
+
+class UploadTooLarge(APIException, RequestDataTooBig):
+    """413 for DRF views; plain Django views treat it as RequestDataTooBig (400)."""
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'حجم الملفات المرفوعة أكبر من المسموح'
+    default_code = 'upload_too_large'
+
+
+class MemoryBudget:
+    """Bytes of in-memory uploads held by this process, shared by all requests/greenlets."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, size):
+        with self._lock:
+            if self.used + size > self.limit:
+                return False
+            self.used += size
+            return True
+
+    def release(self, size):
+        if size:
+            with self._lock:
+                self.used = max(0, self.used - size)
+
+
+memory_budget = MemoryBudget(getattr(settings, 'UPLOAD_PROCESS_MEMORY_BUDGET', 32 * MB))
+
+
+class StreamingUploadHandler(FileUploadHandler):
+    """
+    Replaces Django's MemoryFileUploadHandler + TemporaryFileUploadHandler pair.
+
+    Limits (settings):
+        FILE_UPLOAD_MAX_MEMORY_SIZE: largest file kept in memory
+        UPLOAD_MAX_PART_SIZE: largest single file part
+        UPLOAD_MAX_REQUEST_SIZE: total file bytes per request
+        UPLOAD_PROCESS_MEMORY_BUDGET: in-memory upload bytes per process
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.memory_threshold = settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        self.max_part_size = getattr(settings, 'UPLOAD_MAX_PART_SIZE', 50 * MB)
+        self.max_request_size = getattr(settings, 'UPLOAD_MAX_REQUEST_SIZE', 200 * MB)
+        self.request_bytes = 0
+        self._reset_file()
+
+    def _reset_file(self):
+        self.buffer = None
+        self.reserved = 0
+        self.temp_file = None
+        self.part_bytes = 0
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length and content_length > self.max_request_size:
+            raise UploadTooLarge()
+        return None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self._reset_file()
+        self.buffer = BytesIO()
+
+    def receive_data_chunk(self, raw_data, start):
+        size = len(raw_data)
+        self.part_bytes += size
+        self.request_bytes += size
+        if self.part_bytes > self.max_part_size or self.request_bytes > self.max_request_size:
+            self._discard()
+            raise UploadTooLarge()
+
+        if self.temp_file is None:
+            if self.part_bytes <= self.memory_threshold and memory_budget.reserve(size):
+                self.reserved += size
+                self.buffer.write(raw_data)
+                return None
+            self._spill_to_disk()
+        self.temp_file.write(raw_data)
+        return None
+
+    def _spill_to_disk(self):
+        self.temp_file = TemporaryUploadedFile(
+            self.file_name, self.content_type, 0, self.charset, self.content_type_extra
+        )
+        self.temp_file.write(self.buffer.getvalue())
+        self.buffer = None
+        memory_budget.release(self.reserved)
+        self.reserved = 0
+
+    def file_complete(self, file_size):
+        if self.temp_file is not None:
+            self.temp_file.seek(0)
+            self.temp_file.size = file_size
+            return self.temp_file
+
+        self.buffer.seek(0)
+        # The reservation lives as long as the in-memory file does
+        weakref.finalize(self.buffer, memory_budget.release, self.reserved)
+        uploaded = InMemoryUploadedFile(
+            file=self.buffer,
+            field_name=self.field_name,
+            name=self.file_name,
+            content_type=self.content_type,
+            size=file_size,
+            charset=self.charset,
+            content_type_extra=self.content_type_extra,
+        )
+        self._reset_file()
+        return uploaded
+
+    def _discard(self):
+        memory_budget.release(self.reserved)
+        if self.temp_file is not None:
+            self.temp_file.close()
+        self._reset_file()
+
+    def upload_interrupted(self):
+        self._discard()
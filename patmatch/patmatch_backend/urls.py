@@ -18,7 +18,8 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from django.views.static import serve
+
+from .storage import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -34,7 +35,7 @@ urlpatterns = [
 if settings.DEBUG:
     # Add explicit media file serving
     urlpatterns += [
-        path('media/<path:path>', serve, {
+        path('media/<path:path>', serve_media, {
             'document_root': settings.MEDIA_ROOT,
             'show_indexes': True,
         }),
@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import Breed, Pet, PetImage, BreedingRequest, Favorite, VeterinaryClinic, Notification, ChatRoom, AdoptionRequest
+from .models import (
+    Breed, Pet, PetImage, BreedingRequest, Favorite, VeterinaryClinic, Notification, ChatRoom, AdoptionRequest,
+    PushCampaign, UploadSession, PetMatchSuggestion, NotificationReadMarker, DeferredPush,
+    PushTopicSubscription, PendingChatPush,
+)
 
 @admin.register(Breed)
 class BreedAdmin(admin.ModelAdmin):
@@ -164,3 +168,52 @@ class AdoptionRequestAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('adopter', 'pet')
+
+
+@admin.register(PushCampaign)
+class PushCampaignAdmin(admin.ModelAdmin):
+    list_display = ['key', 'status', 'last_user_id', 'notifications_created', 'push_sent', 'push_failed', 'updated_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['key', 'title']
+    readonly_fields = ['created_at', 'updated_at', 'completed_at']
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ['key', 'purpose', 'user', 'pet', 'field_name', 'size', 'status', 'created_at', 'completed_at']
+    list_filter = ['purpose', 'status', 'created_at']
+    search_fields = ['key', 'user__email']
+    raw_id_fields = ['user', 'pet']
+    readonly_fields = ['public_id', 'created_at', 'completed_at']
+
+
+@admin.register(PetMatchSuggestion)
+class PetMatchSuggestionAdmin(admin.ModelAdmin):
+    list_display = ['pet', 'partner', 'rank', 'distance_km', 'computed_at']
+    list_filter = ['computed_at']
+    raw_id_fields = ['pet', 'partner']
+
+
+@admin.register(NotificationReadMarker)
+class NotificationReadMarkerAdmin(admin.ModelAdmin):
+    list_display = ['user', 'chat_room', 'read_through']
+    raw_id_fields = ['user', 'chat_room']
+
+
+@admin.register(DeferredPush)
+class DeferredPushAdmin(admin.ModelAdmin):
+    list_display = ['user', 'notification_type', 'title', 'created_at']
+    list_filter = ['notification_type']
+    raw_id_fields = ['user']
+
+
+@admin.register(PendingChatPush)
+class PendingChatPushAdmin(admin.ModelAdmin):
+    list_display = ['notification_id', 'due_at']
+    search_fields = ['=notification_id']
+
+
+@admin.register(PushTopicSubscription)
+class PushTopicSubscriptionAdmin(admin.ModelAdmin):
+    list_display = ['user', 'topics', 'updated_at']
+    raw_id_fields = ['user']
@@ -0,0 +1,251 @@
+"""
+تشغيل حملات الإشعارات الجماعية على دفعات قابلة للاستئناف.
+
+يتم المرور على المستخدمين بترتيب المفتاح الأساسي (keyset) على دفعات، ويُرسل
+إشعار الدفع لكل دفعة عبر FCM multicast (حتى 500 token في الطلب الواحد).
+يُحفظ مؤشر التقدم ونتيجة كل token في PushCampaign / PushCampaignDelivery بحيث
+يمكن إعادة تشغيل الحملة بعد انقطاعها دون تكرار الإشعارات المُنشأة.
+"""
+import hashlib
+import json
+import logging
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.firebase_service import MULTICAST_MAX_TOKENS, firebase_service
+from .models import Notification, PushCampaign, PushCampaignDelivery
+from .realtime import publish_badges_on_commit
+
+logger = logging.getLogger(__name__)
+
+
+def default_campaign_key(prefix, title, message, extra_data):
+    """معرف مشتق من محتوى الرسالة: تغيير النص يبدأ حملة جديدة، ونفس النص يستأنف الحملة السابقة."""
+    content = json.dumps([title, message, extra_data], ensure_ascii=False, sort_keys=True)
+    return f"{prefix}_{hashlib.sha256(content.encode()).hexdigest()[:16]}"
+
+
+def is_campaign_completed(key):
+    return PushCampaign.objects.filter(key=key, status='completed').exists()
+
+
+@dataclass
+class CampaignChunk:
+    last_user_id: int
+    deliveries: List[PushCampaignDelivery]
+    done: bool = False
+    results: List[tuple] = field(default_factory=list)
+
+
+class CampaignRunner:
+    """
+    مشغّل عام لحملات الإشعارات.
+
+    Args:
+        key: معرف الحملة (نفس المعرف يستأنف الحملة من آخر مؤشر محفوظ)
+        title: عنوان الإشعار
+        message: محتوى الإشعار
+        extra_data: بيانات إضافية تُحفظ مع الإشعار وتُرسل مع إشعار الدفع
+        chunk_size: عدد المستخدمين في الدفعة الواحدة (بحد أقصى 500)
+        concurrency: عدد دفعات multicast المرسلة بالتوازي
+        create_notifications: إنشاء إشعار داخل التطبيق لكل مستخدم (بـ bulk_create، انظر _prepare_chunk)
+        on_progress: دالة اختيارية تُستدعى بعد كل دفعة مع كائن الحملة
+    """
+
+    def __init__(
+        self,
+        key,
+        title,
+        message,
+        extra_data=None,
+        notification_type='system_message',
+        chunk_size=MULTICAST_MAX_TOKENS,
+        concurrency=4,
+        create_notifications=True,
+        on_progress: Optional[Callable[[PushCampaign], None]] = None,
+    ):
+        self.key = key
+        self.title = title
+        self.message = message
+        self.extra_data = extra_data or {}
+        self.notification_type = notification_type
+        self.chunk_size = max(1, min(int(chunk_size), MULTICAST_MAX_TOKENS))
+        self.concurrency = max(1, int(concurrency))
+        self.create_notifications = create_notifications
+        self.on_progress = on_progress
+
+    def get_campaign(self, restart=False):
+        campaign, created = PushCampaign.objects.get_or_create(
+            key=self.key,
+            defaults={'title': self.title, 'message': self.message},
+        )
+        if restart and not created:
+            campaign.deliveries.all().delete()
+            campaign.status = 'running'
+            campaign.last_user_id = 0
+            campaign.notifications_created = 0
+            campaign.push_sent = 0
+            campaign.push_failed = 0
+            campaign.completed_at = None
+            campaign.title = self.title
+            campaign.message = self.message
+            campaign.save()
+        return campaign
+
+    def run(self, audience, restart=False):
+        """تشغيل الحملة (أو استئنافها) على queryset المستخدمين المستهدفين."""
+        campaign = self.get_campaign(restart=restart)
+        if campaign.status == 'completed':
+            logger.info("Campaign %s already completed; nothing to do", campaign.key)
+            return campaign
+
+        send_push = firebase_service.is_initialized
+        if not send_push:
+            logger.warning("Firebase not initialised; campaign %s will only create notifications", campaign.key)
+
+        queryset = audience.order_by('pk').only('id', 'fcm_token')
+        cursor = campaign.last_user_id
+        exhausted = False
+        in_order = deque()
+        pending = {}
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while True:
+                while not exhausted and len(pending) < self.concurrency:
+                    users = list(queryset.filter(pk__gt=cursor)[:self.chunk_size])
+                    if not users:
+                        exhausted = True
+                        break
+                    cursor = users[-1].pk
+                    chunk = self._prepare_chunk(campaign, users, send_push)
+                    in_order.append(chunk)
+                    to_send = [d for d in chunk.deliveries if d.status == 'pending']
+                    if to_send:
+                        pending[executor.submit(self._send_batch, [d.fcm_token for d in to_send])] = chunk
+                    else:
+                        self._finish_chunk(campaign, chunk)
+
+                if pending:
+                    done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        chunk = pending.pop(future)
+                        chunk.results = future.result()
+                        self._finish_chunk(campaign, chunk)
+
+                self._advance_cursor(campaign, in_order)
+
+                if exhausted and not pending:
+                    break
+
+        campaign.status = 'completed'
+        campaign.completed_at = timezone.now()
+        campaign.save(update_fields=['status', 'completed_at', 'updated_at'])
+        campaign.refresh_from_db()
+        return campaign
+
+    def _prepare_chunk(self, campaign, users, send_push):
+        """
+        إنشاء الإشعارات وسجلات الإرسال المعلقة لمستخدمي الدفعة (مرة واحدة لكل مستخدم).
+
+        الإشعارات تُنشأ بـ bulk_create، أي بدون Notification.create_notification وبدون إشارات
+        post_save: أي hook يُضاف على هذين المسارين لا يعمل لإشعارات الحملات (العدادات فقط
+        تُنشر هنا صراحة عبر publish_badges_on_commit).
+        """
+        user_ids = [user.pk for user in users]
+        existing = dict(
+            PushCampaignDelivery.objects.filter(campaign=campaign, user_id__in=user_ids)
+            .values_list('user_id', 'status')
+        )
+        new_users = [user for user in users if user.pk not in existing]
+
+        if new_users:
+            with transaction.atomic():
+                if self.create_notifications:
+                    Notification.objects.bulk_create([
+                        Notification(
+                            user_id=user.pk,
+                            type=self.notification_type,
+                            title=self.title,
+                            message=self.message,
+                            extra_data=self.extra_data,
+                        )
+                        for user in new_users
+                    ])
+                    PushCampaign.objects.filter(pk=campaign.pk).update(
+                        notifications_created=F('notifications_created') + len(new_users)
+                    )
+                    # bulk_create لا يرسل post_save، فتُحدَّث العدادات للمتصلين مباشرة
+                    publish_badges_on_commit(new_users)
+
+                rows = []
+                for user in new_users:
+                    token = (user.fcm_token or '').strip()
+                    if not send_push:
+                        rows.append(PushCampaignDelivery(
+                            campaign=campaign, user_id=user.pk, fcm_token=token,
+                            status='skipped', error_code='firebase_unavailable',
+                        ))
+                    elif not token:
+                        rows.append(PushCampaignDelivery(
+                            campaign=campaign, user_id=user.pk,
+                            status='skipped', error_code='no_token',
+                        ))
+                    else:
+                        rows.append(PushCampaignDelivery(
+                            campaign=campaign, user_id=user.pk, fcm_token=token, status='pending',
+                        ))
+                PushCampaignDelivery.objects.bulk_create(rows)
+
+        # السجلات المعلقة من تشغيل سابق منقطع يُعاد إرسالها أيضاً
+        deliveries = list(
+            PushCampaignDelivery.objects.filter(campaign=campaign, user_id__in=user_ids, status='pending')
+        ) if send_push else []
+        return CampaignChunk(last_user_id=user_ids[-1], deliveries=deliveries)
+
+    def _send_batch(self, tokens):
+        payload = {key: str(value) for key, value in self.extra_data.items()}
+        payload.update({'title': self.title, 'body': self.message})
+        try:
+            return firebase_service.send_multicast_batch(tokens, self.title, self.message, payload)
+        except Exception as exc:
+            logger.exception("Multicast batch failed for campaign %s: %s", self.key, exc)
+            return [(token, False, 'request_failed') for token in tokens]
+
+    def _finish_chunk(self, campaign, chunk):
+        sent = failed = 0
+        if chunk.deliveries:
+            outcomes: Dict[str, tuple] = {token: (ok, error) for token, ok, error in chunk.results}
+            for delivery in chunk.deliveries:
+                ok, error = outcomes.get(delivery.fcm_token, (False, 'missing_result'))
+                delivery.status = 'sent' if ok else 'failed'
+                delivery.error_code = error
+                if ok:
+                    sent += 1
+                else:
+                    failed += 1
+            PushCampaignDelivery.objects.bulk_update(chunk.deliveries, ['status', 'error_code'])
+            PushCampaign.objects.filter(pk=campaign.pk).update(
+                push_sent=F('push_sent') + sent,
+                push_failed=F('push_failed') + failed,
+            )
+        chunk.done = True
+
+    def _advance_cursor(self, campaign, in_order):
+        """تقديم المؤشر فقط عبر الدفعات المكتملة المتتالية حتى يبقى الاستئناف آمناً."""
+        advanced = False
+        while in_order and in_order[0].done:
+            campaign.last_user_id = in_order.popleft().last_user_id
+            advanced = True
+        if advanced:
+            PushCampaign.objects.filter(pk=campaign.pk).update(
+                last_user_id=campaign.last_user_id, updated_at=timezone.now()
+            )
+            if self.on_progress:
+                campaign.refresh_from_db()
+                self.on_progress(campaign)
@@ -0,0 +1,127 @@
+"""
+كاش سياق المحادثة (ChatRoom.get_chat_context) لكل غرفة، حتى لا يُعاد بناؤه عند كل فتح للمحادثة.
+
+لكل عنصر يعتمد عليه السياق (الغرفة، طلبها، الحيوان وسلالته، المشاركون، وبيانات العيادة) إصدار
+في الكاش يتغير من الإشارات بعد حفظه. العنصر المخزن يحمل إصدارات اعتمادياته ولا يُستخدم إلا إذا
+طابقت كلها، فقراءته جلبان من الكاش بلا أي استعلام. التعديلات عبر update() لا تطلق إشارات،
+لذلك للعنصر مدة قصوى كاحتياط.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+CHAT_CONTEXT_CACHE_SECONDS = 3600
+# الحقول التي تظهر في السياق؛ حفظ غيرها (last_login، fcm_token، ...) لا يُبطل الكاش
+USER_CONTEXT_FIELDS = {'first_name', 'last_name', 'email', 'phone', 'is_verified'}
+PET_CONTEXT_FIELDS = {'name', 'breed', 'pet_type', 'main_image', 'owner'}
+
+CHAT_ROOM_CONTEXT_RELATED = (
+    'breeding_request__requester',
+    'breeding_request__target_pet__owner',
+    'breeding_request__target_pet__breed',
+    'adoption_request__adopter',
+    'adoption_request__pet__owner',
+    'adoption_request__pet__breed',
+    'clinic_patient__clinic',
+    'clinic_patient__owner',
+    'clinic_patient__linked_user',
+    'clinic_staff',
+)
+
+
+def _entry_key(chat_room_id):
+    return f'pets:chat_context:{chat_room_id}'
+
+
+def _version_key(model_name, pk):
+    return f'pets:chat_context:version:{model_name}:{pk}'
+
+
+def bump_context_version(model_name, pk):
+    # قيمة عشوائية لا عداد: إذا حُذف المفتاح من الكاش لا يمكن أن يعود لقيمة قديمة مخزنة
+    cache.set(_version_key(model_name, pk), uuid.uuid4().hex, None)
+
+
+def bump_context_version_on_commit(model_name, pk):
+    """بعد نجاح المعاملة، حتى لا يُخزن قارئ متزامن البيانات القديمة تحت الإصدار الجديد."""
+    if pk:
+        transaction.on_commit(lambda: bump_context_version(model_name, pk))
+
+
+def context_dependencies(chat_room):
+    keys = [_version_key('chatroom', chat_room.pk)]
+
+    def depend(model_name, pk):
+        if pk:
+            keys.append(_version_key(model_name, pk))
+
+    def depend_on_pet(pet):
+        if pet is not None:
+            depend('pet', pet.pk)
+            depend('breed', pet.breed_id)
+            depend('user', pet.owner_id)
+
+    if chat_room.breeding_request_id:
+        breeding_request = chat_room.breeding_request
+        depend('breedingrequest', breeding_request.pk)
+        depend('user', breeding_request.requester_id)
+        depend_on_pet(breeding_request.target_pet)
+    elif chat_room.adoption_request_id:
+        adoption_request = chat_room.adoption_request
+        depend('adoptionrequest', adoption_request.pk)
+        depend('user', adoption_request.adopter_id)
+        depend_on_pet(adoption_request.pet)
+    elif chat_room.clinic_patient_id:
+        patient = chat_room.clinic_patient
+        depend('clinicpatientrecord', patient.pk)
+        depend('clinic', patient.clinic_id)
+        depend('clinicclientrecord', patient.owner_id)
+        depend('user', patient.linked_user_id)
+        depend('user', chat_room.clinic_staff_id)
+    return keys
+
+
+def _current_versions(keys):
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # add لا يستبدل إصداراً كتبته عملية أخرى في هذه الأثناء
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, None)
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def cached_chat_context(chat_room_id):
+    """
+    العنصر المخزن إن كان صالحاً، وإلا None.
+
+    Returns:
+        dict: {'data': بيانات ChatContextSerializer، 'participant_ids': [...]}
+    """
+    entry = cache.get(_entry_key(chat_room_id))
+    if entry is None or cache.get_many(list(entry['versions'])) != entry['versions']:
+        return None
+    return entry
+
+
+def store_chat_context(chat_room):
+    """بناء السياق من الغرفة (يُفضل تحميلها مع CHAT_ROOM_CONTEXT_RELATED) وتخزينه."""
+    # الإصدارات تُقرأ قبل بناء السياق: أي تعديل بعدها يُبطل العنصر بدلاً من أن يضيع
+    versions = _current_versions(context_dependencies(chat_room))
+    entry = {
+        'versions': versions,
+        'participant_ids': [participant.id for participant in chat_room.get_participants()],
+        'data': {
+            'id': chat_room.id,
+            'firebase_chat_id': chat_room.firebase_chat_id,
+            'chat_context': chat_room.get_chat_context(),
+        },
+    }
+    cache.set(_entry_key(chat_room.pk), entry, CHAT_CONTEXT_CACHE_SECONDS)
+    return entry
+
+
+def chat_context_entry(chat_room):
+    return cached_chat_context(chat_room.pk) or store_chat_context(chat_room)
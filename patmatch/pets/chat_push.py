@@ -0,0 +1,97 @@
+"""
+إشعارات الدفع لرسائل المحادثة مع تأخير (debounce) لكل (مستقبل، محادثة).
+
+أول رسالة تُرسل فوراً وتفتح نافذة CHAT_PUSH_DEBOUNCE_SECONDS. الرسائل داخل النافذة تحدّث
+الإشعار داخل التطبيق فقط وتسجّله في PendingChatPush، فيُرسل عند نهاية النافذة push واحد
+بالحالة الأخيرة ("N رسائل جديدة"): مع الرسالة التالية بعد النافذة، أو بالأمر
+flush_chat_pushes (كل دقيقة) إذا توقفت المحادثة.
+
+PendingChatPush يحفظ notification_id بلا ForeignKey (جدول الإشعارات مقسّم)، فالإشعار
+المحذوف في الأثناء يُتجاهل ويُحذف صفه عند الإرسال.
+"""
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Notification, PendingChatPush
+from .notifications import _send_push_notification
+from .read_state import ReadState
+
+
+def _window_key(user_id, chat_room_id):
+    return f'pets:chat-push:{user_id}:{chat_room_id}'
+
+
+def _open_window(notification):
+    window = settings.CHAT_PUSH_DEBOUNCE_SECONDS
+    cache.set(_window_key(notification.user_id, notification.related_chat_room_id), time.time() + window, window)
+
+
+def _send(notification):
+    extra = notification.extra_data
+    return _send_push_notification(
+        notification.user,
+        notification.title,
+        notification.message,
+        {
+            'type': 'chat_message_received',
+            'chat_id': extra.get('chat_id'),
+            'sender_id': str(extra.get('sender_id')),
+            'sender_name': extra.get('sender_name'),
+            'message_count': str(extra.get('message_count', 1)),
+        },
+        collapse_key=f'chat-{notification.related_chat_room_id}',
+    )
+
+
+def push_chat_notification(notification, new_window=False):
+    """
+    إرسال push للإشعار إذا لم تكن هناك نافذة مفتوحة (أو new_window لإشعار جديد)، وإلا تعليقه
+    حتى نهاية النافذة.
+
+    Returns:
+        bool: هل أُرسل الآن
+    """
+    window = settings.CHAT_PUSH_DEBOUNCE_SECONDS
+    key = _window_key(notification.user_id, notification.related_chat_room_id)
+    now = time.time()
+    if new_window:
+        _open_window(notification)
+    elif not cache.add(key, now + window, window):
+        window_end = cache.get(key) or now
+        PendingChatPush.objects.update_or_create(
+            notification_id=notification.pk,
+            defaults={'due_at': datetime.fromtimestamp(window_end, tz=dt_timezone.utc)},
+        )
+        return False
+
+    PendingChatPush.objects.filter(notification_id=notification.pk).delete()
+    _send(notification)
+    return True
+
+
+def flush_pending_chat_pushes(now=None):
+    """
+    إرسال الحالة الأخيرة للإشعارات المعلّقة التي انتهت نافذتها (ما لم تُقرأ في الأثناء).
+
+    Returns:
+        int: عدد الإشعارات المرسلة
+    """
+    sent = 0
+    due = list(PendingChatPush.objects.filter(due_at__lte=now or timezone.now()).values_list('id', 'notification_id'))
+    if not due:
+        return sent
+    due_ids, notification_ids = zip(*due)
+    # الصفوف المستحقة كلها تُحذف، ومنها ما حُذف إشعاره (انتهت مدة الاحتفاظ أو حُذفت المحادثة)
+    PendingChatPush.objects.filter(id__in=due_ids).delete()
+    notifications = Notification.objects.filter(id__in=notification_ids).select_related('user')
+    for notification in notifications:
+        if ReadState(notification.user).is_read(notification):
+            continue
+        _open_window(notification)
+        _send(notification)
+        sent += 1
+    return sent
@@ -5,7 +5,8 @@ from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
 from django.db.models import Q
-from .models import Notification, BreedingRequest, AdoptionRequest, ChatRoom
+from .models import BreedingRequest, AdoptionRequest, ChatRoom
+from .read_state import ReadState, unread_messages_sum
 from accounts.models import User
 import logging
 
@@ -235,24 +236,18 @@ def send_daily_unread_messages_reminder():
             if not user.email:
                 continue
                 
-            # عد الرسائل غير المقروءة لهذا المستخدم
-            unread_count = Notification.objects.filter(
-                user=user,
+            # عد الرسائل غير المقروءة لهذا المستخدم (مع علامات القراءة)
+            unread_notifications = ReadState(user).unread().filter(
                 type='chat_message_received',
-                is_read=False,
                 created_at__date=timezone.now().date()
-            ).count()
+            )
+            unread_count = unread_notifications.aggregate(count=unread_messages_sum())['count']
             
             if unread_count == 0:
                 continue
             
             # الحصول على أسماء المرسلين
-            unread_notifications = Notification.objects.filter(
-                user=user,
-                type='chat_message_received',
-                is_read=False,
-                created_at__date=timezone.now().date()
-            ).select_related('related_chat_room')
+            unread_notifications = unread_notifications.select_related('related_chat_room')
             
             senders = set()
             for notification in unread_notifications:
@@ -0,0 +1,115 @@
+"""
+كاش قصير المدة لاستجابات قائمة الحيوانات للزوار غير المسجلين.
+
+المفتاح مبني على معاملات الطلب بعد توحيدها (ترتيبها، حذف الفارغ منها، وتقريب
+الإحداثيات إلى خلية شبكة)، ويتضمن رقم إصدار يُزاد عند حفظ أو حذف أي حيوان أو سلالة
+فتصبح كل المفاتيح القديمة غير مستخدمة دون الحاجة لحذفها.
+
+روابط next/previous لا تُخزن كما هي لأنها مبنية من عنوان أول طالب (إحداثياته الدقيقة
+والـ host)؛ يُخزن منها رقم الصفحة أو المؤشر فقط ويُعاد بناؤها من عنوان كل طلب.
+"""
+import hashlib
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from urllib.parse import parse_qs, urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+VERSION_KEY = 'pets:feed:version'
+
+LATITUDE_PARAMS = ('user_lat', 'lat', 'user_latitude', 'latitude', 'current_lat')
+LONGITUDE_PARAMS = ('user_lng', 'lng', 'user_longitude', 'longitude', 'current_lng')
+
+LINK_FIELDS = ('next', 'previous')
+# معاملات الترقيم في KeysetPagination
+PAGE_PARAMS = ('page', 'cursor')
+
+
+def first_param(params, names):
+    for name in names:
+        value = params.get(name)
+        if value:
+            return value
+    return None
+
+
+def snap_coordinate(value):
+    """تقريب الإحداثية إلى أقرب خلية (PET_FEED_CACHE_GRID درجة)، أو None إذا كانت غير صالحة."""
+    try:
+        grid = Decimal(str(settings.PET_FEED_CACHE_GRID))
+        return str((Decimal(str(value)) / grid).quantize(Decimal(1), rounding=ROUND_HALF_UP) * grid)
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+
+
+def is_cacheable(request):
+    return (
+        settings.PET_FEED_CACHE_SECONDS > 0
+        and request.method == 'GET'
+        and not request.user.is_authenticated
+    )
+
+
+def feed_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def bump_feed_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # المفتاح غير موجود (أول تشغيل أو تم مسح الكاش)
+        cache.add(VERSION_KEY, 1, timeout=None)
+
+
+def feed_cache_key(request):
+    params = request.query_params
+    coordinate_names = set(LATITUDE_PARAMS) | set(LONGITUDE_PARAMS)
+    items = sorted(
+        (name, value)
+        for name in params
+        if name not in coordinate_names
+        for value in params.getlist(name)
+        if value != ''
+    )
+    lat = snap_coordinate(first_param(params, LATITUDE_PARAMS))
+    lng = snap_coordinate(first_param(params, LONGITUDE_PARAMS))
+    if lat is not None and lng is not None:
+        items.append(('@cell', f'{lat},{lng}'))
+
+    digest = hashlib.sha1(repr((request.path, items)).encode()).hexdigest()
+    return f'pets:feed:{feed_version()}:{digest}'
+
+
+def strip_links(data):
+    """نسخة من بيانات الصفحة للتخزين: كل رابط يُستبدل بمعاملات الترقيم فيه."""
+    data = dict(data)
+    for field in LINK_FIELDS:
+        link = data.get(field)
+        if link:
+            query = parse_qs(urlsplit(link).query)
+            data[field] = {name: query[name][-1] for name in PAGE_PARAMS if name in query}
+    return data
+
+
+def restore_links(request, data):
+    """عكس strip_links: بناء الروابط من عنوان هذا الطلب."""
+    data = dict(data)
+    url = request.build_absolute_uri()
+    for field in LINK_FIELDS:
+        page_params = data.get(field)
+        if page_params is None:
+            continue
+        link = url
+        for name in PAGE_PARAMS:
+            if name in page_params:
+                link = replace_query_param(link, name, page_params[name])
+            else:
+                link = remove_query_param(link, name)
+        data[field] = link
+    return data
@@ -0,0 +1,253 @@
+"""
+مشتقات الصور (thumb / card / full) المحفوظة بجانب الصورة الأصلية.
+
+تُنشأ المشتقات بعد رفع الصورة (إشارات post_save ورفع صور المحادثة) أو لاحقاً عبر
+الأمر generate_image_derivatives للصور القديمة. يُحفظ كل مشتق في نفس مجلد الأصل
+باسم <الاسم>__<الحجم>.webp (أو jpg إذا لم يدعم Pillow صيغة WebP)، وتعرض
+الـ serializers روابطها في حقول *_variants بدلاً من تحميل الصورة الأصلية في القوائم.
+
+المشتقات الموجودة تُسجل في الكاش عند إنشائها، فعرض الروابط لا يسأل التخزين عن أي ملف.
+إذا فُقد السجل (مسح الكاش) تُعرض روابط الأصل حتى يُشغّل generate_image_derivatives
+الذي يسجل المشتقات الموجودة دون إعادة إنشائها.
+"""
+import hashlib
+import io
+import logging
+import os
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+logger = logging.getLogger(__name__)
+
+# أطول ضلع بالبكسل لكل مشتق، مرتبة من الأكبر إلى الأصغر
+DERIVATIVE_SIZES = {
+    'full': 1600,
+    'card': 600,
+    'thumb': 200,
+}
+DERIVATIVE_QUALITY = {
+    'full': 82,
+    'card': 78,
+    'thumb': 70,
+}
+DERIVATIVE_FORMAT = 'WEBP' if features.check('webp') else 'JPEG'
+DERIVATIVE_EXTENSION = '.webp' if DERIVATIVE_FORMAT == 'WEBP' else '.jpg'
+DERIVATIVE_SEPARATOR = '__'
+
+# صور المحادثة: تُخزن باسم مشتق من محتواها ويُعاد ترميزها بحد أقصى للأبعاد
+CHAT_IMAGE_DIR = 'chat_images'
+CHAT_IMAGE_MAX_EDGE = 2048
+CHAT_IMAGE_MAX_PIXELS = 40_000_000
+CHAT_IMAGE_QUALITY = 85
+
+
+def is_external(name) -> bool:
+    return str(name or '').startswith(('http://', 'https://'))
+
+
+def derivative_name(name: str, size: str) -> str:
+    """اسم ملف المشتق في نفس مجلد الأصل: pets/main/a.jpg -> pets/main/a__thumb.webp"""
+    base, _ = os.path.splitext(name)
+    return f"{base}{DERIVATIVE_SEPARATOR}{size}{DERIVATIVE_EXTENSION}"
+
+
+def is_derivative_name(name: str) -> bool:
+    base, extension = os.path.splitext(os.path.basename(name))
+    return extension == DERIVATIVE_EXTENSION and any(
+        base.endswith(f"{DERIVATIVE_SEPARATOR}{size}") for size in DERIVATIVE_SIZES
+    )
+
+
+def _derivatives_key(name: str) -> str:
+    return f"pets:derivatives:{hashlib.sha1(name.encode()).hexdigest()}"
+
+
+def record_derivatives(name: str, targets: Dict[str, str]) -> Dict[str, str]:
+    """تسجيل المشتقات الموجودة لصورة (بلا انتهاء) ليستخدمها derivative_urls."""
+    if targets:
+        cache.set(_derivatives_key(name), dict(targets), None)
+    return targets
+
+
+def recorded_derivatives(name: str) -> Dict[str, str]:
+    return cache.get(_derivatives_key(name)) or {}
+
+
+def name_from_media_url(url) -> Optional[str]:
+    """تحويل رابط /media/... (نسبي أو مطلق) إلى اسم الملف في التخزين، أو None لغير ملفات الوسائط."""
+    url = str(url or '')
+    media_url = settings.MEDIA_URL
+    if is_external(url):
+        path = '/' + url.split('://', 1)[1].split('/', 1)[-1]
+    else:
+        path = url
+    if not path.startswith(media_url):
+        return None
+    return path[len(media_url):] or None
+
+
+def _has_alpha(image: Image.Image) -> bool:
+    return 'A' in image.getbands() or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def _encode(image: Image.Image, size: str) -> bytes:
+    if DERIVATIVE_FORMAT == 'JPEG' or 'A' not in image.getbands():
+        image = image.convert('RGB')
+    elif image.mode != 'RGBA':
+        image = image.convert('RGBA')
+    buffer = io.BytesIO()
+    if DERIVATIVE_FORMAT == 'WEBP':
+        image.save(buffer, DERIVATIVE_FORMAT, quality=DERIVATIVE_QUALITY[size], method=4)
+    else:
+        image.save(buffer, DERIVATIVE_FORMAT, quality=DERIVATIVE_QUALITY[size], optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def generate_derivatives(name: str, storage=None, overwrite: bool = False) -> Dict[str, str]:
+    """
+    إنشاء المشتقات الناقصة لصورة محفوظة في التخزين.
+
+    Returns:
+        dict: {الحجم: اسم ملف المشتق} للمشتقات الموجودة بعد التنفيذ (فارغ إذا تعذرت قراءة الصورة)
+    """
+    storage = storage or default_storage
+    if not name or is_external(name) or is_derivative_name(name):
+        return {}
+
+    targets = {size: derivative_name(name, size) for size in DERIVATIVE_SIZES}
+    missing = [size for size, target in targets.items() if overwrite or not storage.exists(target)]
+    if not missing:
+        return record_derivatives(name, targets)
+
+    try:
+        with storage.open(name, 'rb') as handle:
+            with Image.open(handle) as original:
+                largest = max(DERIVATIVE_SIZES[size] for size in missing)
+                # فك ترميز JPEG بدقة مخفضة مباشرة بدلاً من فك الصورة كاملة ثم تصغيرها
+                original.draft('RGB', (largest, largest))
+                image = ImageOps.exif_transpose(original)
+                image.load()
+    except (FileNotFoundError, UnidentifiedImageError, Image.DecompressionBombError, OSError) as exc:
+        logger.warning("Cannot build derivatives for %s: %s", name, exc)
+        return record_derivatives(name, {size: target for size, target in targets.items() if size not in missing})
+
+    # كل مشتق يُصغّر من المشتق الأكبر منه لتقليل كلفة إعادة التحجيم
+    for size, edge in DERIVATIVE_SIZES.items():
+        image.thumbnail((edge, edge), Image.LANCZOS)
+        if size not in missing:
+            continue
+        target = targets[size]
+        if storage.exists(target):
+            storage.delete(target)
+        saved = storage.save(target, ContentFile(_encode(image, size)))
+        if saved != target:
+            logger.warning("Derivative for %s saved as %s instead of %s", name, saved, target)
+            targets[size] = saved
+    return record_derivatives(name, targets)
+
+
+def generate_derivatives_on_commit(names: Iterable[str]):
+    """جدولة إنشاء المشتقات بعد نجاح المعاملة الحالية."""
+    names = [name for name in names if name and not is_external(name)]
+    if not names:
+        return
+
+    def run():
+        for name in names:
+            try:
+                generate_derivatives(name)
+            except Exception as exc:
+                logger.exception("Derivative generation failed for %s: %s", name, exc)
+
+    transaction.on_commit(run)
+
+
+def derivative_urls(name, request=None, storage=None) -> Optional[Dict[str, str]]:
+    """
+    روابط المشتقات {thumb, card, full} لصورة؛ يُستخدم رابط الأصل لأي مشتق لم يُسجل بعد
+    (لم يُنشأ أو ما زال قيد الإنشاء). يقبل اسم الملف أو FieldFile.
+    """
+    name = getattr(name, 'name', name)
+    if not name:
+        return None
+    if is_external(name):
+        return {size: name for size in DERIVATIVE_SIZES}
+
+    storage = storage or default_storage
+
+    def absolute(url):
+        return request.build_absolute_uri(url) if request is not None else url
+
+    original_url = absolute(storage.url(name))
+    recorded = recorded_derivatives(name)
+    return {
+        size: absolute(storage.url(recorded[size])) if size in recorded else original_url
+        for size in DERIVATIVE_SIZES
+    }
+
+
+def store_chat_image(uploaded_file, storage=None) -> str:
+    """
+    حفظ صورة محادثة بعنوان مبني على محتواها: chat_images/<ab>/<sha256>.<ext>.
+
+    نفس البايتات تُحفظ مرة واحدة فقط (الصور المعاد توجيهها لا تُكرر)، وتُزال بيانات
+    EXIF ويُعاد الترميز بحد أقصى CHAT_IMAGE_MAX_EDGE. لا يتغير محتوى الرابط أبداً
+    لذلك يمكن تخزينه مؤقتاً بلا انتهاء.
+
+    Raises:
+        ValueError: إذا لم يكن الملف صورة صالحة أو كانت أبعادها كبيرة جداً
+    """
+    storage = storage or default_storage
+    digest = hashlib.sha256()
+    buffer = io.BytesIO()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+        buffer.write(chunk)
+    buffer.seek(0)
+
+    try:
+        with Image.open(buffer) as original:
+            width, height = original.size
+            if width * height > CHAT_IMAGE_MAX_PIXELS:
+                raise ValueError(f"Image too large: {width}x{height}")
+            keep_alpha = _has_alpha(original)
+            if keep_alpha and DERIVATIVE_FORMAT == 'WEBP':
+                image_format, extension = 'WEBP', '.webp'
+            elif keep_alpha:
+                image_format, extension = 'PNG', '.png'
+            else:
+                image_format, extension = 'JPEG', '.jpg'
+
+            hex_digest = digest.hexdigest()
+            name = f"{CHAT_IMAGE_DIR}/{hex_digest[:2]}/{hex_digest}{extension}"
+            if storage.exists(name):
+                return name
+
+            original.draft('RGB', (CHAT_IMAGE_MAX_EDGE, CHAT_IMAGE_MAX_EDGE))
+            image = ImageOps.exif_transpose(original)
+            image.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as exc:
+        raise ValueError(f"Invalid image: {exc}") from exc
+
+    image.thumbnail((CHAT_IMAGE_MAX_EDGE, CHAT_IMAGE_MAX_EDGE), Image.LANCZOS)
+    image = image.convert('RGBA' if keep_alpha else 'RGB')
+    output = io.BytesIO()
+    # الحفظ بدون تمرير exif يزيل بيانات الموقع والجهاز من الصورة
+    if image_format == 'JPEG':
+        image.save(output, image_format, quality=CHAT_IMAGE_QUALITY, optimize=True, progressive=True)
+    elif image_format == 'WEBP':
+        image.save(output, image_format, quality=CHAT_IMAGE_QUALITY, method=4)
+    else:
+        image.save(output, image_format, optimize=True)
+
+    saved = storage.save(name, ContentFile(output.getvalue()))
+    if saved != name:
+        # رفع متزامن لنفس المحتوى سبقنا إلى الحفظ
+        storage.delete(saved)
+    return name
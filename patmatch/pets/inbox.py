@@ -0,0 +1,130 @@
+"""
+صندوق الطلبات الموحّد: طلبات المقابلة وطلبات التبني، المرسلة والواردة، في قائمة واحدة.
+
+تُرتب العناصر حسب (created_at, نوع الطلب, id) تنازلياً، ويحمل المؤشر هذه القيم لآخر
+عنصر. كل صفحة تجلب page_size + 1 عنصر كحد أقصى من كل جدول (مع الجداول المرتبطة في
+نفس الاستعلام) ثم تُدمج.
+"""
+import heapq
+from typing import Dict, List, Optional, Tuple
+
+from django.db.models import Count, Q
+from django.db.models.fields import DateTimeField
+from rest_framework.exceptions import NotFound
+
+from .models import AdoptionRequest, BreedingRequest
+from .pagination import INVALID_CURSOR_MESSAGE, decode_cursor
+
+# ترتيب النوع لكسر التعادل عند تساوي created_at بين الجدولين
+KIND_RANKS = {'breeding': 1, 'adoption': 0}
+DIRECTIONS = ('sent', 'received')
+
+# كل ما تحتاجه سيريلايزرات الطلبات (الحيوانات مع السلالة والمالك) في نفس الاستعلام
+BREEDING_REQUEST_RELATED = (
+    'requester', 'receiver', 'veterinary_clinic',
+    'target_pet__breed', 'target_pet__owner',
+    'requester_pet__breed', 'requester_pet__owner',
+)
+ADOPTION_REQUEST_RELATED = ('adopter', 'pet__breed', 'pet__owner')
+
+
+def _base_querysets(user) -> Dict[str, Dict[str, Q]]:
+    return {
+        'breeding': {
+            'sent': Q(requester=user),
+            'received': Q(receiver=user),
+        },
+        'adoption': {
+            'sent': Q(adopter=user),
+            'received': Q(pet__owner=user),
+        },
+    }
+
+
+def _queryset(kind, condition):
+    if kind == 'breeding':
+        return BreedingRequest.objects.filter(condition).select_related(*BREEDING_REQUEST_RELATED)
+    return AdoptionRequest.objects.filter(condition).select_related(*ADOPTION_REQUEST_RELATED)
+
+
+def parse_cursor(encoded) -> Optional[Tuple]:
+    if not encoded:
+        return None
+    created_at, rank, pk = decode_cursor(encoded, 3)
+    try:
+        return DateTimeField().to_python(created_at), int(rank), int(pk)
+    except Exception:
+        raise NotFound(INVALID_CURSOR_MESSAGE)
+
+
+def _after(queryset, rank, cursor):
+    """العناصر التي تأتي بعد المؤشر بترتيب (created_at, rank, id) التنازلي."""
+    created_at, cursor_rank, pk = cursor
+    if rank < cursor_rank:
+        return queryset.filter(created_at__lte=created_at)
+    if rank > cursor_rank:
+        return queryset.filter(created_at__lt=created_at)
+    return queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+
+def inbox_page(user, page_size, cursor=None, kinds=None, direction=None, status=None):
+    """
+    صفحة من الصندوق الموحّد.
+
+    Returns:
+        tuple: (items, has_more) حيث items قائمة (kind, direction, obj)
+    """
+    streams = []
+    for kind, directions in _base_querysets(user).items():
+        if kinds and kind not in kinds:
+            continue
+        if direction:
+            condition = directions[direction]
+        else:
+            condition = directions['sent'] | directions['received']
+        queryset = _queryset(kind, condition)
+        if status:
+            queryset = queryset.filter(status=status)
+        if cursor is not None:
+            queryset = _after(queryset, KIND_RANKS[kind], cursor)
+        rows = queryset.order_by('-created_at', '-id')[:page_size + 1]
+        streams.append([(kind, row) for row in rows])
+
+    merged = heapq.merge(
+        *streams,
+        key=lambda item: (item[1].created_at, KIND_RANKS[item[0]], item[1].id),
+        reverse=True,
+    )
+    items: List[Tuple] = []
+    for kind, row in merged:
+        if len(items) == page_size:
+            return items, True
+        items.append((kind, _direction(kind, row, user), row))
+    return items, False
+
+
+def _direction(kind, row, user):
+    sender_id = row.requester_id if kind == 'breeding' else row.adopter_id
+    return 'sent' if sender_id == user.pk else 'received'
+
+
+def cursor_values(kind, row):
+    return [row.created_at, KIND_RANKS[kind], row.id]
+
+
+def inbox_counts(user):
+    """عدد الطلبات لكل حالة واتجاه: استعلام تجميع واحد لكل جدول."""
+    counts = {}
+    for kind, directions in _base_querysets(user).items():
+        model = BreedingRequest if kind == 'breeding' else AdoptionRequest
+        statuses = [value for value, _ in model.STATUS_CHOICES]
+        aggregates = model.objects.filter(directions['sent'] | directions['received']).aggregate(**{
+            f'{name}_{value}': Count('id', filter=condition & Q(status=value))
+            for name, condition in directions.items()
+            for value in statuses
+        })
+        counts[kind] = {}
+        for name in DIRECTIONS:
+            by_status = {value: aggregates[f'{name}_{value}'] for value in statuses}
+            counts[kind][name] = {**by_status, 'total': sum(by_status.values())}
+    return counts
@@ -77,10 +77,12 @@ class Command(BaseCommand):
                 summary["breeding"]["auto_rejects"] += 1
                 continue
 
-            # Count total reminders for this request
+            # Count total reminders for this request (never older than the request itself;
+            # the bound lets PostgreSQL skip older notification partitions)
             total_reminders = Notification.objects.filter(
                 type="breeding_request_pending_reminder",
                 related_breeding_request=br,
+                created_at__gte=br.created_at,
             ).count()
             reminded_today = Notification.objects.filter(
                 type="breeding_request_pending_reminder",
@@ -142,6 +144,7 @@ class Command(BaseCommand):
             total_reminders = Notification.objects.filter(
                 type="adoption_request_pending_reminder",
                 extra_data__adoption_request_id=ar.id,
+                created_at__gte=ar.created_at,
             ).count()
             reminded_today = Notification.objects.filter(
                 type="adoption_request_pending_reminder",
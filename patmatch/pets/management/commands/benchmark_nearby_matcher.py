@@ -0,0 +1,104 @@
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from pets.matching import NearbyPetMatcher, haversine_km_array
+
+
+class Command(BaseCommand):
+    help = "Benchmark NearbyPetMatcher on synthetic pets (single core, no DB or network)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pets", type=int, default=100_000, help="Number of synthetic pets (default: 100000).")
+        parser.add_argument("--owners", type=int, default=0, help="Number of distinct owners (default: pets / 2).")
+        parser.add_argument("--limit-per-user", type=int, default=3, help="Max recommendations per owner.")
+        parser.add_argument("--max-distance-km", type=float, default=50.0, help="Max distance in KM.")
+        parser.add_argument(
+            "--bbox",
+            type=str,
+            default="16,34,25,50",
+            help="min_lat,max_lat,min_lng,max_lng of the synthetic area (default covers Egypt and KSA).",
+        )
+        parser.add_argument("--seed", type=int, default=42, help="Random seed.")
+        parser.add_argument(
+            "--verify-sample",
+            type=int,
+            default=20,
+            help="Brute-force check this many owners against the matcher output (0 to skip).",
+        )
+
+    def handle(self, *args, **options):
+        total = int(options["pets"])
+        owners_count = int(options["owners"] or max(1, total // 2))
+        limit_per_user = int(options["limit_per_user"])
+        max_distance_km = float(options["max_distance_km"])
+        try:
+            min_lat, max_lat, min_lng, max_lng = (float(v) for v in options["bbox"].split(","))
+        except ValueError as exc:
+            raise CommandError("--bbox must be min_lat,max_lat,min_lng,max_lng") from exc
+
+        rng = random.Random(options["seed"])
+        pets = [
+            {
+                "id": index,
+                "latitude": rng.uniform(min_lat, max_lat),
+                "longitude": rng.uniform(min_lng, max_lng),
+                "pet_type": rng.choice(("cats", "dogs")),
+                "gender": rng.choice(("M", "F")),
+                "owner": rng.randrange(owners_count),
+            }
+            for index in range(total)
+        ]
+
+        started = time.perf_counter()
+        matcher = NearbyPetMatcher(pets, max_distance_km=max_distance_km)
+        built = time.perf_counter()
+        recommendations = matcher.recommend_by_owner(limit_per_user)
+        finished = time.perf_counter()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"pets={len(matcher)} owners={owners_count} max_distance_km={max_distance_km} "
+                f"limit_per_user={limit_per_user} | index={built - started:.2f}s "
+                f"match={finished - built:.2f}s total={finished - started:.2f}s | "
+                f"owners_with_matches={len(recommendations)}"
+            )
+        )
+
+        sample = int(options["verify_sample"])
+        if sample > 0:
+            mismatches = self._verify(pets, recommendations, limit_per_user, max_distance_km, sample, rng)
+            if mismatches:
+                raise CommandError(f"Matcher disagrees with brute force for {mismatches} sampled owner(s).")
+            self.stdout.write(self.style.SUCCESS(f"Verified {sample} owners against brute force."))
+
+    def _verify(self, pets, recommendations, limit_per_user, max_distance_km, sample, rng):
+        lat = np.radians([p["latitude"] for p in pets])
+        lng = np.radians([p["longitude"] for p in pets])
+        by_owner = {}
+        for index, pet in enumerate(pets):
+            by_owner.setdefault(pet["owner"], []).append(index)
+
+        mismatches = 0
+        for owner in rng.sample(sorted(by_owner), min(sample, len(by_owner))):
+            best = {}
+            for index in by_owner[owner]:
+                pet = pets[index]
+                distances = haversine_km_array(lat[index], lng[index], lat, lng)
+                for other, distance in enumerate(distances):
+                    candidate = pets[other]
+                    if (
+                        distance > max_distance_km
+                        or candidate["owner"] == owner
+                        or candidate["pet_type"] != pet["pet_type"]
+                        or candidate["gender"] == pet["gender"]
+                    ):
+                        continue
+                    best[other] = min(distance, best.get(other, distance))
+            expected = [round(d, 2) for _, d in sorted(best.items(), key=lambda item: (item[1], item[0]))[:limit_per_user]]
+            actual = [d for _, d in recommendations.get(owner, [])]
+            if expected != actual:
+                mismatches += 1
+        return mismatches
@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from pets.suggestions import compute_all_suggestions
+
+
+class Command(BaseCommand):
+    help = 'إعادة حساب اقتراحات شركاء التزاوج لكل الحيوانات المتاحة (يُشغّل ليلاً)'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = compute_all_suggestions()
+        self.stdout.write(
+            self.style.SUCCESS(f'تم حفظ {total} اقتراح خلال {time.monotonic() - started:.1f} ثانية')
+        )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from pets.chat_push import flush_pending_chat_pushes
+from pets.models import PendingChatPush
+
+
+class Command(BaseCommand):
+    help = (
+        'إرسال إشعار الدفع بالحالة الأخيرة لإشعارات المحادثة التي تغيّرت داخل نافذة التأخير '
+        '(يُشغّل كل دقيقة)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='عرض عدد الإشعارات المعلّقة بدون إرسال',
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            pending = PendingChatPush.objects.count()
+            self.stdout.write(self.style.WARNING(f'[DRY RUN] {pending} إشعار محادثة معلّق'))
+            return
+
+        sent = flush_pending_chat_pushes()
+        self.stdout.write(self.style.SUCCESS(f'تم إرسال {sent} إشعار'))
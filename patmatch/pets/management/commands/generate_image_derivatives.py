@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from clinics.models import Clinic
+from pets.images import generate_derivatives, is_derivative_name, is_external
+from pets.models import Pet, PetImage
+
+
+class Command(BaseCommand):
+    help = 'إنشاء مشتقات الصور (thumb/card/full) للصور المرفوعة سابقاً'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='عرض عدد الصور التي سيتم معالجتها بدون إنشاء المشتقات',
+        )
+        parser.add_argument(
+            '--overwrite',
+            action='store_true',
+            help='إعادة إنشاء المشتقات الموجودة',
+        )
+        parser.add_argument('--workers', type=int, default=4, help='عدد الصور المعالجة بالتوازي')
+
+    def handle(self, *args, **options):
+        names = sorted(set(self._image_names()))
+        self.stdout.write(self.style.NOTICE(f'Found {len(names)} images'))
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'[DRY RUN] سيتم معالجة {len(names)} صورة'))
+            return
+
+        overwrite = options['overwrite']
+        processed = failed = 0
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            for name, derivatives in zip(
+                names, executor.map(lambda n: generate_derivatives(n, overwrite=overwrite), names)
+            ):
+                processed += 1
+                if not derivatives:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f'تعذر معالجة {name}'))
+                if processed % 100 == 0:
+                    self.stdout.write(f'Progress {processed}/{len(names)}')
+
+        self.stdout.write(self.style.SUCCESS(f'تمت معالجة {processed - failed} صورة، وتعذرت معالجة {failed}'))
+
+    def _image_names(self):
+        for row in Pet.objects.values_list('main_image', 'image_2', 'image_3', 'image_4').iterator():
+            yield from (name for name in row if name and not is_external(name))
+        for name in PetImage.objects.values_list('image', flat=True).iterator():
+            if name and not is_external(name):
+                yield name
+        for name in Clinic.objects.exclude(logo='').exclude(logo__isnull=True).values_list('logo', flat=True):
+            if not is_external(name):
+                yield name
+        yield from self._chat_image_names('chat_images')
+
+    def _chat_image_names(self, directory):
+        if not default_storage.exists(directory):
+            return
+        subdirectories, files = default_storage.listdir(directory)
+        for filename in files:
+            name = f'{directory}/{filename}'
+            if not is_derivative_name(name):
+                yield name
+        for subdirectory in subdirectories:
+            yield from self._chat_image_names(f'{directory}/{subdirectory}')
@@ -0,0 +1,79 @@
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import models
+
+from patmatch_backend.storage import is_hashed_name
+from pets.images import DERIVATIVE_SIZES, derivative_name, is_external, record_derivatives
+
+
+class Command(BaseCommand):
+    help = 'نسخ ملفات الوسائط القديمة إلى أسماء مبنية على محتواها وتحديث السجلات لتصبح روابطها ثابتة'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='عرض عدد الملفات التي سيتم نسخها بدون تعديل أي شيء',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        totals = {'renamed': 0, 'missing': 0, 'already_hashed': 0}
+
+        for model in apps.get_models():
+            file_fields = [
+                field for field in model._meta.concrete_fields
+                if isinstance(field, models.FileField)
+            ]
+            for field in file_fields:
+                counts = self._rehash_field(model, field.name, dry_run)
+                for key, value in counts.items():
+                    totals[key] += value
+                if counts['renamed'] or counts['missing']:
+                    self.stdout.write(
+                        f"{model._meta.label}.{field.name}: renamed={counts['renamed']} missing={counts['missing']}"
+                    )
+
+        prefix = '[DRY RUN] ' if dry_run else ''
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix}renamed={totals['renamed']} missing={totals['missing']} "
+                f"already_hashed={totals['already_hashed']}"
+            )
+        )
+
+    def _rehash_field(self, model, field_name, dry_run):
+        counts = {'renamed': 0, 'missing': 0, 'already_hashed': 0}
+        rows = (
+            model._default_manager.exclude(**{field_name: ''})
+            .exclude(**{f'{field_name}__isnull': True})
+            .values_list('pk', field_name)
+            .iterator()
+        )
+        for pk, name in rows:
+            if is_external(name) or is_hashed_name(name):
+                counts['already_hashed'] += 1
+                continue
+            if not default_storage.exists(name):
+                counts['missing'] += 1
+                continue
+            counts['renamed'] += 1
+            if dry_run:
+                continue
+
+            # الملف القديم يبقى كما هو حتى لا تنكسر الروابط المحفوظة مسبقاً في الرسائل أو الكاش
+            with default_storage.open(name, 'rb') as handle:
+                new_name = default_storage.save(name, handle)
+            copied = {}
+            for size in DERIVATIVE_SIZES:
+                old_derivative = derivative_name(name, size)
+                new_derivative = derivative_name(new_name, size)
+                if default_storage.exists(old_derivative) and not default_storage.exists(new_derivative):
+                    with default_storage.open(old_derivative, 'rb') as handle:
+                        default_storage.save(new_derivative, handle)
+                if default_storage.exists(new_derivative):
+                    copied[size] = new_derivative
+            record_derivatives(new_name, copied)
+            model._default_manager.filter(pk=pk, **{field_name: name}).update(**{field_name: new_name})
+        return counts
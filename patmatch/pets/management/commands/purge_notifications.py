@@ -0,0 +1,69 @@
+import gzip
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from pets.retention import (
+    drop_empty_partitions,
+    ensure_partitions,
+    expired_notifications,
+    purge_notifications,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'حذف الإشعارات الأقدم من مدة الاحتفاظ بنوعها (NOTIFICATION_RETENTION_DAYS) على دفعات، '
+        'وعلى PostgreSQL إنشاء الأقسام الشهرية القادمة وحذف الأقسام القديمة الفارغة (يُشغّل يومياً)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='عدد الإشعارات المحذوفة في كل دفعة',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.0,
+            help='ثوانٍ بين الدفعات',
+        )
+        parser.add_argument(
+            '--archive',
+            help='ملف JSON Lines تُضاف إليه الإشعارات قبل حذفها (يُضغط إذا انتهى بـ .gz)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='عرض عدد الإشعارات المنتهية بدون حذف',
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = expired_notifications().count()
+            self.stdout.write(self.style.WARNING(f'[DRY RUN] {count} إشعار منتهي'))
+            return
+
+        created = ensure_partitions(connection)
+        if created:
+            self.stdout.write(f"أقسام جديدة: {', '.join(created)}")
+
+        started = time.monotonic()
+        archive_path = options['archive']
+        if archive_path:
+            opener = gzip.open if archive_path.endswith('.gz') else open
+            with opener(archive_path, 'at', encoding='utf-8') as archive:
+                deleted = purge_notifications(options['batch_size'], archive, options['pause'])
+        else:
+            deleted = purge_notifications(options['batch_size'], pause=options['pause'])
+
+        dropped = drop_empty_partitions(connection)
+        if dropped:
+            self.stdout.write(f"أقسام محذوفة: {', '.join(dropped)}")
+
+        self.stdout.write(
+            self.style.SUCCESS(f'تم حذف {deleted} إشعار خلال {time.monotonic() - started:.1f} ثانية')
+        )
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from pets.models import Pet
+from pets.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'إعادة حساب نص البحث لكل الحيوانات وإعادة بناء فهرس البحث النصي'
+
+    def handle(self, *args, **options):
+        rebuild_search_index(Pet)
+        self.stdout.write(self.style.SUCCESS(f'تمت فهرسة {Pet.objects.count()} حيوان'))
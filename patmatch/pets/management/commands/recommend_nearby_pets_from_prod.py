@@ -1,39 +1,171 @@
 import os
+import math
 import requests
 import logging
-from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 import hashlib
 import csv
 import json
 import urllib.parse
 
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from django.core.mail import send_mail
 
 from accounts.models import User
 from accounts.firebase_service import firebase_service
+from pets.matching import NearbyPetMatcher
 
 logger = logging.getLogger(__name__)
 
 
-def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> Optional[float]:
-    try:
-        import math
-        rlat1 = math.radians(float(lat1))
-        rlon1 = math.radians(float(lon1))
-        rlat2 = math.radians(float(lat2))
-        rlon2 = math.radians(float(lon2))
-        dlat = rlat2 - rlat1
-        dlon = rlon2 - rlon1
-        a = (
-            math.sin(dlat / 2) ** 2
-            + math.cos(rlat1) * math.cos(rlat2) * math.sin(dlon / 2) ** 2
-        )
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        return round(6371 * c, 2)
-    except Exception:
-        return None
+class PetsApiClient:
+    """Pooled HTTP client for the production pets API with bounded concurrency and an on-disk detail cache."""
+
+    def __init__(self, base_url: str, concurrency: int = 8, cache_dir: str = '', timeout: int = 20):
+        self.base_url = base_url.rstrip('/')
+        self.pets_endpoint = f"{self.base_url}/api/pets/"
+        self.concurrency = max(1, int(concurrency))
+        self.timeout = timeout
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            (self.cache_dir / 'pets').mkdir(parents=True, exist_ok=True)
+        self.stats = {'pages': 0, 'details': 0, 'detail_cache_hits': 0}
+
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=self.concurrency, pool_maxsize=self.concurrency, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Accept': 'application/json'})
+
+    def map(self, func: Callable, items: Iterable) -> list:
+        """Run func over items with at most `concurrency` requests in flight, preserving order."""
+        items = list(items)
+        if self.concurrency == 1 or len(items) <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            return list(executor.map(func, items))
+
+    def _get_json(self, url: str):
+        resp = self.session.get(url, timeout=self.timeout)
+        if resp.status_code != 200:
+            raise requests.HTTPError(f"{resp.status_code} {resp.text[:200]}", response=resp)
+        return resp.json()
+
+    @staticmethod
+    def _page_url(url: str, page: int) -> str:
+        parts = urllib.parse.urlsplit(url)
+        query = dict(urllib.parse.parse_qsl(parts.query, keep_blank_values=True))
+        query['page'] = str(page)
+        return urllib.parse.urlunsplit(parts._replace(query=urllib.parse.urlencode(query)))
+
+    def fetch_pets(self, query: str) -> List[dict]:
+        """
+        Fetch every page of the pets listing. The first page gives the total count,
+        the remaining pages are then requested concurrently.
+        """
+        first_url = f"{self.pets_endpoint}?{query}"
+        data = self._get_json(first_url)
+        self.stats['pages'] += 1
+        if isinstance(data, list):
+            return data
+        if not isinstance(data, dict) or 'results' not in data:
+            return []
+
+        results = list(data.get('results') or [])
+        next_url = data.get('next')
+        count = data.get('count')
+        if not next_url:
+            return results
+
+        if isinstance(count, int) and results:
+            total_pages = math.ceil(count / len(results))
+            page_urls = [self._page_url(next_url, page) for page in range(2, total_pages + 1)]
+
+            def fetch_page(url):
+                page_data = self._get_json(url)
+                self.stats['pages'] += 1
+                return page_data.get('results') or []
+
+            for page_results in self.map(fetch_page, page_urls):
+                results.extend(page_results)
+            return results
+
+        # No count available: follow `next` links sequentially
+        while next_url:
+            page_data = self._get_json(next_url)
+            self.stats['pages'] += 1
+            results.extend(page_data.get('results') or [])
+            next_url = page_data.get('next')
+        return results
+
+    def _cache_path(self, pet_id) -> Optional[Path]:
+        if not self.cache_dir:
+            return None
+        return self.cache_dir / 'pets' / f"{pet_id}.json"
+
+    def _read_cached_owner(self, pet: dict) -> Optional[str]:
+        path = self._cache_path(pet.get('id'))
+        updated_at = pet.get('updated_at')
+        if not path or not updated_at or not path.is_file():
+            return None
+        try:
+            cached = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+        if cached.get('updated_at') != updated_at:
+            return None
+        return cached.get('owner_email') or ''
+
+    def _write_cached_owner(self, pet: dict, owner_email: str):
+        path = self._cache_path(pet.get('id'))
+        if not path or not pet.get('updated_at'):
+            return
+        try:
+            path.write_text(
+                json.dumps({'updated_at': pet['updated_at'], 'owner_email': owner_email}),
+                encoding='utf-8',
+            )
+        except OSError as e:
+            logger.warning(f"Failed to write cache for pet {pet.get('id')}: {e}")
+
+    def fetch_owner_emails(self, pets: List[dict]) -> Dict[int, str]:
+        """
+        Resolve owner_email for pets whose list entry lacks it. Detail responses are cached on disk
+        keyed by the pet's updated_at, so unchanged pets cost no request on the next run.
+        """
+        emails: Dict[int, str] = {}
+        missing: List[dict] = []
+        for pet in pets:
+            cached = self._read_cached_owner(pet)
+            if cached is not None:
+                emails[pet.get('id')] = cached
+                self.stats['detail_cache_hits'] += 1
+            else:
+                missing.append(pet)
+
+        def fetch_detail(pet: dict) -> str:
+            pet_id = pet.get('id')
+            try:
+                detail = self._get_json(f"{self.pets_endpoint}{pet_id}/")
+            except (requests.RequestException, ValueError) as e:
+                logger.warning(f"Detail fetch failed for pet {pet_id}: {e}")
+                return ''
+            self.stats['details'] += 1
+            owner_email = detail.get('owner_email') or ''
+            if owner_email:
+                self._write_cached_owner(pet, owner_email)
+            return owner_email
+
+        for pet, owner_email in zip(missing, self.map(fetch_detail, missing)):
+            emails[pet.get('id')] = owner_email
+        return emails
 
 
 class Command(BaseCommand):
@@ -42,6 +174,8 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('--base-url', type=str, default=os.environ.get('PETOW_API_BASE_URL', 'https://api.petow.app'), help='Production API base URL')
         parser.add_argument('--page-size', type=int, default=100, help='Page size for pets listing')
+        parser.add_argument('--concurrency', type=int, default=8, help='Max concurrent HTTP requests to the production API')
+        parser.add_argument('--cache-dir', type=str, default=os.environ.get('PETOW_API_CACHE_DIR', ''), help='Directory for the on-disk pet detail cache (keyed by updated_at); empty disables caching')
         parser.add_argument('--limit-per-user', type=int, default=3, help='Max recommendations per owner')
         parser.add_argument('--max-distance-km', type=float, default=50.0, help='Max distance in KM to include recommendation')
         parser.add_argument('--pet-type', type=str, choices=['cats', 'dogs'], help='Filter candidates by pet type')
@@ -68,6 +202,8 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         base_url: str = options['base_url'].rstrip('/')
         page_size: int = options['page_size']
+        concurrency: int = options['concurrency']
+        cache_dir: str = options['cache_dir']
         limit_per_user: int = options['limit_per_user']
         max_distance_km: float = options['max_distance_km']
         pet_type_filter: Optional[str] = options.get('pet_type')
@@ -145,57 +281,31 @@ class Command(BaseCommand):
             except Exception as e:
                 logger.warning(f"Failed to load tokens from file: {e}")
 
-        pets_endpoint = f"{base_url}/api/pets/"
-        self.stdout.write(self.style.SUCCESS(f"Fetching pets from {pets_endpoint}"))
+        client = PetsApiClient(base_url, concurrency=concurrency, cache_dir=cache_dir)
+        session = client.session
+        self.stdout.write(self.style.SUCCESS(f"Fetching pets from {client.pets_endpoint}"))
 
-        session = requests.Session()
-        session.headers.update({'Accept': 'application/json'})
-        all_pets: List[dict] = []
         # Request only available pets from API to reduce noise
-        next_url = f"{pets_endpoint}?page_size={page_size}&status=available"
-
-        # Fetch paginated pets
-        while next_url:
-            try:
-                resp = session.get(next_url, timeout=20)
-                if resp.status_code != 200:
-                    self.stdout.write(self.style.ERROR(f"Failed to fetch pets: {resp.status_code} {resp.text[:200]}"))
-                    return
-                data = resp.json()
-                # DRF pagination may return dict with results/next or list directly
-                if isinstance(data, dict) and 'results' in data:
-                    results = data.get('results', [])
-                    next_url = data.get('next')
-                elif isinstance(data, list):
-                    results = data
-                    next_url = None
-                else:
-                    results = []
-                    next_url = None
-                all_pets.extend(results)
-                self.stdout.write(self.style.NOTICE(f"Fetched {len(results)} pets (total {len(all_pets)})"))
-            except requests.RequestException as e:
-                self.stdout.write(self.style.ERROR(f"Network error fetching pets: {e}"))
-                return
+        try:
+            all_pets: List[dict] = client.fetch_pets(f"page_size={page_size}&status=available")
+        except (requests.RequestException, ValueError) as e:
+            self.stdout.write(self.style.ERROR(f"Failed to fetch pets: {e}"))
+            return
+        self.stdout.write(self.style.NOTICE(f"Fetched {len(all_pets)} pets in {client.stats['pages']} pages"))
 
         if not all_pets:
             self.stdout.write(self.style.WARNING('No pets returned from production API'))
             return
 
-        # Enrich each pet with owner_email from detail endpoint (list does not include owner_email)
-        def fetch_owner_email(pet_id: int) -> str:
-            try:
-                detail_url = f"{pets_endpoint}{pet_id}/"
-                r = session.get(detail_url, timeout=20)
-                if r.status_code == 200:
-                    detail = r.json()
-                    return detail.get('owner_email') or ''
-                else:
-                    logger.warning(f"Detail fetch failed for pet {pet_id}: {r.status_code}")
-                    return ''
-            except requests.RequestException as e:
-                logger.warning(f"Detail fetch error for pet {pet_id}: {e}")
-                return ''
+        # Enrich pets with owner_email from the detail endpoint (list does not include owner_email)
+        located_pets = [
+            p for p in all_pets
+            if p.get('latitude') is not None and p.get('longitude') is not None
+        ]
+        owner_emails = client.fetch_owner_emails([p for p in located_pets if not p.get('owner_email')])
+        self.stdout.write(self.style.NOTICE(
+            f"Owner lookups: {client.stats['details']} fetched, {client.stats['detail_cache_hits']} from cache"
+        ))
 
         # Filter and normalize
         def normalize_pet(p: dict) -> Optional[dict]:
@@ -204,7 +314,7 @@ class Command(BaseCommand):
                 lng = p.get('longitude')
                 if lat is None or lng is None:
                     return None
-                owner_email = p.get('owner_email') or fetch_owner_email(p.get('id'))
+                owner_email = p.get('owner_email') or owner_emails.get(p.get('id'))
                 return {
                     'id': p.get('id'),
                     'name': p.get('name'),
@@ -227,6 +337,7 @@ class Command(BaseCommand):
         owners: Dict[str, List[dict]] = {}
         for p in normalized_pets:
             email = p['owner_email']
+            p['owner'] = email or None
             if not email:
                 continue
             owners.setdefault(email, []).append(p)
@@ -234,6 +345,28 @@ class Command(BaseCommand):
         if only_owner_email:
             owners = {only_owner_email: owners.get(only_owner_email, [])}
 
+        # Same type, opposite gender, other owners, within max distance; closest first per owner
+        matcher = NearbyPetMatcher(normalized_pets, max_distance_km=max_distance_km)
+        recommendations = matcher.recommend_by_owner(limit_per_user, owners=list(owners))
+
+        # Resolve missing FCM tokens once per unique owner, concurrently, before sending
+        if not dry_run and not no_push and user_endpoint:
+            lookup_emails = sorted({
+                email.strip().lower() for email in owners
+                if recommendations.get(email) and email.strip().lower() not in tokens_map
+            })
+            if lookup_emails:
+                def lookup(email: str) -> Optional[str]:
+                    return self._fetch_user_token(
+                        session, base_url, email, user_endpoint, user_endpoint_method,
+                        user_email_param, admin_api_key,
+                    )
+
+                for email, token in zip(lookup_emails, client.map(lookup, lookup_emails)):
+                    if token:
+                        tokens_map[email] = token
+                self.stdout.write(self.style.NOTICE(f"Resolved tokens for {len(lookup_emails)} unique owners"))
+
         total_owners = len(owners)
         processed = 0
         total_emails_sent = 0
@@ -243,31 +376,10 @@ class Command(BaseCommand):
             if not my_pets:
                 continue
 
-            # Build candidate list from pets owned by others
-            candidates = [p for p in normalized_pets if p['owner_email'] != owner_email]
-            if not candidates:
-                continue
-
-            # Compute recommendations across all of owner's pets
-            recs: List[Tuple[dict, float]] = []
-            for my in my_pets:
-                for other in candidates:
-                    # Must be same type and opposite gender
-                    if my['pet_type'] != other['pet_type']:
-                        continue
-                    if my['gender'] == other['gender']:
-                        continue
-                    d = haversine_km(my['latitude'], my['longitude'], other['latitude'], other['longitude'])
-                    if d is None or d > max_distance_km:
-                        continue
-                    recs.append((other, d))
-
+            recs: List[Tuple[dict, float]] = recommendations.get(owner_email, [])
             if not recs:
                 continue
 
-            recs.sort(key=lambda t: t[1])
-            recs = recs[:limit_per_user]
-
             # Prepare message
             lines = []
             for pet, dist in recs:
@@ -307,66 +419,6 @@ class Command(BaseCommand):
                 # Preferred: if we have a token from prod mapping, send directly via Firebase
                 token_lookup_email = (owner_email or '').strip().lower()
                 token = tokens_map.get(token_lookup_email)
-                # If no token mapping provided, try fetching via user endpoint that returns fcm_token
-                if not token and user_endpoint:
-                    try:
-                        # Build URL
-                        if user_endpoint.startswith('http://') or user_endpoint.startswith('https://'):
-                            ue = user_endpoint
-                        else:
-                            ue = f"{base_url}{user_endpoint if user_endpoint.startswith('/') else '/' + user_endpoint}"
-                        if '{email}' in ue:
-                            ue_final = ue.replace('{email}', urllib.parse.quote(token_lookup_email))
-                            req_kwargs = {}
-                        else:
-                            if user_endpoint_method == 'GET':
-                                sep = '&' if '?' in ue else '?'
-                                ue_final = f"{ue}{sep}{user_email_param}={urllib.parse.quote(token_lookup_email)}"
-                                req_kwargs = {}
-                            else:
-                                ue_final = ue
-                                req_kwargs = {'json': {user_email_param: token_lookup_email}}
-                        # Auth header support (reuse admin key if provided)
-                        headers = {}
-                        if admin_api_key:
-                            headers['X-API-KEY'] = admin_api_key
-                            headers['Authorization'] = f'Api-Key {admin_api_key}'
-                        if user_endpoint_method == 'GET':
-                            r = session.get(ue_final, headers=headers, timeout=20)
-                        else:
-                            r = session.post(ue_final, headers=headers, timeout=20, **req_kwargs)
-                        if r.status_code == 200:
-                            j = r.json()
-                            token = None
-                            # Accept various shapes:
-                            # 1) {fcm_token: ...}
-                            token = token or j.get('fcm_token')
-                            # 2) {user: {fcm_token: ...}}
-                            if not token and isinstance(j.get('user', {}), dict):
-                                token = j['user'].get('fcm_token')
-                            # 3) [ {email: ..., fcm_token: ...}, ... ]
-                            if not token and isinstance(j, list):
-                                for rec in j:
-                                    if isinstance(rec, dict) and (rec.get('email', '').strip().lower() == token_lookup_email):
-                                        token = rec.get('fcm_token') or rec.get('token')
-                                        if token:
-                                            break
-                            # 4) {results: [ ... ]}
-                            if not token and isinstance(j, dict) and isinstance(j.get('results'), list):
-                                for rec in j['results']:
-                                    if isinstance(rec, dict) and (rec.get('email', '').strip().lower() == token_lookup_email):
-                                        token = rec.get('fcm_token') or rec.get('token')
-                                        if token:
-                                            break
-                            if token:
-                                tokens_map[token_lookup_email] = token
-                            else:
-                                logger.warning(f"User endpoint returned 200 but no fcm_token for {owner_email}")
-                        else:
-                            logger.warning(f"User endpoint failed for {owner_email}: {r.status_code} {r.text[:200]}")
-                    except Exception as e:
-                        logger.warning(f"User endpoint error for {owner_email}: {e}")
-
                 if token and firebase_service.is_initialized:
                     try:
                         ok = firebase_service.send_notification(
@@ -443,4 +495,70 @@ class Command(BaseCommand):
 
         self.stdout.write(self.style.SUCCESS(
             f"Processed owners: {processed}/{total_owners} | Emails: {total_emails_sent} | Push: {total_push_sent}"
-        )) 
\ No newline at end of file
+        )) 
+
+    def _fetch_user_token(
+        self,
+        session: requests.Session,
+        base_url: str,
+        token_lookup_email: str,
+        user_endpoint: str,
+        user_endpoint_method: str,
+        user_email_param: str,
+        admin_api_key: str,
+    ) -> Optional[str]:
+        """Fetch an owner's FCM token via the production user endpoint."""
+        try:
+            # Build URL
+            if user_endpoint.startswith('http://') or user_endpoint.startswith('https://'):
+                ue = user_endpoint
+            else:
+                ue = f"{base_url}{user_endpoint if user_endpoint.startswith('/') else '/' + user_endpoint}"
+            if '{email}' in ue:
+                ue_final = ue.replace('{email}', urllib.parse.quote(token_lookup_email))
+                req_kwargs = {}
+            else:
+                if user_endpoint_method == 'GET':
+                    sep = '&' if '?' in ue else '?'
+                    ue_final = f"{ue}{sep}{user_email_param}={urllib.parse.quote(token_lookup_email)}"
+                    req_kwargs = {}
+                else:
+                    ue_final = ue
+                    req_kwargs = {'json': {user_email_param: token_lookup_email}}
+            # Auth header support (reuse admin key if provided)
+            headers = {}
+            if admin_api_key:
+                headers['X-API-KEY'] = admin_api_key
+                headers['Authorization'] = f'Api-Key {admin_api_key}'
+            if user_endpoint_method == 'GET':
+                r = session.get(ue_final, headers=headers, timeout=20)
+            else:
+                r = session.post(ue_final, headers=headers, timeout=20, **req_kwargs)
+            if r.status_code != 200:
+                logger.warning(f"User endpoint failed for {token_lookup_email}: {r.status_code} {r.text[:200]}")
+                return None
+
+            j = r.json()
+            token = None
+            # Accept various shapes:
+            # 1) {fcm_token: ...}
+            # 2) {user: {fcm_token: ...}}
+            if isinstance(j, dict):
+                token = j.get('fcm_token')
+                if not token and isinstance(j.get('user'), dict):
+                    token = j['user'].get('fcm_token')
+            # 3) [ {email: ..., fcm_token: ...}, ... ]
+            # 4) {results: [ ... ]}
+            records = j if isinstance(j, list) else (j.get('results') if isinstance(j, dict) else None)
+            if not token and isinstance(records, list):
+                for rec in records:
+                    if isinstance(rec, dict) and (rec.get('email', '').strip().lower() == token_lookup_email):
+                        token = rec.get('fcm_token') or rec.get('token')
+                        if token:
+                            break
+            if not token:
+                logger.warning(f"User endpoint returned 200 but no fcm_token for {token_lookup_email}")
+            return token
+        except Exception as e:
+            logger.warning(f"User endpoint error for {token_lookup_email}: {e}")
+            return None
@@ -4,15 +4,16 @@
 import logging
 
 from django.core.management.base import BaseCommand
-from django.db import transaction
 
 from accounts.models import User
-from accounts.firebase_service import firebase_service
-from pets.notifications import create_notification
+from accounts.firebase_service import MULTICAST_MAX_TOKENS, firebase_service
+from pets.campaigns import CampaignRunner, default_campaign_key, is_campaign_completed
 
 
 logger = logging.getLogger(__name__)
 
+CAMPAIGN_KEY_PREFIX = 'app_update'
+
 
 class Command(BaseCommand):
     help = 'إرسال إشعار دفع إلى جميع المستخدمين لتحديث التطبيق و تجربة ميزة التبني الجديدة.'
@@ -23,6 +24,31 @@ class Command(BaseCommand):
             action='store_true',
             help='استعراض عدد المستخدمين المستهدفين بدون إنشاء إشعارات أو إرسال تنبيهات.',
         )
+        parser.add_argument(
+            '--campaign',
+            default=None,
+            help=(
+                'معرف الحملة؛ إعادة التشغيل بنفس المعرف تستأنف من آخر دفعة مكتملة. '
+                'الافتراضي مشتق من العنوان والنص، فتغيير الرسالة يبدأ حملة جديدة.'
+            ),
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='إعادة الحملة من البداية وتجاهل التقدم المحفوظ.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=MULTICAST_MAX_TOKENS,
+            help=f'عدد المستخدمين في كل دفعة multicast (بحد أقصى {MULTICAST_MAX_TOKENS}).',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help='عدد الدفعات المرسلة بالتوازي.',
+        )
 
     def handle(self, *args, **options):
         if not firebase_service.is_initialized and not options['dry_run']:
@@ -37,52 +63,42 @@ class Command(BaseCommand):
             'feature': 'adoption',
         }
 
-        users = User.objects.filter(fcm_token__isnull=False).exclude(fcm_token='').distinct()
+        users = User.objects.filter(fcm_token__isnull=False).exclude(fcm_token='')
         total = users.count()
 
         if options['dry_run']:
             self.stdout.write(self.style.WARNING(f'تشغيل تجريبي: {total} مستخدم سيتم استهدافهم.'))
             return
 
-        sent = 0
-        failures = 0
-
-        self.stdout.write(self.style.NOTICE(f'بدء إرسال الإشعارات إلى {total} مستخدم...'))
+        campaign_key = options['campaign'] or default_campaign_key(CAMPAIGN_KEY_PREFIX, title, body, extra_data)
+        if not options['restart'] and is_campaign_completed(campaign_key):
+            self.stdout.write(self.style.WARNING(
+                f'الحملة "{campaign_key}" مكتملة مسبقاً - لم يتم إرسال شيء. '
+                'استخدم --restart لإعادة إرسالها أو --campaign بمعرف جديد.'
+            ))
+            return
 
-        for user in users.iterator():
-            try:
-                with transaction.atomic():
-                    create_notification(
-                        user=user,
-                        notification_type='system_message',
-                        title=title,
-                        message=body,
-                        extra_data=extra_data,
-                    )
-
-                payload = extra_data.copy()
-                payload.update({
-                    'title': title,
-                    'body': body,
-                })
-
-                success = firebase_service.send_notification(
-                    fcm_token=user.fcm_token,
-                    title=title,
-                    body=body,
-                    data=payload,
-                )
+        runner = CampaignRunner(
+            key=campaign_key,
+            title=title,
+            message=body,
+            extra_data=extra_data,
+            chunk_size=options['chunk_size'],
+            concurrency=options['concurrency'],
+            on_progress=lambda campaign: self.stdout.write(
+                f'التقدم: حتى المستخدم {campaign.last_user_id} - '
+                f'تم {campaign.push_sent} / فشل {campaign.push_failed}'
+            ),
+        )
 
-                if success:
-                    sent += 1
-                else:
-                    failures += 1
-                    logger.warning("فشل إرسال إشعار التحديث إلى المستخدم %s", user.id)
-            except Exception as exc:
-                failures += 1
-                logger.exception("حدث خطأ أثناء إرسال إشعار التحديث للمستخدم %s: %s", user.id, exc)
+        self.stdout.write(self.style.NOTICE(f'بدء إرسال الإشعارات إلى {total} مستخدم...'))
+        campaign = runner.run(users, restart=options['restart'])
 
-        self.stdout.write(self.style.SUCCESS(f'تم إرسال {sent} إشعار بنجاح.'))
+        self.stdout.write(self.style.SUCCESS(f'تم إرسال {campaign.push_sent} إشعار بنجاح.'))
 
-        if failures:
-            self.stdout.write(self.style.WARNING(f'لم يتم إرسال {failures} إشعار بسبب أخطاء موثقة في السجلات.'))
+        if campaign.push_failed:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'لم يتم إرسال {campaign.push_failed} إشعار؛ راجع نتائج الحملة "{campaign.key}" لمعرفة الأسباب.'
+                )
+            )
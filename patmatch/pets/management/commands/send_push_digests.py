@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from pets.models import DeferredPush
+from pets.push_policy import in_quiet_hours, send_digests
+
+
+class Command(BaseCommand):
+    help = (
+        'إرسال ملخص واحد لكل مستخدم بإشعارات الدفع المؤجلة بسبب حد الإرسال أو ساعات الهدوء '
+        '(يُشغّل كل 30 دقيقة تقريباً؛ لا يرسل شيئاً أثناء ساعات الهدوء)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='عرض عدد المستخدمين والإشعارات المؤجلة بدون إرسال',
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            pending = DeferredPush.objects.count()
+            users = DeferredPush.objects.values('user_id').distinct().count()
+            quiet = ' (ساعات الهدوء)' if in_quiet_hours() else ''
+            self.stdout.write(self.style.WARNING(f'[DRY RUN] {pending} إشعار مؤجل لـ {users} مستخدم{quiet}'))
+            return
+
+        sent = send_digests()
+        self.stdout.write(self.style.SUCCESS(f'تم إرسال {sent} ملخص'))
@@ -5,14 +5,15 @@ import json
 import logging
 
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
 
 from accounts.models import User
-from accounts.firebase_service import firebase_service
-from pets.notifications import create_notification
+from accounts.firebase_service import MULTICAST_MAX_TOKENS, firebase_service
+from pets.campaigns import CampaignRunner, default_campaign_key, is_campaign_completed
 
 logger = logging.getLogger(__name__)
 
+CAMPAIGN_KEY_PREFIX = "system_issue_apology"
+
 DEFAULT_TITLE = "نعتذر عن الانقطاع المفاجئ"
 DEFAULT_MESSAGE = (
     "واجهنا مشكلة تقنية خلال الساعات الماضية لكن تم حلها الآن. "
@@ -45,6 +46,31 @@ class Command(BaseCommand):
             action="store_true",
             help="استعراض عدد المستخدمين المستهدفين بدون إنشاء إشعارات أو إرسال تنبيهات.",
         )
+        parser.add_argument(
+            "--campaign",
+            default=None,
+            help=(
+                "معرف الحملة؛ إعادة التشغيل بنفس المعرف تستأنف من آخر دفعة مكتملة. "
+                "الافتراضي مشتق من العنوان والنص، فتغيير الرسالة يبدأ حملة جديدة."
+            ),
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="إعادة الحملة من البداية وتجاهل التقدم المحفوظ.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=MULTICAST_MAX_TOKENS,
+            help=f"عدد المستخدمين في كل دفعة multicast (بحد أقصى {MULTICAST_MAX_TOKENS}).",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="عدد الدفعات المرسلة بالتوازي.",
+        )
 
     def handle(self, *args, **options):
         title = options["title"]
@@ -78,73 +104,50 @@ class Command(BaseCommand):
             )
             return
 
-        firebase_ready = firebase_service.is_initialized
-        if not firebase_ready:
+        campaign_key = options["campaign"] or default_campaign_key(CAMPAIGN_KEY_PREFIX, title, message, extra_data)
+        if not options["restart"] and is_campaign_completed(campaign_key):
+            self.stdout.write(
+                self.style.WARNING(
+                    f'الحملة "{campaign_key}" مكتملة مسبقاً - لم يتم إرسال شيء. '
+                    "استخدم --restart لإعادة إرسالها أو --campaign بمعرف جديد."
+                )
+            )
+            return
+
+        if not firebase_service.is_initialized:
             self.stdout.write(
                 self.style.WARNING(
                     "خدمة Firebase غير مهيأة حالياً؛ سيتم إنشاء الإشعارات بدون إرسال تنبيهات دفع."
                 )
             )
 
-        created_notifications = 0
-        push_sent = 0
-        push_failed = 0
-        skipped_push = 0
+        runner = CampaignRunner(
+            key=campaign_key,
+            title=title,
+            message=message,
+            extra_data=extra_data,
+            chunk_size=options["chunk_size"],
+            concurrency=options["concurrency"],
+            on_progress=lambda campaign: self.stdout.write(
+                f"التقدم: حتى المستخدم {campaign.last_user_id} - "
+                f"{campaign.notifications_created} إشعار، {campaign.push_sent} تنبيه دفع"
+            ),
+        )
 
         self.stdout.write(
             self.style.NOTICE(
-                f"بدء إرسال إشعار الاعتذار إلى {total_users} مستخدم..."
+                f"بدء إرسال إشعار الاعتذار إلى {total_users} مستخدم (الحملة: {campaign_key})..."
             )
         )
 
-        for user in users.iterator():
-            try:
-                with transaction.atomic():
-                    create_notification(
-                        user=user,
-                        notification_type="system_message",
-                        title=title,
-                        message=message,
-                        extra_data=extra_data,
-                    )
-                    created_notifications += 1
-            except Exception as exc:
-                logger.exception("تعذّر إنشاء إشعار للمستخدم %s: %s", user.id, exc)
-                continue
-
-            if not firebase_ready or not user.fcm_token:
-                skipped_push += 1
-                continue
-
-            payload = extra_data.copy()
-            payload.update({"title": title, "body": message})
-
-            try:
-                success = firebase_service.send_notification(
-                    fcm_token=user.fcm_token,
-                    title=title,
-                    body=message,
-                    data=payload,
-                )
-            except Exception as exc:
-                push_failed += 1
-                logger.exception(
-                    "حدث خطأ أثناء إرسال إشعار الاعتذار للمستخدم %s: %s",
-                    user.id,
-                    exc,
-                )
-                continue
-
-            if success:
-                push_sent += 1
-            else:
-                push_failed += 1
+        campaign = runner.run(users, restart=options["restart"])
+        skipped_push = campaign.deliveries.filter(status="skipped").count()
 
         self.stdout.write(
             self.style.SUCCESS(
-                f"تم إنشاء {created_notifications} إشعار اعتذار في قاعدة البيانات."
+                f"تم إنشاء {campaign.notifications_created} إشعار اعتذار في قاعدة البيانات."
             )
         )
         self.stdout.write(
-            f"تم إرسال {push_sent} تنبيه دفع، فشل {push_failed}, وتخطّي {skipped_push} بسبب عدم توفر FCM token أو خدمة Firebase."
+            f"تم إرسال {campaign.push_sent} تنبيه دفع، فشل {campaign.push_failed}, وتخطّي {skipped_push} بسبب عدم توفر FCM token أو خدمة Firebase."
         )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from pets.push_topics import subscribe_missing, topics_enabled
+
+
+class Command(BaseCommand):
+    help = 'اشتراك كل المستخدمين الذين لم يُشتركوا بعد في مواضيع التنبيهات الجغرافية (يُشغّل مرة عند التفعيل)'
+
+    def handle(self, *args, **options):
+        if not topics_enabled():
+            raise CommandError('مواضيع التنبيهات غير مفعلة (NEARBY_ALERT_TOPICS) أو Firebase غير مهيأ')
+
+        users = User.objects.exclude(fcm_token__isnull=True).exclude(fcm_token='').exclude(
+            latitude__isnull=True
+        ).exclude(longitude__isnull=True).only(
+            'id', 'fcm_token', 'latitude', 'longitude', 'notify_breeding_requests', 'notify_adoption_pets'
+        )
+        count = subscribe_missing(users.iterator(chunk_size=1000))
+        self.stdout.write(self.style.SUCCESS(f'تم اشتراك {count} مستخدم'))
@@ -1,20 +1,35 @@
+import hashlib
 import json
 import mimetypes
 import os
+import sqlite3
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Set
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.client import Config
 from botocore.exceptions import BotoCoreError, ClientError
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 
+from patmatch_backend.storage import cache_control_for
+
 
 MAX_UPLOAD_RETRIES = 3
+# Pinned so ETags of our own multipart uploads can be reproduced locally.
+MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+TRANSFER_CONFIG = TransferConfig(multipart_threshold=MULTIPART_CHUNKSIZE, multipart_chunksize=MULTIPART_CHUNKSIZE)
+HASH_READ_SIZE = 1024 * 1024
+# Bounded queue so the walk never runs far ahead of the uploads.
+IN_FLIGHT_PER_WORKER = 4
+MANIFEST_COMMIT_EVERY = 500
+WATCH_SETTLE_SECONDS = 2.0
 
 
 @dataclass
@@ -22,6 +37,13 @@ class MediaFileEntry:
     local_path: Path
     key: str
     size: int
+    mtime_ns: int = 0
+
+
+@dataclass
+class RemoteObject:
+    size: int
+    etag: str
 
 
 @dataclass
@@ -30,6 +52,56 @@ class SyncResult:
     key: str
     size: int
     error: str = ""
+    md5: str = ""
+
+
+class SyncManifest:
+    """SQLite record of synced files (path, size, mtime, hash, uploaded_at) per bucket/key."""
+
+    def __init__(self, path: Path, bucket: str):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.bucket = bucket
+        self.connection = sqlite3.connect(str(path))
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS synced_files ("
+            " bucket TEXT NOT NULL, key TEXT NOT NULL, path TEXT NOT NULL, size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL, md5 TEXT NOT NULL, uploaded_at TEXT NOT NULL,"
+            " PRIMARY KEY (bucket, key))"
+        )
+        self._pending = 0
+
+    def is_unchanged(self, entry: MediaFileEntry) -> bool:
+        row = self.connection.execute(
+            "SELECT size, mtime_ns FROM synced_files WHERE bucket = ? AND key = ?",
+            (self.bucket, entry.key),
+        ).fetchone()
+        return row is not None and row[0] == entry.size and row[1] == entry.mtime_ns
+
+    def record(self, entry: MediaFileEntry, md5: str):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO synced_files (bucket, key, path, size, mtime_ns, md5, uploaded_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                self.bucket,
+                entry.key,
+                str(entry.local_path),
+                entry.size,
+                entry.mtime_ns,
+                md5,
+                datetime.now(timezone.utc).isoformat(),
+            ),
+        )
+        self._pending += 1
+        if self._pending >= MANIFEST_COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        self.connection.commit()
+        self._pending = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
 
 
 class Command(BaseCommand):
@@ -43,6 +115,11 @@ class Command(BaseCommand):
             action="store_true",
             help="Skip upload when object exists with same size.",
         )
+        parser.add_argument(
+            "--inventory",
+            action="store_true",
+            help="List the bucket once and skip objects whose size and MD5/ETag match (no per-file HEAD).",
+        )
         parser.add_argument(
             "--overwrite",
             action="store_true",
@@ -66,18 +143,55 @@ class Command(BaseCommand):
             default=0,
             help="Optional max number of files to process.",
         )
+        parser.add_argument(
+            "--manifest",
+            type=str,
+            default="",
+            help="Local SQLite manifest of synced files; later runs only upload new or changed files "
+            "(default: $MEDIA_SYNC_MANIFEST).",
+        )
+        parser.add_argument(
+            "--watch",
+            action="store_true",
+            help="After the initial pass, keep polling --watch-dirs and upload new files (requires --manifest).",
+        )
+        parser.add_argument(
+            "--watch-dirs",
+            type=str,
+            default="pets,chat_images,clinics",
+            help="Comma-separated MEDIA_ROOT subdirectories to watch (default: pets,chat_images,clinics).",
+        )
+        parser.add_argument(
+            "--watch-interval",
+            type=float,
+            default=5.0,
+            help="Seconds between watch polls (default: 5).",
+        )
+        parser.add_argument(
+            "--watch-cycles",
+            type=int,
+            default=0,
+            help="Stop watching after N polls (default: 0, run until interrupted).",
+        )
 
     def handle(self, *args, **options):
         workers = max(1, int(options["workers"] or 1))
         skip_existing = bool(options["skip_existing"])
+        use_inventory = bool(options["inventory"])
         overwrite = bool(options["overwrite"])
         dry_run = bool(options["dry_run"])
         prefix = self._normalize_prefix(options.get("prefix") or "")
         limit = int(options.get("limit") or 0)
         report_json = (options.get("report_json") or "").strip()
+        manifest_path = (options.get("manifest") or os.environ.get("MEDIA_SYNC_MANIFEST", "")).strip()
+        watch = bool(options["watch"])
 
         if skip_existing and overwrite:
             raise CommandError("Choose either --skip-existing or --overwrite, not both.")
+        if use_inventory and (skip_existing or overwrite):
+            raise CommandError("--inventory cannot be combined with --skip-existing or --overwrite.")
+        if watch and (not manifest_path or dry_run):
+            raise CommandError("--watch requires --manifest and cannot be combined with --dry-run.")
 
         media_root = Path(settings.MEDIA_ROOT)
         if not media_root.exists() or not media_root.is_dir():
@@ -85,72 +199,134 @@ class Command(BaseCommand):
 
         s3_client, bucket = self._build_s3_client_from_env()
 
-        entries = self._collect_media_files(media_root, prefix=prefix, limit=limit if limit > 0 else None)
-        total_files = len(entries)
-        if total_files == 0:
-            self.stdout.write(self.style.WARNING("No media files found to process."))
-            return
+        inventory: Optional[Dict[str, RemoteObject]] = None
+        if use_inventory:
+            inventory = self._list_bucket_inventory(s3_client, bucket, prefix)
+            self.stdout.write(f"Bucket inventory: {len(inventory)} object(s) under prefix '{prefix}'")
+
+        manifest = SyncManifest(Path(manifest_path), bucket) if manifest_path else None
+        exclude = {Path(manifest_path).resolve()} if manifest_path else set()
+        sync = partial(
+            self._sync_single_file,
+            s3_client,
+            bucket,
+            dry_run=dry_run,
+            skip_existing=skip_existing,
+            overwrite=overwrite,
+            inventory=inventory,
+            hash_files=manifest is not None,
+        )
 
         self.stdout.write(
-            f"Starting media sync: files={total_files}, dry_run={dry_run}, workers={workers}, "
-            f"skip_existing={skip_existing}, overwrite={overwrite}, bucket={bucket}"
+            f"Starting media sync: dry_run={dry_run}, workers={workers}, skip_existing={skip_existing}, "
+            f"inventory={use_inventory}, overwrite={overwrite}, manifest={manifest_path or None}, bucket={bucket}"
         )
 
+        started_at = time.time()
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                entries = self._iter_media_files(
+                    media_root, media_root, prefix=prefix, limit=limit if limit > 0 else None, exclude=exclude
+                )
+                summary, failures = self._run_pass(executor, sync, entries, manifest, workers, verbose=True)
+
+                if summary["scanned"] == 0 and not watch:
+                    self.stdout.write(self.style.WARNING("No media files found to process."))
+                    return
+
+                elapsed = round(time.time() - started_at, 2)
+                self._finish_report(
+                    summary, failures, elapsed, report_json,
+                    {
+                        "bucket": bucket,
+                        "media_root": str(media_root),
+                        "prefix": prefix,
+                        "dry_run": dry_run,
+                        "skip_existing": skip_existing,
+                        "inventory": use_inventory,
+                        "inventory_objects": len(inventory) if inventory is not None else None,
+                        "overwrite": overwrite,
+                        "manifest": manifest_path or None,
+                        "workers": workers,
+                    },
+                )
+
+                if watch:
+                    self._watch(
+                        executor,
+                        sync,
+                        media_root,
+                        prefix,
+                        manifest,
+                        workers,
+                        watch_dirs=[d.strip().strip("/") for d in options["watch_dirs"].split(",") if d.strip()],
+                        interval=max(0.1, float(options["watch_interval"])),
+                        max_cycles=int(options["watch_cycles"] or 0),
+                        exclude=exclude,
+                    )
+        finally:
+            if manifest is not None:
+                manifest.close()
+
+        if summary["failed"] > 0:
+            raise CommandError(f"Media sync completed with failures: {summary['failed']} object(s) failed.")
+
+    def _run_pass(self, executor, sync, entries: Iterator[MediaFileEntry], manifest, workers: int, verbose: bool):
+        """Upload entries as the walk yields them, keeping at most a few batches in flight."""
         summary: Dict[str, int] = {
-            "scanned": total_files,
+            "scanned": 0,
+            "unchanged": 0,
             "uploaded": 0,
             "skipped": 0,
             "failed": 0,
             "would_upload": 0,
         }
         failures: List[Dict[str, str]] = []
-        started_at = time.time()
-
-        with ThreadPoolExecutor(max_workers=workers) as executor:
-            futures = [
-                executor.submit(
-                    self._sync_single_file,
-                    s3_client,
-                    bucket,
-                    entry,
-                    dry_run,
-                    skip_existing,
-                    overwrite,
-                )
-                for entry in entries
-            ]
+        in_flight: Dict = {}
+        processed = 0
 
-            for index, future in enumerate(as_completed(futures), start=1):
+        def collect(done):
+            nonlocal processed
+            for future in done:
+                entry = in_flight.pop(future)
                 result: SyncResult = future.result()
                 summary[result.status] = summary.get(result.status, 0) + 1
                 if result.status == "failed":
                     failures.append({"key": result.key, "error": result.error})
-
-                if index % 100 == 0 or index == total_files:
+                elif manifest is not None and result.status in ("uploaded", "skipped"):
+                    manifest.record(entry, result.md5)
+                processed += 1
+                if verbose and processed % 100 == 0:
                     self.stdout.write(
-                        f"Progress {index}/{total_files} - uploaded={summary['uploaded']} "
-                        f"skipped={summary['skipped']} failed={summary['failed']} "
+                        f"Progress {processed} (scanned={summary['scanned']}) - uploaded={summary['uploaded']} "
+                        f"skipped={summary['skipped']} unchanged={summary['unchanged']} failed={summary['failed']} "
                         f"would_upload={summary['would_upload']}"
                     )
 
-        elapsed = round(time.time() - started_at, 2)
-        report_payload = {
-            "bucket": bucket,
-            "media_root": str(media_root),
-            "prefix": prefix,
-            "dry_run": dry_run,
-            "skip_existing": skip_existing,
-            "overwrite": overwrite,
-            "workers": workers,
-            "elapsed_seconds": elapsed,
-            "summary": summary,
-            "failures": failures,
-        }
+        for entry in entries:
+            summary["scanned"] += 1
+            if manifest is not None and manifest.is_unchanged(entry):
+                summary["unchanged"] += 1
+                continue
+            in_flight[executor.submit(sync, entry)] = entry
+            if len(in_flight) >= workers * IN_FLIGHT_PER_WORKER:
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                collect(done)
+        if in_flight:
+            done, _ = wait(list(in_flight))
+            collect(done)
+        if manifest is not None:
+            manifest.commit()
+        return summary, failures
+
+    def _finish_report(self, summary, failures, elapsed, report_json: str, report_payload: Dict):
+        report_payload = dict(report_payload, elapsed_seconds=elapsed, summary=summary, failures=failures)
 
         self.stdout.write(
             self.style.SUCCESS(
-                f"Sync finished in {elapsed}s | scanned={summary['scanned']} uploaded={summary['uploaded']} "
-                f"skipped={summary['skipped']} failed={summary['failed']} would_upload={summary['would_upload']}"
+                f"Sync finished in {elapsed}s | scanned={summary['scanned']} unchanged={summary['unchanged']} "
+                f"uploaded={summary['uploaded']} skipped={summary['skipped']} failed={summary['failed']} "
+                f"would_upload={summary['would_upload']}"
             )
         )
 
@@ -163,8 +339,47 @@ class Command(BaseCommand):
             report_path.write_text(json.dumps(report_payload, ensure_ascii=False, indent=2), encoding="utf-8")
             self.stdout.write(self.style.SUCCESS(f"Wrote report: {report_path}"))
 
-        if summary["failed"] > 0:
-            raise CommandError(f"Media sync completed with failures: {summary['failed']} object(s) failed.")
+    def _watch(
+        self,
+        executor,
+        sync,
+        media_root: Path,
+        prefix: str,
+        manifest: "SyncManifest",
+        workers: int,
+        watch_dirs: List[str],
+        interval: float,
+        max_cycles: int,
+        exclude: Set[Path],
+    ):
+        """Poll watch_dirs and upload files that are new or changed since the manifest last saw them."""
+        self.stdout.write(f"Watching {', '.join(watch_dirs)} every {interval}s (Ctrl+C to stop)")
+        cycle = 0
+        try:
+            while not max_cycles or cycle < max_cycles:
+                cycle += 1
+                time.sleep(interval)
+                # Files touched within the settle window may still be written; pick them up next cycle.
+                settled_before_ns = time.time_ns() - int(WATCH_SETTLE_SECONDS * 1e9)
+                for directory in watch_dirs:
+                    root = media_root / directory
+                    if not root.is_dir():
+                        continue
+                    entries = (
+                        entry
+                        for entry in self._iter_media_files(root, media_root, prefix=prefix, exclude=exclude)
+                        if entry.mtime_ns <= settled_before_ns
+                    )
+                    summary, failures = self._run_pass(executor, sync, entries, manifest, workers, verbose=False)
+                    if summary["uploaded"] or summary["failed"]:
+                        self.stdout.write(
+                            f"[{directory}] uploaded={summary['uploaded']} skipped={summary['skipped']} "
+                            f"failed={summary['failed']}"
+                        )
+                    for failure in failures:
+                        self.stdout.write(self.style.WARNING(f"Failed {failure['key']}: {failure['error']}"))
+        except KeyboardInterrupt:
+            self.stdout.write("Watch stopped.")
 
     def _build_s3_client_from_env(self):
         endpoint = os.environ.get("HETZNER_S3_ENDPOINT_URL", "").strip()
@@ -200,22 +415,42 @@ class Command(BaseCommand):
         )
         return client, bucket
 
-    def _collect_media_files(
+    def _iter_media_files(
         self,
+        directory: Path,
         media_root: Path,
         prefix: str,
         limit: Optional[int] = None,
-    ) -> List[MediaFileEntry]:
-        files: List[MediaFileEntry] = []
-        for file_path in sorted(media_root.rglob("*")):
-            if not file_path.is_file():
+        exclude: Optional[Set[Path]] = None,
+    ) -> Iterator[MediaFileEntry]:
+        """Walk directory depth-first with os.scandir, sorting one directory at a time."""
+        count = 0
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as scanner:
+                    children = sorted(scanner, key=lambda item: item.name)
+            except OSError:
                 continue
-            relative = file_path.relative_to(media_root).as_posix()
-            key = f"{prefix}/{relative}" if prefix else relative
-            files.append(MediaFileEntry(local_path=file_path, key=key, size=file_path.stat().st_size))
-            if limit and len(files) >= limit:
-                break
-        return files
+            subdirectories = []
+            for child in children:
+                if child.is_dir():
+                    subdirectories.append(Path(child.path))
+                    continue
+                if not child.is_file():
+                    continue
+                file_path = Path(child.path)
+                if exclude and file_path.resolve() in exclude:
+                    continue
+                stat = child.stat()
+                relative = file_path.relative_to(media_root).as_posix()
+                key = f"{prefix}/{relative}" if prefix else relative
+                yield MediaFileEntry(local_path=file_path, key=key, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                count += 1
+                if limit and count >= limit:
+                    return
+            stack.extend(reversed(subdirectories))
 
     def _sync_single_file(
         self,
@@ -225,17 +460,27 @@ class Command(BaseCommand):
         dry_run: bool,
         skip_existing: bool,
         overwrite: bool,
+        inventory: Optional[Dict[str, RemoteObject]] = None,
+        hash_files: bool = False,
     ) -> SyncResult:
         try:
-            if skip_existing:
+            if inventory is not None:
+                remote = inventory.get(entry.key)
+                if remote is not None and self._matches_remote(entry, remote):
+                    return SyncResult(
+                        status="skipped", key=entry.key, size=entry.size, md5=self._hash_if(entry, hash_files)
+                    )
+            elif skip_existing:
                 remote_size = self._head_object_size(s3_client, bucket, entry.key)
                 if remote_size is not None and remote_size == entry.size:
-                    return SyncResult(status="skipped", key=entry.key, size=entry.size)
+                    return SyncResult(
+                        status="skipped", key=entry.key, size=entry.size, md5=self._hash_if(entry, hash_files)
+                    )
 
             if dry_run:
                 return SyncResult(status="would_upload", key=entry.key, size=entry.size)
 
-            extra_args = {"ACL": "public-read"}
+            extra_args = {"ACL": "public-read", "CacheControl": cache_control_for(entry.key)}
             guessed_type, _ = mimetypes.guess_type(str(entry.local_path))
             if guessed_type:
                 extra_args["ContentType"] = guessed_type
@@ -247,8 +492,11 @@ class Command(BaseCommand):
                         bucket,
                         entry.key,
                         ExtraArgs=extra_args,
+                        Config=TRANSFER_CONFIG,
+                    )
+                    return SyncResult(
+                        status="uploaded", key=entry.key, size=entry.size, md5=self._hash_if(entry, hash_files)
                     )
-                    return SyncResult(status="uploaded", key=entry.key, size=entry.size)
                 except (ClientError, BotoCoreError) as exc:
                     if attempt >= MAX_UPLOAD_RETRIES:
                         return SyncResult(
@@ -273,5 +521,66 @@ class Command(BaseCommand):
                 return None
             raise
 
+    def _hash_if(self, entry: MediaFileEntry, enabled: bool) -> str:
+        return self._md5_parts(entry.local_path, chunk_size=None) if enabled else ""
+
+    def _list_bucket_inventory(self, s3_client, bucket: str, prefix: str) -> Dict[str, RemoteObject]:
+        inventory: Dict[str, RemoteObject] = {}
+        paginator = s3_client.get_paginator("list_objects_v2")
+        try:
+            for page in paginator.paginate(Bucket=bucket, Prefix=f"{prefix}/" if prefix else ""):
+                for item in page.get("Contents", []):
+                    inventory[item["Key"]] = RemoteObject(
+                        size=int(item.get("Size") or 0),
+                        etag=str(item.get("ETag") or "").strip('"'),
+                    )
+        except (ClientError, BotoCoreError) as exc:
+            raise CommandError(f"Failed to list bucket {bucket}: {exc}") from exc
+        return inventory
+
+    def _matches_remote(self, entry: MediaFileEntry, remote: RemoteObject) -> bool:
+        if remote.size != entry.size or not remote.etag:
+            return False
+        etag, _, parts = remote.etag.partition("-")
+        if not parts:
+            return self._md5_parts(entry.local_path, chunk_size=None) == etag
+        try:
+            part_count = int(parts)
+        except ValueError:
+            return False
+        chunk_size = MULTIPART_CHUNKSIZE
+        if -(-entry.size // chunk_size) != part_count:
+            # Uploaded with a different part size; assume whole MiB parts.
+            mib = 1024 * 1024
+            chunk_size = -(-entry.size // part_count)
+            chunk_size = -(-chunk_size // mib) * mib
+        return self._md5_parts(entry.local_path, chunk_size=chunk_size) == remote.etag
+
+    def _md5_parts(self, path: Path, chunk_size: Optional[int]) -> str:
+        """Plain MD5 hex digest, or the S3 multipart ETag ("<md5 of part md5s>-<n>") for chunk_size."""
+        if chunk_size is None:
+            digest = hashlib.md5()
+            with open(path, "rb") as handle:
+                for block in iter(lambda: handle.read(HASH_READ_SIZE), b""):
+                    digest.update(block)
+            return digest.hexdigest()
+
+        part_digests = []
+        with open(path, "rb") as handle:
+            while True:
+                part = hashlib.md5()
+                remaining = chunk_size
+                while remaining > 0:
+                    block = handle.read(min(HASH_READ_SIZE, remaining))
+                    if not block:
+                        break
+                    part.update(block)
+                    remaining -= len(block)
+                if remaining == chunk_size:
+                    break
+                part_digests.append(part.digest())
+        combined = hashlib.md5(b"".join(part_digests)).hexdigest()
+        return f"{combined}-{len(part_digests)}"
+
     def _normalize_prefix(self, value: str) -> str:
         return value.strip().strip("/")
@@ -0,0 +1,249 @@
+"""
+مطابقة الحيوانات القريبة باستخدام NumPy.
+
+تُحوّل الإحداثيات إلى مصفوفات راديان وتُقسّم إلى شبكة خلايا بحجم نصف قطر البحث،
+فلا تُحسب المسافة إلا بين الحيوانات في الخلايا المتجاورة. تُحسب المسافات لكل
+خلية دفعة واحدة (مصفوفة) ويُحتفظ بأفضل النتائج لكل مالك عبر heap.
+"""
+import heapq
+import math
+from typing import Dict, Hashable, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# الحد الأقصى لعدد عناصر مصفوفة المسافات في الدفعة الواحدة (للتحكم في الذاكرة)
+MAX_BLOCK_ELEMENTS = 2_000_000
+
+
+def haversine_km_array(lat1, lng1, lat2, lng2):
+    """معادلة هافرسين على مصفوفات بالراديان (تدعم broadcasting)."""
+    dlat = lat2 - lat1
+    dlng = lng2 - lng1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    مستطيل الإحداثيات (min_lat, max_lat, min_lng, max_lng) الذي يحيط بدائرة نصف قطرها radius_km.
+    يُستخدم كفلتر أولي في الاستعلامات؛ تكون حدود خط الطول None إذا شمل المستطيل القطب أو خط 180.
+    """
+    lat = float(latitude)
+    lng = float(longitude)
+    delta_lat = radius_km / KM_PER_DEGREE
+    min_lat = max(-90.0, lat - delta_lat)
+    max_lat = min(90.0, lat + delta_lat)
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    ratio = math.sin(radius_km / (2 * EARTH_RADIUS_KM)) / cos_lat if cos_lat > 1e-9 else 2.0
+    if ratio >= 1.0:
+        return min_lat, max_lat, None, None
+    delta_lng = math.degrees(2 * math.asin(ratio))
+    if lng - delta_lng < -180.0 or lng + delta_lng > 180.0:
+        return min_lat, max_lat, None, None
+    return min_lat, max_lat, lng - delta_lng, lng + delta_lng
+
+
+def _encode(values):
+    """ترميز القيم النصية إلى أرقام صحيحة لمقارنتها داخل NumPy."""
+    codes = {}
+    encoded = np.fromiter(
+        (codes.setdefault(value, len(codes)) for value in values),
+        dtype=np.int64,
+        count=len(values),
+    )
+    return encoded, codes
+
+
+class NearbyPetMatcher:
+    """
+    فهرس مكاني للحيوانات يدعم البحث عن الأقرب وترشيحات التزاوج لكل مالك.
+
+    Args:
+        pets: قائمة قواميس تحتوي على latitude, longitude, pet_type, gender, owner
+              (owner أي مفتاح يميز المالك مثل البريد أو المعرف)
+        max_distance_km: نصف قطر البحث؛ يحدد أيضاً حجم خلايا الشبكة
+    """
+
+    def __init__(self, pets: Iterable[Mapping], max_distance_km: float = 50.0):
+        self.max_distance_km = float(max_distance_km)
+        self.pets: List[Mapping] = []
+        lat_deg = []
+        lng_deg = []
+        for pet in pets:
+            try:
+                lat = float(pet['latitude'])
+                lng = float(pet['longitude'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+                continue
+            self.pets.append(pet)
+            lat_deg.append(lat)
+            lng_deg.append(lng)
+
+        lat_deg = np.asarray(lat_deg, dtype=np.float64)
+        lng_deg = np.asarray(lng_deg, dtype=np.float64)
+        self.lat = np.radians(lat_deg)
+        self.lng = np.radians(lng_deg)
+        self.type_codes, self._type_index = _encode([str(p.get('pet_type') or '') for p in self.pets])
+        self.gender_codes, self._gender_index = _encode([str(p.get('gender') or '') for p in self.pets])
+        self.owner_codes, self._owner_index = _encode([p.get('owner') for p in self.pets])
+        self._owners = list(self._owner_index)
+
+        self.cell_deg = min(max(self.max_distance_km / KM_PER_DEGREE, 1e-4), 180.0)
+        self._n_rows = int(math.ceil(180.0 / self.cell_deg)) + 1
+        self._n_cols = int(math.ceil(360.0 / self.cell_deg))
+        rows = np.floor((lat_deg + 90.0) / self.cell_deg).astype(np.int64)
+        cols = np.floor((lng_deg + 180.0) / self.cell_deg).astype(np.int64) % self._n_cols
+        self._cells: Dict[Tuple[int, int], np.ndarray] = {}
+        if len(self.pets):
+            keys = rows * self._n_cols + cols
+            order = np.argsort(keys, kind='stable')
+            unique_keys, starts = np.unique(keys[order], return_index=True)
+            bounds = list(starts) + [len(order)]
+            for position, key in enumerate(unique_keys):
+                row, col = divmod(int(key), self._n_cols)
+                self._cells[(row, col)] = order[bounds[position]:bounds[position + 1]]
+
+    def __len__(self):
+        return len(self.pets)
+
+    def _cell_of(self, lat_deg, lng_deg):
+        row = int(math.floor((lat_deg + 90.0) / self.cell_deg))
+        col = int(math.floor((lng_deg + 180.0) / self.cell_deg)) % self._n_cols
+        return row, col
+
+    def _neighbour_indices(self, row, col):
+        """فهارس الحيوانات في الخلايا التي قد تقع ضمن نصف القطر من الخلية (row, col)."""
+        low_lat = max(-90.0, (row - 1) * self.cell_deg - 90.0)
+        high_lat = min(90.0, (row + 2) * self.cell_deg - 90.0)
+        max_abs_lat = max(abs(low_lat), abs(high_lat))
+        cos_lat = math.cos(math.radians(max_abs_lat))
+        ratio = math.sin(self.max_distance_km / (2 * EARTH_RADIUS_KM)) / cos_lat if cos_lat > 1e-9 else 2.0
+        if ratio >= 1.0:
+            col_range = range(self._n_cols)
+        else:
+            span_deg = math.degrees(2 * math.asin(ratio))
+            span = int(math.ceil(span_deg / self.cell_deg))
+            if 2 * span + 1 >= self._n_cols:
+                col_range = range(self._n_cols)
+            else:
+                col_range = (c % self._n_cols for c in range(col - span, col + span + 1))
+
+        col_list = list(col_range)
+        chunks = [
+            self._cells[(r, c)]
+            for r in (row - 1, row, row + 1)
+            for c in col_list
+            if (r, c) in self._cells
+        ]
+        if not chunks:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(chunks)
+
+    def nearest(
+        self,
+        latitude,
+        longitude,
+        limit: Optional[int] = None,
+        pet_type: Optional[str] = None,
+        exclude_gender: Optional[str] = None,
+        exclude_owner: Optional[Hashable] = None,
+    ) -> List[Tuple[Mapping, float]]:
+        """الحيوانات ضمن max_distance_km من نقطة معينة مرتبة حسب المسافة."""
+        if not len(self.pets):
+            return []
+        lat_deg, lng_deg = float(latitude), float(longitude)
+        candidates = self._neighbour_indices(*self._cell_of(lat_deg, lng_deg))
+        if pet_type is not None:
+            code = self._type_index.get(str(pet_type))
+            candidates = candidates[self.type_codes[candidates] == code] if code is not None else candidates[:0]
+        if exclude_gender is not None:
+            code = self._gender_index.get(str(exclude_gender))
+            if code is not None:
+                candidates = candidates[self.gender_codes[candidates] != code]
+        if exclude_owner is not None:
+            code = self._owner_index.get(exclude_owner)
+            if code is not None:
+                candidates = candidates[self.owner_codes[candidates] != code]
+        if not len(candidates):
+            return []
+
+        distances = haversine_km_array(
+            math.radians(lat_deg), math.radians(lng_deg), self.lat[candidates], self.lng[candidates]
+        )
+        within = distances <= self.max_distance_km
+        candidates = candidates[within]
+        distances = distances[within]
+        if limit is not None and limit < len(candidates):
+            top = np.argpartition(distances, limit - 1)[:limit]
+            candidates, distances = candidates[top], distances[top]
+        order = np.argsort(distances, kind='stable')
+        return [(self.pets[int(candidates[i])], round(float(distances[i]), 2)) for i in order]
+
+    def recommend_by_owner(
+        self,
+        limit_per_user: int,
+        owners: Optional[Sequence[Hashable]] = None,
+    ) -> Dict[Hashable, List[Tuple[Mapping, float]]]:
+        """
+        ترشيحات التزاوج لكل مالك: نفس النوع، جنس مختلف، مالك مختلف، ضمن المسافة.
+        يُحتفظ بأقرب limit_per_user حيوان (دون تكرار) لكل مالك.
+        """
+        if limit_per_user <= 0 or not len(self.pets):
+            return {}
+
+        query_mask = None
+        if owners is not None:
+            codes = [self._owner_index[o] for o in owners if o in self._owner_index]
+            query_mask = np.isin(self.owner_codes, codes)
+
+        best: Dict[int, Dict[int, float]] = {}
+        for (row, col), cell_members in self._cells.items():
+            queries = cell_members if query_mask is None else cell_members[query_mask[cell_members]]
+            if not len(queries):
+                continue
+            candidates = self._neighbour_indices(row, col)
+            k = min(limit_per_user, len(candidates))
+            block = max(1, MAX_BLOCK_ELEMENTS // max(1, len(candidates)))
+            for start in range(0, len(queries), block):
+                q = queries[start:start + block]
+                distances = haversine_km_array(
+                    self.lat[q][:, None], self.lng[q][:, None],
+                    self.lat[candidates][None, :], self.lng[candidates][None, :],
+                )
+                invalid = (
+                    (distances > self.max_distance_km)
+                    | (self.type_codes[q][:, None] != self.type_codes[candidates][None, :])
+                    | (self.gender_codes[q][:, None] == self.gender_codes[candidates][None, :])
+                    | (self.owner_codes[q][:, None] == self.owner_codes[candidates][None, :])
+                )
+                distances[invalid] = np.inf
+                if k < len(candidates):
+                    top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+                else:
+                    top = np.broadcast_to(np.arange(len(candidates)), (len(q), len(candidates)))
+                top_distances = np.take_along_axis(distances, top, axis=1)
+
+                for row_index, query in enumerate(q):
+                    owner_best = None
+                    for candidate_pos, distance in zip(top[row_index], top_distances[row_index]):
+                        if not np.isfinite(distance):
+                            continue
+                        if owner_best is None:
+                            owner_best = best.setdefault(int(self.owner_codes[query]), {})
+                        candidate = int(candidates[candidate_pos])
+                        previous = owner_best.get(candidate)
+                        if previous is None or distance < previous:
+                            owner_best[candidate] = float(distance)
+
+        results = {}
+        for owner_code, matches in best.items():
+            top = heapq.nsmallest(limit_per_user, matches.items(), key=lambda item: (item[1], item[0]))
+            results[self._owners[owner_code]] = [
+                (self.pets[candidate], round(distance, 2)) for candidate, distance in top
+            ]
+        return results
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.17 on 2026-10-19 05:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('pets', '0020_chatroom_clinic_message_chatroom_clinic_patient_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PushCampaign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='معرف الحملة المستخدم للاستئناف', max_length=100, unique=True)),
+                ('title', models.CharField(max_length=200)),
+                ('message', models.TextField()),
+                ('status', models.CharField(choices=[('running', 'قيد التنفيذ'), ('completed', 'مكتملة')], default='running', max_length=20)),
+                ('last_user_id', models.BigIntegerField(default=0, help_text='آخر معرف مستخدم تمت معالجة دفعته بالكامل')),
+                ('notifications_created', models.PositiveIntegerField(default=0)),
+                ('push_sent', models.PositiveIntegerField(default=0)),
+                ('push_failed', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'حملة إشعارات',
+                'verbose_name_plural': 'حملات الإشعارات',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PushCampaignDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fcm_token', models.TextField(blank=True, default='')),
+                ('status', models.CharField(choices=[('pending', 'بانتظار الإرسال'), ('sent', 'تم الإرسال'), ('failed', 'فشل الإرسال'), ('skipped', 'تم التخطي')], max_length=20)),
+                ('error_code', models.CharField(blank=True, default='', max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='pets.pushcampaign')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='campaign_deliveries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'نتيجة إرسال حملة',
+                'verbose_name_plural': 'نتائج إرسال الحملات',
+                'indexes': [models.Index(fields=['campaign', 'status'], name='pets_pushca_campaig_ca153a_idx')],
+                'unique_together': {('campaign', 'user')},
+            },
+        ),
+    ]
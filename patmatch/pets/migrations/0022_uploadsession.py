@@ -0,0 +1,41 @@
+# Generated by Django 4.2.17 on 2026-10-19 05:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('pets', '0021_pushcampaign'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('public_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('purpose', models.CharField(choices=[('pet_image', 'صورة حيوان'), ('pet_certificate', 'شهادة حيوان'), ('chat_image', 'صورة محادثة')], max_length=30)),
+                ('field_name', models.CharField(blank=True, default='', help_text='الحقل الذي يُربط به الملف', max_length=50)),
+                ('key', models.CharField(help_text='مفتاح الملف في التخزين', max_length=300, unique=True)),
+                ('content_type', models.CharField(max_length=100)),
+                ('size', models.PositiveBigIntegerField()),
+                ('status', models.CharField(choices=[('pending', 'بانتظار الرفع'), ('completed', 'مكتملة')], default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('pet', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='pets.pet')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'جلسة رفع',
+                'verbose_name_plural': 'جلسات الرفع',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='pets_upload_status_863826_idx')],
+            },
+        ),
+    ]
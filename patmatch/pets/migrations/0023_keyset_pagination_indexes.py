@@ -0,0 +1,21 @@
+# Generated by Django 4.2.17 on 2026-10-19 05:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0022_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', '-created_at'], name='pets_favori_user_id_e7e2e1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pet',
+            index=models.Index(fields=['-created_at', '-id'], name='pets_pet_created_dc02bc_idx'),
+        ),
+    ]
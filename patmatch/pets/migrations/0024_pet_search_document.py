@@ -0,0 +1,29 @@
+# Generated by Django 4.2.17 on 2026-10-19 05:45
+
+from django.db import migrations, models
+
+from pets.search import drop_search_index, rebuild_search_index
+
+
+def build_search_index(apps, schema_editor):
+    rebuild_search_index(apps.get_model('pets', 'Pet'), schema_editor.connection.alias)
+
+
+def remove_search_index(apps, schema_editor):
+    drop_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0023_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pet',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(build_search_index, remove_search_index),
+    ]
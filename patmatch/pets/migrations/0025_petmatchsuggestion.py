@@ -0,0 +1,34 @@
+# Generated by Django 4.2.17 on 2026-10-19 05:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0024_pet_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PetMatchSuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(help_text='الترتيب (1 = الأقرب)')),
+                ('distance_km', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+                ('partner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pets.pet')),
+                ('pet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='match_suggestions', to='pets.pet')),
+            ],
+            options={
+                'verbose_name': 'اقتراح تزاوج',
+                'verbose_name_plural': 'اقتراحات التزاوج',
+                'ordering': ['pet', 'rank'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='petmatchsuggestion',
+            constraint=models.UniqueConstraint(fields=('pet', 'rank'), name='unique_pet_suggestion_rank'),
+        ),
+    ]
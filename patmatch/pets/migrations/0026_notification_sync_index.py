@@ -0,0 +1,17 @@
+# Generated by Django 4.2.17 on 2026-10-19 05:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0025_petmatchsuggestion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='pets_notifi_user_id_3b1abc_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.17 on 2026-10-19 09:10
+
+from django.db import migrations
+
+from pets.retention import partition_notifications, unpartition_notifications
+
+
+def partition(apps, schema_editor):
+    partition_notifications(schema_editor.connection)
+
+
+def unpartition(apps, schema_editor):
+    unpartition_notifications(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0026_notification_sync_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
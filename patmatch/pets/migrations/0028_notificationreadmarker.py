@@ -0,0 +1,37 @@
+# Generated by Django 4.2.17 on 2026-10-19 05:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('pets', '0027_notification_partitioning'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationReadMarker',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('read_through', models.DateTimeField()),
+                ('chat_room', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pets.chatroom')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_read_markers', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'علامة قراءة الإشعارات',
+                'verbose_name_plural': 'علامات قراءة الإشعارات',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='notificationreadmarker',
+            constraint=models.UniqueConstraint(fields=('user', 'chat_room'), name='unique_chat_read_marker'),
+        ),
+        migrations.AddConstraint(
+            model_name='notificationreadmarker',
+            constraint=models.UniqueConstraint(condition=models.Q(('chat_room__isnull', True)), fields=('user',), name='unique_user_read_marker'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('pets', '0028_notificationreadmarker'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeferredPush',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_type', models.CharField(blank=True, default='', max_length=64)),
+                ('title', models.CharField(max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deferred_pushes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'إشعار دفع مؤجل',
+                'verbose_name_plural': 'إشعارات الدفع المؤجلة',
+                'ordering': ['user', 'id'],
+            },
+        ),
+    ]
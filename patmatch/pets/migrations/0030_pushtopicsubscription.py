@@ -0,0 +1,30 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('pets', '0029_deferredpush'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PushTopicSubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fcm_token', models.TextField(blank=True, default='')),
+                ('topics', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='push_topic_subscription', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'اشتراك مواضيع الإشعارات',
+                'verbose_name_plural': 'اشتراكات مواضيع الإشعارات',
+            },
+        ),
+    ]
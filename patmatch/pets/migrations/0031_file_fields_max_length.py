@@ -0,0 +1,53 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0030_pushtopicsubscription'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pet',
+            name='additional_certificate',
+            field=models.FileField(blank=True, help_text='شهادة إضافية (PDF, JPG, PNG)', max_length=500, null=True, upload_to='pets/certificates/additional/'),
+        ),
+        migrations.AlterField(
+            model_name='pet',
+            name='disease_free_certificate',
+            field=models.FileField(blank=True, help_text='شهادة خلو من الأمراض (PDF, JPG, PNG)', max_length=500, null=True, upload_to='pets/certificates/disease_free/'),
+        ),
+        migrations.AlterField(
+            model_name='pet',
+            name='health_certificate',
+            field=models.FileField(blank=True, help_text='الشهادة الصحية البيطرية (PDF, JPG, PNG)', max_length=500, null=True, upload_to='pets/certificates/health/'),
+        ),
+        migrations.AlterField(
+            model_name='pet',
+            name='image_2',
+            field=models.ImageField(blank=True, max_length=500, null=True, upload_to='pets/'),
+        ),
+        migrations.AlterField(
+            model_name='pet',
+            name='image_3',
+            field=models.ImageField(blank=True, max_length=500, null=True, upload_to='pets/'),
+        ),
+        migrations.AlterField(
+            model_name='pet',
+            name='image_4',
+            field=models.ImageField(blank=True, max_length=500, null=True, upload_to='pets/'),
+        ),
+        migrations.AlterField(
+            model_name='pet',
+            name='main_image',
+            field=models.ImageField(max_length=500, upload_to='pets/main/'),
+        ),
+        migrations.AlterField(
+            model_name='pet',
+            name='vaccination_certificate',
+            field=models.FileField(blank=True, help_text='شهادة التطعيمات (PDF, JPG, PNG)', max_length=500, null=True, upload_to='pets/certificates/vaccination/'),
+        ),
+    ]
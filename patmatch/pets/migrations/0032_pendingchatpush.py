@@ -0,0 +1,25 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0031_file_fields_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingChatPush',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_id', models.BigIntegerField(unique=True)),
+                ('due_at', models.DateTimeField(db_index=True, help_text='نهاية نافذة التأخير')),
+            ],
+            options={
+                'verbose_name': 'إشعار محادثة معلّق',
+                'verbose_name_plural': 'إشعارات المحادثة المعلّقة',
+            },
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+import uuid
+
+from django.db import models, transaction
 from django.conf import settings
 from django.utils import timezone
 from accounts.models import User
@@ -86,33 +88,37 @@ class Pet(models.Model):
         help_text="تفضيل الأليف"
     )
     
-    # صور الحيوان
-    main_image = models.ImageField(upload_to='pets/main/')
-    image_2 = models.ImageField(upload_to='pets/', blank=True, null=True)
-    image_3 = models.ImageField(upload_to='pets/', blank=True, null=True)
-    image_4 = models.ImageField(upload_to='pets/', blank=True, null=True)
+    # صور الحيوان (max_length يتسع لروابط الحاوية الكاملة من الرفع المباشر)
+    main_image = models.ImageField(upload_to='pets/main/', max_length=500)
+    image_2 = models.ImageField(upload_to='pets/', max_length=500, blank=True, null=True)
+    image_3 = models.ImageField(upload_to='pets/', max_length=500, blank=True, null=True)
+    image_4 = models.ImageField(upload_to='pets/', max_length=500, blank=True, null=True)
     
     # الشهادات الصحية
     vaccination_certificate = models.FileField(
-        upload_to='pets/certificates/vaccination/', 
+        upload_to='pets/certificates/vaccination/',
+        max_length=500,
         blank=True, 
         null=True,
         help_text="شهادة التطعيمات (PDF, JPG, PNG)"
     )
     health_certificate = models.FileField(
-        upload_to='pets/certificates/health/', 
+        upload_to='pets/certificates/health/',
+        max_length=500,
         blank=True, 
         null=True,
         help_text="الشهادة الصحية البيطرية (PDF, JPG, PNG)"
     )
     disease_free_certificate = models.FileField(
-        upload_to='pets/certificates/disease_free/', 
+        upload_to='pets/certificates/disease_free/',
+        max_length=500,
         blank=True, 
         null=True,
         help_text="شهادة خلو من الأمراض (PDF, JPG, PNG)"
     )
     additional_certificate = models.FileField(
-        upload_to='pets/certificates/additional/', 
+        upload_to='pets/certificates/additional/',
+        max_length=500,
         blank=True, 
         null=True,
         help_text="شهادة إضافية (PDF, JPG, PNG)"
@@ -127,6 +133,9 @@ class Pet(models.Model):
     is_free = models.BooleanField(default=True, help_text="هل التبني مجاني؟")
     
     # معلومات التزاوج
+    # نص البحث الموحّد (الاسم، السلالة، الموقع، الوصف) - يُحدّث تلقائياً، انظر pets/search.py
+    search_document = models.TextField(blank=True, default='', editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -257,6 +266,10 @@ class Pet(models.Model):
         verbose_name = "حيوان أليف"
         verbose_name_plural = "الحيوانات الأليفة"
         ordering = ['-created_at']
+        indexes = [
+            # ترقيم صفحات القائمة بالمؤشر على (-created_at, -id)
+            models.Index(fields=['-created_at', '-id']),
+        ]
 
 class PetImage(models.Model):
     """صور إضافية للحيوانات"""
@@ -355,6 +368,9 @@ class Favorite(models.Model):
         unique_together = ('user', 'pet')
         verbose_name = "مفضلة"
         verbose_name_plural = "المفضلات"
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
     
     def __str__(self):
         return f"{self.user.email} - {self.pet.name}"
@@ -438,6 +454,7 @@ class Notification(models.Model):
         indexes = [
             models.Index(fields=['user', '-created_at']),
             models.Index(fields=['user', 'is_read']),
+            models.Index(fields=['user', 'updated_at', 'id']),
         ]
     
     def __str__(self):
@@ -448,38 +465,68 @@ class Notification(models.Model):
         if not self.is_read:
             self.is_read = True
             self.read_at = timezone.now()
-            self.save(update_fields=['is_read', 'read_at'])
+            # updated_at ضمن الحقول حتى تظهر القراءة في مزامنة الإشعارات (since)
+            self.save(update_fields=['is_read', 'read_at', 'updated_at'])
     
     @classmethod
     def create_chat_message_notification(cls, recipient_user, sender_user, chat_room, message_content):
-        """إنشاء إشعار رسالة جديدة مع إرسال إشعار دفع."""
+        """
+        إشعار رسالة جديدة مجمّع لكل (مستقبل، محادثة): إذا كان هناك إشعار غير مقروء لنفس
+        المحادثة يُحدّث عدد الرسائل والمعاينة فيه بدلاً من إنشاء صف جديد. إشعار الدفع يحمل
+        مفتاح طي (collapse key) للمحادثة، ويُرسل مرة واحدة كحد أقصى كل
+        CHAT_PUSH_DEBOUNCE_SECONDS، ثم بالحالة الأخيرة عند نهاية النافذة (pets/chat_push.py).
+        """
         # لا نرسل إشعار للمرسل نفسه
         if recipient_user.id == sender_user.id:
             return None
-            
-        notification = cls.objects.create(
-            user=recipient_user,
-            type='chat_message_received',
-            title=f'رسالة جديدة من {sender_user.get_full_name()}',
-            message=f'{message_content[:100]}...' if len(message_content) > 100 else message_content,
-            related_chat_room=chat_room,
-            extra_data={
-                'sender_name': sender_user.get_full_name(),
-                'sender_id': sender_user.id,
-                'chat_id': chat_room.firebase_chat_id,
-                'message_preview': message_content[:50]
-            }
-        )
 
-        from .notifications import _send_push_notification  # local import to avoid circular dependency
+        from .read_state import ReadState  # local imports to avoid circular dependency
+        from .realtime import publish_notification_on_commit
+
+        sender_name = sender_user.get_full_name()
+        preview = f'{message_content[:100]}...' if len(message_content) > 100 else message_content
+        with transaction.atomic():
+            notification = ReadState(recipient_user).unread().filter(
+                type='chat_message_received',
+                related_chat_room=chat_room,
+            ).select_for_update().order_by('-created_at').first()
+
+            if notification is None:
+                notification = cls.objects.create(
+                    user=recipient_user,
+                    type='chat_message_received',
+                    title=f'رسالة جديدة من {sender_name}',
+                    message=preview,
+                    related_chat_room=chat_room,
+                    extra_data={
+                        'sender_name': sender_name,
+                        'sender_id': sender_user.id,
+                        'chat_id': chat_room.firebase_chat_id,
+                        'message_preview': message_content[:50],
+                        'message_count': 1,
+                    }
+                )
+                created = True
+            else:
+                count = notification.extra_data.get('message_count', 1) + 1
+                notification.title = f'{count} رسائل جديدة من {sender_name}'
+                notification.message = preview
+                notification.extra_data = {
+                    **notification.extra_data,
+                    'sender_name': sender_name,
+                    'sender_id': sender_user.id,
+                    'message_preview': message_content[:50],
+                    'message_count': count,
+                }
+                # created_at = آخر رسالة، حتى يصعد الإشعار لأعلى القائمة
+                notification.created_at = timezone.now()
+                notification.save(update_fields=['title', 'message', 'extra_data', 'created_at', 'updated_at'])
+                publish_notification_on_commit(notification)
+                created = False
+
+        from .chat_push import push_chat_notification  # local import to avoid circular dependency
 
-        push_payload = {
-            'type': 'chat_message_received',
-            'chat_id': chat_room.firebase_chat_id,
-            'sender_id': str(sender_user.id),
-            'sender_name': sender_user.get_full_name(),
-        }
-        _send_push_notification(recipient_user, notification.title, notification.message, push_payload)
+        push_chat_notification(notification, new_window=created)
 
         return notification
 
@@ -965,3 +1012,197 @@ class AdoptionRequest(models.Model):
         verbose_name_plural = "طلبات التبني"
         ordering = ['-created_at']
         unique_together = ['adopter', 'pet', 'status']  # منع الطلبات المكررة
+
+
+class PushCampaign(models.Model):
+    """حملة إشعارات جماعية قابلة للاستئناف (مؤشر التقدم ونتائج الإرسال)"""
+
+    STATUS_CHOICES = [
+        ('running', 'قيد التنفيذ'),
+        ('completed', 'مكتملة'),
+    ]
+
+    key = models.CharField(max_length=100, unique=True, help_text="معرف الحملة المستخدم للاستئناف")
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running')
+    last_user_id = models.BigIntegerField(default=0, help_text="آخر معرف مستخدم تمت معالجة دفعته بالكامل")
+    notifications_created = models.PositiveIntegerField(default=0)
+    push_sent = models.PositiveIntegerField(default=0)
+    push_failed = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "حملة إشعارات"
+        verbose_name_plural = "حملات الإشعارات"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.key} ({self.get_status_display()})"
+
+
+class PushCampaignDelivery(models.Model):
+    """نتيجة إرسال حملة لمستخدم/token واحد"""
+
+    STATUS_CHOICES = [
+        ('pending', 'بانتظار الإرسال'),
+        ('sent', 'تم الإرسال'),
+        ('failed', 'فشل الإرسال'),
+        ('skipped', 'تم التخطي'),
+    ]
+
+    campaign = models.ForeignKey(PushCampaign, on_delete=models.CASCADE, related_name='deliveries')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='campaign_deliveries')
+    fcm_token = models.TextField(blank=True, default='')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    error_code = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "نتيجة إرسال حملة"
+        verbose_name_plural = "نتائج إرسال الحملات"
+        unique_together = [['campaign', 'user']]
+        indexes = [
+            models.Index(fields=['campaign', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.campaign.key} -> {self.user_id} ({self.status})"
+
+
+class UploadSession(models.Model):
+    """جلسة رفع مباشر إلى التخزين (presigned PUT) تُربط بالنموذج عند الإكمال"""
+
+    PURPOSE_CHOICES = [
+        ('pet_image', 'صورة حيوان'),
+        ('pet_certificate', 'شهادة حيوان'),
+        ('chat_image', 'صورة محادثة'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'بانتظار الرفع'),
+        ('completed', 'مكتملة'),
+    ]
+
+    public_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    purpose = models.CharField(max_length=30, choices=PURPOSE_CHOICES)
+    pet = models.ForeignKey(Pet, on_delete=models.CASCADE, related_name='upload_sessions', blank=True, null=True)
+    field_name = models.CharField(max_length=50, blank=True, default='', help_text="الحقل الذي يُربط به الملف")
+    key = models.CharField(max_length=300, unique=True, help_text="مفتاح الملف في التخزين")
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "جلسة رفع"
+        verbose_name_plural = "جلسات الرفع"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.purpose} {self.key} ({self.status})"
+
+    @property
+    def is_expired(self):
+        return timezone.now() >= self.expires_at
+
+
+class PetMatchSuggestion(models.Model):
+    """شريك تزاوج مقترح لحيوان (تُحسب مسبقاً بواسطة pets/suggestions.py)"""
+    pet = models.ForeignKey(Pet, on_delete=models.CASCADE, related_name='match_suggestions')
+    partner = models.ForeignKey(Pet, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField(help_text="الترتيب (1 = الأقرب)")
+    distance_km = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "اقتراح تزاوج"
+        verbose_name_plural = "اقتراحات التزاوج"
+        ordering = ['pet', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['pet', 'rank'], name='unique_pet_suggestion_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.pet_id} -> {self.partner_id} (#{self.rank})"
+
+
+class NotificationReadMarker(models.Model):
+    """
+    علامة "مقروء حتى": كل إشعار للمستخدم أُنشئ في أو قبل read_through يُعتبر مقروءاً.
+    chat_room فارغ = كل الإشعارات، وإلا فإشعارات رسائل تلك المحادثة فقط (pets/read_state.py).
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notification_read_markers')
+    chat_room = models.ForeignKey('ChatRoom', on_delete=models.CASCADE, blank=True, null=True, related_name='+')
+    read_through = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "علامة قراءة الإشعارات"
+        verbose_name_plural = "علامات قراءة الإشعارات"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'chat_room'], name='unique_chat_read_marker'),
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(chat_room__isnull=True),
+                name='unique_user_read_marker',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} ({self.chat_room_id or 'all'}) <= {self.read_through}"
+
+
+class DeferredPush(models.Model):
+    """إشعار دفع أُجّل بسبب حد الإرسال أو ساعات الهدوء، يُرسل ضمن ملخص (pets/push_policy.py)"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='deferred_pushes')
+    notification_type = models.CharField(max_length=64, blank=True, default='')
+    title = models.CharField(max_length=200)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "إشعار دفع مؤجل"
+        verbose_name_plural = "إشعارات الدفع المؤجلة"
+        ordering = ['user', 'id']
+
+    def __str__(self):
+        return f"{self.user_id}: {self.title}"
+
+
+class PendingChatPush(models.Model):
+    """
+    إشعار محادثة تغيّر داخل نافذة التأخير ولم يُرسل push بحالته الأخيرة بعد (pets/chat_push.py).
+    notification_id رقم عادي لا ForeignKey: جدول الإشعارات المقسّم لا يقبل أن يُشار إليه
+    (pets/retention.py)، والصفوف التي حُذف إشعارها تُنظف عند الإرسال.
+    """
+    notification_id = models.BigIntegerField(unique=True)
+    due_at = models.DateTimeField(db_index=True, help_text="نهاية نافذة التأخير")
+
+    class Meta:
+        verbose_name = "إشعار محادثة معلّق"
+        verbose_name_plural = "إشعارات المحادثة المعلّقة"
+
+    def __str__(self):
+        return f"{self.notification_id} @ {self.due_at}"
+
+
+class PushTopicSubscription(models.Model):
+    """مواضيع FCM المشترك فيها token المستخدم حالياً (pets/push_topics.py)"""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='push_topic_subscription')
+    fcm_token = models.TextField(blank=True, default='')
+    topics = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "اشتراك مواضيع الإشعارات"
+        verbose_name_plural = "اشتراكات مواضيع الإشعارات"
+
+    def __str__(self):
+        return f"{self.user_id}: {', '.join(self.topics)}"
@@ -5,7 +5,10 @@ import logging
 from math import radians, sin, cos, sqrt, atan2
 
 
+from . import push_policy, push_topics
+from .matching import NearbyPetMatcher, bounding_box
 from .models import Notification, Pet, BreedingRequest
+from .realtime import publish_badges_on_commit
 from accounts.models import User
 from accounts.firebase_service import firebase_service
 from .email_notifications import (
@@ -18,8 +21,12 @@ from .email_notifications import (
 logger = logging.getLogger(__name__)
 
 
-def _send_push_notification(user, title, message, data=None):
-    """Helper to send a push notification if the user has a valid FCM token."""
+def _send_push_notification(user, title, message, data=None, collapse_key=None):
+    """Helper to send a push notification if the user has a valid FCM token.
+
+    Pushes sharing a collapse_key replace each other on the device instead of stacking.
+    Rate-limited or quiet-hours pushes are deferred to the next digest (push_policy) and return False.
+    """
     if not user or not user.fcm_token:
         return False
 
@@ -28,12 +35,19 @@ def _send_push_notification(user, title, message, data=None):
         return False
 
     payload = data or {}
+    decision = push_policy.decide(user, payload.get('type'))
+    if decision != push_policy.SEND:
+        push_policy.defer(user, title, payload.get('type'))
+        logger.info("Push for user %s deferred to digest (%s)", user.id, decision)
+        return False
+
     try:
         success = firebase_service.send_notification(
             fcm_token=user.fcm_token,
             title=title,
             body=message,
-            data=payload
+            data=payload,
+            collapse_key=collapse_key,
         )
         if not success:
             logger.warning("Failed to deliver push notification to user %s", user.id)
@@ -416,8 +430,53 @@ def _haversine_km(lat1, lng1, lat2, lng2):
     return earth_radius_km * c
 
 
+def _within_bounding_box(queryset, latitude, longitude, radius_km):
+    """تضييق الاستعلام إلى المستطيل المحيط بنصف القطر قبل حساب المسافة الفعلية."""
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    queryset = queryset.filter(latitude__gte=min_lat, latitude__lte=max_lat)
+    if min_lng is not None:
+        queryset = queryset.filter(longitude__gte=min_lng, longitude__lte=max_lng)
+    return queryset
+
+
+def _nearby_alerts_via_topics(pet):
+    """
+    هل يُرسل push تنبيه الحيوان القريب عبر مواضيع المناطق بدلاً من كل مستخدم؟
+    لا يُستخدم أثناء ساعات الهدوء حتى تؤجله سياسة الإرسال لكل مستخدم كالمعتاد.
+    """
+    return (
+        push_topics.topics_enabled()
+        and pet.latitude is not None
+        and pet.longitude is not None
+        and not push_policy.in_quiet_hours()
+    )
+
+
+def _publish_area_alert(pet, radius_km, kind, title, message, data):
+    """
+    رسالة واحدة لكل موضوع منطقة قريبة. owner_id ليتجاهلها التطبيق على أجهزة صاحب الحيوان
+    (المشترك في موضوع منطقته أيضاً). رسالة الموضوع لا تمر بحد الإرسال لكل مستخدم.
+    """
+    topics = push_topics.publish_to_area(
+        pet.latitude, pet.longitude, radius_km, kind, title, message,
+        {**data, 'owner_id': str(pet.owner_id)},
+    )
+    logger.info("Sent %s alert for pet %s to topics %s", kind, pet.id, topics)
+
+
+def _create_nearby_notifications(notifications):
+    """إنشاء الإشعارات داخل التطبيق دفعة واحدة؛ bulk_create بلا إشارات فتُحدّث الشارات صراحة."""
+    notifications = Notification.objects.bulk_create(notifications, batch_size=500)
+    publish_badges_on_commit(notification.user for notification in notifications)
+    return notifications
+
+
 def notify_new_pet_added(pet, radius_km=30):
-    """إرسال إشعار عند إضافة حيوان جديد للمستخدمين القريبين أو في نفس المدينة."""
+    """
+    إرسال إشعار عند إضافة حيوان جديد للمستخدمين القريبين أو في نفس المدينة.
+    عند تفعيل المواضيع الجغرافية (push_topics) يُرسل الـ push لمواضيع الخلايا القريبة، وتُنشأ
+    الإشعارات داخل التطبيق للمستخدمين المطابقين كالمعتاد.
+    """
     if pet.status == 'available_for_adoption':
         return notify_new_adoption_pet(pet, radius_km=10)
 
@@ -425,6 +484,25 @@ def notify_new_pet_added(pet, radius_km=30):
         logger.info("Skipping nearby pet notifications for pet %s with status %s", pet.id, pet.status)
         return []
 
+    title = "حيوان جديد بالقرب منك"
+    location_text = pet.location or 'مدينتك'
+    message = f"{pet.name} متاح الآن للتزاوج في {location_text}. تعرف على التفاصيل وابدأ المحادثة!"
+    extra = {
+        'pet_id': pet.id,
+        'pet_name': pet.name,
+        'pet_type': pet.pet_type,
+        'location': location_text,
+    }
+    push_payload = {
+        'type': 'pet_nearby',
+        'pet_id': str(pet.id),
+        'pet_name': pet.name,
+        'location': location_text,
+    }
+    via_topics = _nearby_alerts_via_topics(pet)
+    if via_topics:
+        _publish_area_alert(pet, radius_km, push_topics.BREEDING, title, message, push_payload)
+
     recipients = set()
 
     normalised_location = _normalise_location(pet.location)
@@ -436,11 +514,15 @@ def notify_new_pet_added(pet, radius_km=30):
                 recipients.add(row['owner_id'])
 
     if pet.latitude is not None and pet.longitude is not None:
-        geo_candidates = candidate_pets.exclude(latitude__isnull=True).exclude(longitude__isnull=True)
-        for row in geo_candidates.values('owner_id', 'latitude', 'longitude'):
-            distance = _haversine_km(pet.latitude, pet.longitude, row['latitude'], row['longitude'])
-            if distance is not None and distance <= radius_km:
-                recipients.add(row['owner_id'])
+        geo_candidates = _within_bounding_box(
+            candidate_pets.exclude(latitude__isnull=True).exclude(longitude__isnull=True),
+            pet.latitude,
+            pet.longitude,
+            radius_km,
+        )
+        matcher = NearbyPetMatcher(geo_candidates.values('owner_id', 'latitude', 'longitude'), max_distance_km=radius_km)
+        for row, _distance in matcher.nearest(pet.latitude, pet.longitude):
+            recipients.add(row['owner_id'])
 
     if not recipients:
         return []
@@ -453,17 +535,18 @@ def notify_new_pet_added(pet, radius_km=30):
     if not users:
         return []
 
-    notifications = []
-    title = "حيوان جديد بالقرب منك"
-    location_text = pet.location or 'مدينتك'
-    message = f"{pet.name} متاح الآن للتزاوج في {location_text}. تعرف على التفاصيل وابدأ المحادثة!"
-    extra = {
-        'pet_id': pet.id,
-        'pet_name': pet.name,
-        'pet_type': pet.pet_type,
-        'location': location_text,
-    }
+    if via_topics:
+        notifications = _create_nearby_notifications([
+            Notification(
+                user=user, type='pet_nearby', title=title, message=message,
+                related_pet=pet, extra_data=extra,
+            )
+            for user in users
+        ])
+        logger.info("Created nearby pet notifications for pet %s for %d users", pet.id, len(notifications))
+        return notifications
 
+    notifications = []
     for user in users:
         notification = create_notification(
             user=user,
@@ -474,13 +557,6 @@ def notify_new_pet_added(pet, radius_km=30):
             extra_data=extra
         )
         notifications.append(notification)
-
-        push_payload = {
-            'type': 'pet_nearby',
-            'pet_id': str(pet.id),
-            'pet_name': pet.name,
-            'location': location_text,
-        }
         _send_push_if_allowed(user, title, message, push_payload, category='breeding')
 
     logger.info("Sent nearby pet notifications for pet %s to %d users", pet.id, len(notifications))
@@ -488,25 +564,40 @@ def notify_new_pet_added(pet, radius_km=30):
 
 
 def notify_new_adoption_pet(pet, radius_km=10):
-    """إرسال إشعار عند توفر حيوان للتبني للمستخدمين القريبين."""
+    """إرسال إشعار عند توفر حيوان للتبني للمستخدمين القريبين (push عبر مواضيع المناطق إن فُعّلت)."""
     if pet.status != 'available_for_adoption':
         logger.info("Skipping adoption notifications for pet %s with status %s", pet.id, pet.status)
         return []
 
+    title = "فرصة تبني قريبة منك"
+    location_text = pet.location or 'بالقرب منك'
+    via_topics = _nearby_alerts_via_topics(pet)
+    if via_topics:
+        _publish_area_alert(
+            pet, radius_km, push_topics.ADOPTION, title,
+            f"🐾 {pet.name or 'حيوان أليف'} متاح للتبني مجاناً في {location_text}. شاهد التفاصيل الآن!",
+            {'type': 'adoption_pet_nearby', 'pet_id': str(pet.id), 'pet_name': pet.name, 'location': location_text},
+        )
+
     recipients = {}
 
     pet_lat = pet.latitude
     pet_lng = pet.longitude
 
     if pet_lat is not None and pet_lng is not None:
-        geo_users = User.objects.exclude(id=pet.owner_id).exclude(
-            latitude__isnull=True
-        ).exclude(
-            longitude__isnull=True
-        ).exclude(
-            fcm_token__isnull=True
-        ).exclude(
-            fcm_token=''
+        geo_users = _within_bounding_box(
+            User.objects.exclude(id=pet.owner_id).exclude(
+                latitude__isnull=True
+            ).exclude(
+                longitude__isnull=True
+            ).exclude(
+                fcm_token__isnull=True
+            ).exclude(
+                fcm_token=''
+            ),
+            pet_lat,
+            pet_lng,
+            radius_km,
         )
 
         for user in geo_users:
@@ -549,8 +640,6 @@ def notify_new_adoption_pet(pet, radius_km=10):
         return []
 
     notifications = []
-    location_text = pet.location or 'بالقرب منك'
-
     for user, distance in recipients.values():
         if not _adoption_notifications_enabled(user):
             continue
@@ -559,7 +648,6 @@ def notify_new_adoption_pet(pet, radius_km=10):
         else:
             distance_text = f"في {location_text}"
 
-        title = "فرصة تبني قريبة منك"
         message = f"🐾 {pet.name or 'حيوان أليف'} متاح للتبني مجاناً {distance_text}. شاهد التفاصيل الآن!"
 
         extra = {
@@ -570,6 +658,13 @@ def notify_new_adoption_pet(pet, radius_km=10):
             'location': location_text,
         }
 
+        if via_topics:
+            notifications.append(Notification(
+                user=user, type='adoption_pet_nearby', title=title, message=message,
+                related_pet=pet, extra_data=extra,
+            ))
+            continue
+
         notification = create_notification(
             user=user,
             notification_type='adoption_pet_nearby',
@@ -589,6 +684,8 @@ def notify_new_adoption_pet(pet, radius_km=10):
         }
         _send_push_if_allowed(user, title, message, push_payload, category='adoption')
 
+    if via_topics:
+        notifications = _create_nearby_notifications(notifications)
     logger.info("Sent adoption pet notifications for pet %s to %d users", pet.id, len(notifications))
     return notifications
 
@@ -0,0 +1,108 @@
+"""
+الوصول إلى حاوية التخزين (Hetzner Object Storage المتوافقة مع S3) المستخدمة في
+sync_media_to_bucket، لإصدار روابط رفع مباشر (presigned PUT) والتحقق من الملفات المرفوعة.
+"""
+from functools import lru_cache
+from typing import Optional
+
+import boto3
+from botocore.client import Config
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from patmatch_backend.storage import cache_control_for
+
+# الملفات المرفوعة مباشرة تُقرأ علناً مثل الملفات المنسوخة بواسطة sync_media_to_bucket
+OBJECT_ACL = 'public-read'
+
+
+def _endpoint():
+    endpoint = (settings.HETZNER_S3_ENDPOINT_URL or '').strip()
+    if endpoint and not endpoint.startswith(('http://', 'https://')):
+        endpoint = f"https://{endpoint}"
+    return endpoint
+
+
+def is_configured() -> bool:
+    return all([
+        _endpoint(),
+        settings.HETZNER_S3_REGION,
+        settings.HETZNER_S3_ACCESS_KEY,
+        settings.HETZNER_S3_SECRET_KEY,
+        settings.HETZNER_MEDIA_BUCKET,
+    ])
+
+
+@lru_cache(maxsize=4)
+def _client(endpoint, region, access_key, secret_key):
+    return boto3.client(
+        's3',
+        endpoint_url=endpoint,
+        region_name=region,
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        config=Config(signature_version='s3v4'),
+    )
+
+
+def get_client():
+    """عميل S3 (مشترك بين الطلبات) والحاوية المستخدمة."""
+    if not is_configured():
+        raise ImproperlyConfigured("Object storage is not configured (HETZNER_* settings)")
+    client = _client(
+        _endpoint(),
+        settings.HETZNER_S3_REGION,
+        settings.HETZNER_S3_ACCESS_KEY,
+        settings.HETZNER_S3_SECRET_KEY,
+    )
+    return client, settings.HETZNER_MEDIA_BUCKET
+
+
+def public_url(key: str) -> str:
+    base = (settings.MEDIA_BUCKET_PUBLIC_URL or '').rstrip('/')
+    if not base:
+        base = f"{_endpoint().rstrip('/')}/{settings.HETZNER_MEDIA_BUCKET}"
+    return f"{base}/{key}"
+
+
+def presigned_put(key: str, content_type: str, size: int, expires_in: int):
+    """
+    رابط PUT موقّع يقيّد نوع المحتوى والحجم.
+
+    Returns:
+        tuple: (url, headers) يجب على العميل إرسال هذه الـ headers مع الطلب كما هي
+    """
+    client, bucket = get_client()
+    cache_control = cache_control_for(key)
+    url = client.generate_presigned_url(
+        'put_object',
+        Params={
+            'Bucket': bucket,
+            'Key': key,
+            'ContentType': content_type,
+            'ContentLength': size,
+            'ACL': OBJECT_ACL,
+            'CacheControl': cache_control,
+        },
+        ExpiresIn=expires_in,
+        HttpMethod='PUT',
+    )
+    headers = {'Content-Type': content_type, 'x-amz-acl': OBJECT_ACL, 'Cache-Control': cache_control}
+    return url, headers
+
+
+def head(key: str) -> Optional[dict]:
+    """بيانات الملف في الحاوية (الحجم ونوع المحتوى) أو None إذا لم يكن موجوداً."""
+    client, bucket = get_client()
+    try:
+        metadata = client.head_object(Bucket=bucket, Key=key)
+    except ClientError as exc:
+        error_code = (exc.response or {}).get('Error', {}).get('Code', '')
+        if error_code in {'404', 'NoSuchKey', 'NotFound'}:
+            return None
+        raise
+    return {
+        'size': int(metadata.get('ContentLength') or 0),
+        'content_type': metadata.get('ContentType') or '',
+    }
@@ -0,0 +1,148 @@
+"""
+ترقيم صفحات بالمؤشر (keyset) لقوائم التمرير الطويلة.
+
+بدلاً من COUNT(*) و OFFSET، تحمل كل صفحة مؤشراً بقيم مفاتيح الترتيب لآخر عنصر،
+وتُجلب الصفحة التالية بشرط "بعد هذه القيم" فيكون الاستعلام مسحاً لنطاق من الفهرس.
+الترقيم الحالي بالأرقام يبقى الافتراضي، ويُفعّل المؤشر بتمرير ?cursor= (فارغ للصفحة الأولى).
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+INVALID_CURSOR_MESSAGE = 'مؤشر الصفحة غير صالح'
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    ترقيم بالأرقام افتراضياً، وبالمؤشر عند وجود معامل cursor.
+
+    مفاتيح المؤشر هي ترتيب الـ queryset نفسه (order_by أو Meta.ordering) مع إضافة pk
+    لكسر التعادل، لذلك يجب أن تكون حقول الترتيب غير فارغة (NULL).
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        keys = self._ordering_keys(queryset)
+        if keys is None:
+            # ترتيب بتعبيرات لا يمكن تمثيلها في مؤشر
+            self.keyset = False
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*[f"-{name}" if desc else name for name, desc in keys])
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            values = self._decode_cursor(queryset, keys, encoded)
+            queryset = queryset.filter(self._after(keys, values))
+
+        page = list(queryset[:page_size + 1])
+        self.next_cursor = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            last = page[-1]
+            self.next_cursor = self._encode_cursor([getattr(last, name) for name, _ in keys])
+        return page
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    @staticmethod
+    def _ordering_keys(queryset):
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering or [])
+        keys = []
+        for item in ordering:
+            if not isinstance(item, str) or '__' in item or item == '?':
+                return None
+            keys.append((item.lstrip('-'), item.startswith('-')))
+        if not any(name in ('pk', queryset.model._meta.pk.name) for name, _ in keys):
+            keys.append(('pk', keys[0][1] if keys else False))
+        return keys
+
+    @staticmethod
+    def _after(keys, values):
+        """(k1, k2, ...) بعد (v1, v2, ...) حسب اتجاه كل مفتاح."""
+        condition = Q()
+        for index, (name, desc) in enumerate(keys):
+            term = Q(**{f"{name}__{'lt' if desc else 'gt'}": values[index]})
+            for previous_index, (previous_name, _) in enumerate(keys[:index]):
+                term &= Q(**{previous_name: values[previous_index]})
+            condition |= term
+        return condition
+
+    @staticmethod
+    def _encode_cursor(values):
+        return encode_cursor(values)
+
+    @staticmethod
+    def _decode_cursor(queryset, keys, encoded):
+        values = decode_cursor(encoded, len(keys))
+        try:
+            return [
+                _key_field(queryset, name).to_python(value)
+                for (name, _), value in zip(keys, values)
+            ]
+        except Exception:
+            raise NotFound(INVALID_CURSOR_MESSAGE)
+
+
+def encode_cursor(values):
+    """قائمة قيم -> نص base64 آمن للروابط."""
+    # isoformat كاملة (DjangoJSONEncoder يقتطع الميكروثواني فيتخطى عناصر متقاربة)
+    payload = json.dumps(values, default=_json_value, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(encoded, length):
+    """عكس encode_cursor؛ NotFound إذا كان المؤشر تالفاً أو بعدد قيم مختلف."""
+    try:
+        padded = encoded + '=' * (-len(encoded) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception:
+        raise NotFound(INVALID_CURSOR_MESSAGE)
+    if not isinstance(values, list) or len(values) != length:
+        raise NotFound(INVALID_CURSOR_MESSAGE)
+    return values
+
+
+def _json_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def _key_field(queryset, name):
+    meta = queryset.model._meta
+    if name == 'pk':
+        return meta.pk
+    try:
+        return meta.get_field(name)
+    except FieldDoesNotExist:
+        return queryset.query.annotations[name].output_field
@@ -0,0 +1,109 @@
+"""
+سياسة إرسال إشعارات الدفع لكل مستخدم، تُطبق داخل _send_push_notification:
+- حد إرسال (token bucket): PUSH_RATE_BURST إشعاراً متتالياً ثم PUSH_RATE_PER_HOUR في الساعة
+- ساعات الهدوء من PUSH_QUIET_HOURS_START إلى PUSH_QUIET_HOURS_END بالتوقيت المحلي
+
+ما يتجاوزها يُحفظ في DeferredPush (الإشعار داخل التطبيق يُنشأ كالمعتاد) ويُرسل لاحقاً كملخص
+واحد لكل مستخدم بواسطة الأمر send_push_digests.
+"""
+import time
+from itertools import groupby
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from accounts.firebase_service import firebase_service
+from .models import DeferredPush
+
+SEND = 'send'
+RATE_LIMITED = 'rate_limited'
+QUIET_HOURS = 'quiet_hours'
+
+DIGEST_COLLAPSE_KEY = 'push-digest'
+DIGEST_TITLES = 3
+
+
+def in_quiet_hours(now=None):
+    start, end = settings.PUSH_QUIET_HOURS_START, settings.PUSH_QUIET_HOURS_END
+    if start == end:
+        return False
+    hour = timezone.localtime(now or timezone.now()).hour
+    if start < end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def _bucket_key(user_id):
+    return f'pets:push:bucket:{user_id}'
+
+
+def take_token(user_id, now=None):
+    """
+    سحب رصيد إرسال واحد للمستخدم إن وُجد. الرصيد في الكاش (قراءة ثم كتابة، فالسباقات النادرة
+    قد تسمح بإشعار زائد) ويُحذف المفتاح تلقائياً عند امتلائه من جديد.
+    """
+    capacity = settings.PUSH_RATE_BURST
+    rate = settings.PUSH_RATE_PER_HOUR / 3600
+    now = time.time() if now is None else now
+    tokens, updated = cache.get(_bucket_key(user_id), (capacity, now))
+    tokens = min(capacity, tokens + max(0, now - updated) * rate)
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+    timeout = int((capacity - tokens) / rate) + 1 if rate else None
+    cache.set(_bucket_key(user_id), (tokens, now), timeout)
+    return allowed
+
+
+def decide(user, notification_type, now=None):
+    if notification_type in settings.PUSH_POLICY_EXEMPT_TYPES:
+        return SEND
+    if in_quiet_hours(now):
+        return QUIET_HOURS
+    if not take_token(user.pk):
+        return RATE_LIMITED
+    return SEND
+
+
+def defer(user, title, notification_type):
+    DeferredPush.objects.create(user=user, title=title[:200], notification_type=notification_type or '')
+
+
+def _digest_body(titles):
+    body = ' • '.join(titles[:DIGEST_TITLES])
+    if len(titles) > DIGEST_TITLES:
+        body += ' …'
+    return body
+
+
+def send_digests(now=None):
+    """
+    إرسال ملخص واحد لكل مستخدم له إشعارات مؤجلة ثم حذفها (لا شيء أثناء ساعات الهدوء).
+
+    Returns:
+        int: عدد الملخصات المرسلة
+    """
+    if in_quiet_hours(now):
+        return 0
+    last_id = DeferredPush.objects.order_by('-id').values_list('id', flat=True).first()
+    if last_id is None:
+        return 0
+
+    sent = 0
+    pending = DeferredPush.objects.filter(id__lte=last_id).select_related('user').order_by('user_id', 'id')
+    for user, pushes in groupby(pending.iterator(), key=lambda push: push.user):
+        titles = [push.title for push in pushes]
+        if not user.fcm_token:
+            continue
+        if firebase_service.send_notification(
+            fcm_token=user.fcm_token,
+            title=f'لديك {len(titles)} إشعارات جديدة',
+            body=_digest_body(titles),
+            data={'type': 'push_digest', 'count': str(len(titles))},
+            collapse_key=DIGEST_COLLAPSE_KEY,
+        ):
+            sent += 1
+    # الملخص محاولة واحدة: الإشعارات نفسها موجودة داخل التطبيق
+    DeferredPush.objects.filter(id__lte=last_id).delete()
+    return sent
@@ -0,0 +1,138 @@
+"""
+مواضيع FCM جغرافية لتنبيهات الحيوانات القريبة: كل مستخدم مشترك من الخادم في موضوع خلية
+منطقته لكل نوع تنبيه يفعّله (area_<cell>_breeding و area_<cell>_adoption)، فيُرسل تنبيه
+الحيوان الجديد إلى مواضيع الخلايا القريبة (بضع رسائل) بدلاً من كل token على حدة.
+
+الخلية مربع من NEARBY_TOPIC_CELL_DEGREES درجة حسب إحداثيات المستخدم، وتُحدّث الاشتراكات
+عند تغيّر الموقع أو الـ token أو تفضيلات notify_* (pets/signals.py).
+"""
+import logging
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from accounts.firebase_service import firebase_service
+from .matching import bounding_box
+from .models import PushTopicSubscription
+
+logger = logging.getLogger(__name__)
+
+BREEDING = 'breeding'
+ADOPTION = 'adoption'
+# الحقول التي تغيّر مواضيع المستخدم
+TOPIC_FIELDS = {'latitude', 'longitude', 'fcm_token', 'notify_breeding_requests', 'notify_adoption_pets'}
+# الحد الأقصى لعدد tokens في طلب اشتراك واحد
+TOPIC_BATCH_SIZE = 1000
+
+
+def _index(value):
+    return math.floor(float(value) / settings.NEARBY_TOPIC_CELL_DEGREES)
+
+
+def area_cell(latitude, longitude):
+    return f'{_index(latitude)}_{_index(longitude)}'
+
+
+def area_topic(cell, kind):
+    return f'area_{cell}_{kind}'
+
+
+def topics_enabled():
+    return settings.NEARBY_ALERT_TOPICS and firebase_service.is_initialized
+
+
+def user_topics(user):
+    if not user.fcm_token or user.latitude is None or user.longitude is None:
+        return []
+    cell = area_cell(user.latitude, user.longitude)
+    topics = []
+    if user.notify_breeding_requests is not False:
+        topics.append(area_topic(cell, BREEDING))
+    if user.notify_adoption_pets is not False:
+        topics.append(area_topic(cell, ADOPTION))
+    return topics
+
+
+def topics_near(latitude, longitude, radius_km, kind):
+    """مواضيع الخلايا التي يتقاطع معها مستطيل الدائرة (خلية الموقع فقط قرب القطبين أو خط 180)."""
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    if min_lng is None:
+        return [area_topic(area_cell(latitude, longitude), kind)]
+    return [
+        area_topic(f'{lat_index}_{lng_index}', kind)
+        for lat_index in range(_index(min_lat), _index(max_lat) + 1)
+        for lng_index in range(_index(min_lng), _index(max_lng) + 1)
+    ]
+
+
+def publish_to_area(latitude, longitude, radius_km, kind, title, message, data):
+    """إرسال التنبيه لمواضيع الخلايا القريبة؛ يُرجع المواضيع التي قُبلت رسالتها."""
+    return [
+        topic for topic in topics_near(latitude, longitude, radius_km, kind)
+        if firebase_service.send_topic_notification(topic, title, message, data)
+    ]
+
+
+def sync_user_topics(user):
+    """
+    مزامنة اشتراكات token المستخدم مع مواضيعه الحالية. لا يُستدعى FCM إذا لم يتغير شيء،
+    ولا يُحفظ السجل إذا فشل أي تعديل (تُعاد المحاولة في المزامنة التالية).
+    """
+    token = user.fcm_token or ''
+    desired = user_topics(user)
+    subscription = PushTopicSubscription.objects.filter(user=user).first()
+    if subscription is None:
+        if not desired:
+            return False
+        subscription = PushTopicSubscription(user=user)
+    if subscription.fcm_token == token and subscription.topics == desired:
+        return False
+
+    same_token = subscription.fcm_token == token
+    current = subscription.topics if same_token else []
+    stale = [topic for topic in subscription.topics if not same_token or topic not in desired]
+    ok = True
+    for topic in stale:
+        ok &= firebase_service.unsubscribe_from_topic([subscription.fcm_token], topic)
+    for topic in desired:
+        if topic not in current:
+            ok &= firebase_service.subscribe_to_topic([token], topic)
+    if ok:
+        subscription.fcm_token = token
+        subscription.topics = desired
+        subscription.save()
+    return ok
+
+
+def sync_user_topics_on_commit(user):
+    if topics_enabled():
+        transaction.on_commit(lambda: sync_user_topics(user))
+
+
+def subscribe_missing(users):
+    """
+    اشتراك جماعي للمستخدمين الذين لا يملكون سجل اشتراك (عند تفعيل المواضيع لأول مرة):
+    طلب واحد لكل موضوع و TOPIC_BATCH_SIZE token.
+
+    Returns:
+        int: عدد المستخدمين المشتركين
+    """
+    subscribed = set(PushTopicSubscription.objects.values_list('user_id', flat=True))
+    tokens_by_topic = defaultdict(list)
+    records = []
+    for user in users:
+        topics = user_topics(user)
+        if user.pk in subscribed or not topics:
+            continue
+        for topic in topics:
+            tokens_by_topic[topic].append(user.fcm_token)
+        records.append(PushTopicSubscription(user=user, fcm_token=user.fcm_token, topics=topics))
+
+    for topic, tokens in tokens_by_topic.items():
+        for start in range(0, len(tokens), TOPIC_BATCH_SIZE):
+            if not firebase_service.subscribe_to_topic(tokens[start:start + TOPIC_BATCH_SIZE], topic):
+                logger.warning("Subscribing tokens to %s failed", topic)
+    PushTopicSubscription.objects.bulk_create(records, batch_size=500, ignore_conflicts=True)
+    return len(records)
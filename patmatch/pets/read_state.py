@@ -0,0 +1,103 @@
+"""
+حالة قراءة الإشعارات بعلامات "مقروء حتى" (NotificationReadMarker) بدلاً من تحديث كل صف.
+
+الإشعار مقروء إذا قُرئ منفرداً (is_read)، أو أُنشئ في أو قبل علامة المستخدم العامة، أو كان
+رسالة محادثة أُنشئت في أو قبل علامة تلك المحادثة. لذلك "تعيين الكل كمقروء" كتابة صف واحد
+مهما كان عدد الإشعارات.
+"""
+from django.db.models import IntegerField, Q, Sum
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from .models import Notification, NotificationReadMarker
+
+CHAT_NOTIFICATION_TYPE = 'chat_message_received'
+
+
+def unread_messages_sum():
+    """
+    عدد الرسائل (لا المحادثات) في إشعارات المحادثة: كل إشعار يجمع رسائل متتالية ويحفظ
+    عددها في extra_data['message_count']، والإشعارات الأقدم بدونه تُعد رسالة واحدة.
+    """
+    return Coalesce(
+        Sum(
+            Coalesce(Cast(KT('extra_data__message_count'), IntegerField()), 1),
+            filter=Q(type=CHAT_NOTIFICATION_TYPE),
+        ),
+        0,
+    )
+
+
+class ReadState:
+    """علامات قراءة مستخدم واحد، تُحمّل باستعلام واحد."""
+
+    def __init__(self, user):
+        self.user = user
+        self.read_through = None
+        self.chats = {}
+        markers = NotificationReadMarker.objects.filter(user=user).values_list('chat_room_id', 'read_through')
+        for chat_room_id, read_through in markers:
+            if chat_room_id is None:
+                self.read_through = read_through
+            else:
+                self.chats[chat_room_id] = read_through
+
+    def chat_read_through(self, chat_room_id):
+        """أحدث علامة تنطبق على رسائل هذه المحادثة."""
+        candidates = [value for value in (self.read_through, self.chats.get(chat_room_id)) if value]
+        return max(candidates) if candidates else None
+
+    def _covering(self, notification):
+        if notification.type == CHAT_NOTIFICATION_TYPE and notification.related_chat_room_id:
+            return self.chat_read_through(notification.related_chat_room_id)
+        return self.read_through
+
+    def is_read(self, notification):
+        if notification.is_read:
+            return True
+        covering = self._covering(notification)
+        return covering is not None and notification.created_at <= covering
+
+    def read_at(self, notification):
+        if notification.is_read:
+            return notification.read_at
+        return self._covering(notification) if self.is_read(notification) else None
+
+    def unread(self, queryset=None):
+        """تصفية إشعارات المستخدم (أو queryset منها) لغير المقروءة فقط."""
+        if queryset is None:
+            queryset = Notification.objects.filter(user=self.user)
+        queryset = queryset.filter(is_read=False)
+        if self.read_through is not None:
+            queryset = queryset.filter(created_at__gt=self.read_through)
+        for chat_room_id, read_through in self.chats.items():
+            if self.read_through is None or read_through > self.read_through:
+                queryset = queryset.exclude(
+                    type=CHAT_NOTIFICATION_TYPE,
+                    related_chat_room_id=chat_room_id,
+                    created_at__lte=read_through,
+                )
+        return queryset
+
+    def as_payload(self):
+        return {
+            'read_through': self.read_through,
+            'chat_read_through': {
+                str(chat_room_id): self.chat_read_through(chat_room_id) for chat_room_id in self.chats
+            },
+        }
+
+
+def mark_all_read(user, now=None):
+    """نقل العلامة العامة إلى الآن، وحذف علامات المحادثات التي أصبحت مغطاة بها."""
+    now = now or timezone.now()
+    NotificationReadMarker.objects.update_or_create(user=user, chat_room=None, defaults={'read_through': now})
+    NotificationReadMarker.objects.filter(user=user, chat_room__isnull=False, read_through__lte=now).delete()
+    return now
+
+
+def mark_chat_read(user, chat_room, now=None):
+    now = now or timezone.now()
+    NotificationReadMarker.objects.update_or_create(user=user, chat_room=chat_room, defaults={'read_through': now})
+    return now
@@ -0,0 +1,199 @@
+"""
+قناة دفع فورية (Server-Sent Events) لأحداث الإشعارات وعدادات الشارات، بدلاً من الاستطلاع.
+
+كل مستخدم له قناة pub/sub: Redis عند ضبط REDIS_URL (يصل الحدث لكل النسخ والعمال)، وإلا
+وسيط داخل العملية يكفي للتطوير والاختبارات. تُنشر الأحداث بعد نجاح المعاملة، ولا تُحسب
+العدادات إلا إذا كان للمستخدم اتصال مفتوح.
+"""
+import json
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+
+from rest_framework.renderers import BaseRenderer
+
+from .read_state import ReadState, unread_messages_sum
+
+HEARTBEAT_SECONDS = 25
+# يُغلق الاتصال بعدها ليعيد التطبيق الاتصال (وإعادة التحقق من الصلاحية)
+STREAM_MAX_SECONDS = 300
+
+
+def channel_name(user_id):
+    return f'pets:events:{user_id}'
+
+
+class MemoryBroker:
+    """وسيط داخل العملية الواحدة (بدون Redis)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queues = {}
+
+    def publish(self, channel, message):
+        with self._lock:
+            targets = list(self._queues.get(channel, ()))
+        for target in targets:
+            target.put(message)
+
+    def subscribed(self, channels):
+        return {channel for channel in channels if self._queues.get(channel)}
+
+    def subscribe(self, channel):
+        return _MemorySubscription(self, channel)
+
+
+class _MemorySubscription:
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue()
+        with broker._lock:
+            broker._queues.setdefault(channel, set()).add(self.queue)
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        with self.broker._lock:
+            subscribers = self.broker._queues.get(self.channel, set())
+            subscribers.discard(self.queue)
+            if not subscribers:
+                self.broker._queues.pop(self.channel, None)
+
+
+class RedisBroker:
+    def __init__(self, url):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        self.client.publish(channel, message)
+
+    def subscribed(self, channels):
+        """القنوات التي لها مشترك واحد على الأقل (أمر PUBSUB NUMSUB واحد لكل القنوات)."""
+        if not channels:
+            return set()
+        return {
+            channel.decode() if isinstance(channel, bytes) else channel
+            for channel, count in self.client.pubsub_numsub(*channels)
+            if count
+        }
+
+    def subscribe(self, channel):
+        return _RedisSubscription(self.client, channel)
+
+
+class _RedisSubscription:
+    def __init__(self, client, channel):
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(channel)
+
+    def get(self, timeout):
+        message = self.pubsub.get_message(timeout=timeout)
+        return message['data'] if message else None
+
+    def close(self):
+        self.pubsub.close()
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = RedisBroker(settings.REDIS_URL) if settings.REDIS_URL else MemoryBroker()
+    return _broker
+
+
+def badge_counts(user):
+    """عدادات الشارات: نفس قيم notifications/unread-count و chat/user-status."""
+    return ReadState(user).unread().aggregate(
+        unread_count=Count('id'),
+        unread_messages_count=unread_messages_sum(),
+    )
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n'
+
+
+class EventStreamRenderer(BaseRenderer):
+    """يقبل Accept: text/event-stream، ويعرض أخطاء DRF (401 مثلاً) كحدث error."""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return format_event('error', data)
+
+
+def publish_event(user_id, event, data):
+    get_broker().publish(channel_name(user_id), json.dumps({'event': event, 'data': data}, default=str))
+
+
+def _publish_notification(notification):
+    if not get_broker().subscribed([channel_name(notification.user_id)]):
+        return
+    publish_event(notification.user_id, 'notification', {
+        'id': notification.id,
+        'type': notification.type,
+        'title': notification.title,
+        'message': notification.message,
+        'related_pet': notification.related_pet_id,
+        'related_chat_room': notification.related_chat_room_id,
+        'extra_data': notification.extra_data,
+        'created_at': notification.created_at.isoformat(),
+        **badge_counts(notification.user_id),
+    })
+
+
+def _publish_badges(users):
+    connected = get_broker().subscribed([channel_name(user.pk) for user in users])
+    for user in users:
+        if channel_name(user.pk) in connected:
+            publish_event(user.pk, 'badge', badge_counts(user))
+
+
+def publish_notification_on_commit(notification):
+    transaction.on_commit(lambda: _publish_notification(notification))
+
+
+def publish_badges_on_commit(users):
+    """تحديث عدادات المستخدمين بعد القراءة أو بعد إنشاء إشعارات بدون إشارات (bulk_create)."""
+    users = list(users)
+    transaction.on_commit(lambda: _publish_badges(users))
+
+
+def event_stream(user, subscription, clock=time.monotonic):
+    """
+    مولّد نص SSE: العدادات الحالية أولاً، ثم الأحداث المنشورة، مع تعليق keepalive كل
+    HEARTBEAT_SECONDS حتى لا تغلق الوسائط (nginx) الاتصال.
+    """
+    started = last_write = clock()
+    try:
+        counts = badge_counts(user)
+        # لا حاجة لقاعدة البيانات بعد الآن (العدادات تصل مع الأحداث)، فلا يبقى الاتصال محجوزاً
+        if not connection.in_atomic_block:
+            connection.close()
+        yield 'retry: 5000\n' + format_event('badge', counts)
+        while clock() - started < STREAM_MAX_SECONDS:
+            message = subscription.get(timeout=HEARTBEAT_SECONDS)
+            if message is not None:
+                payload = json.loads(message)
+                yield format_event(payload['event'], payload['data'])
+                last_write = clock()
+            elif clock() - last_write >= HEARTBEAT_SECONDS:
+                yield ': keepalive\n\n'
+                last_write = clock()
+    finally:
+        subscription.close()
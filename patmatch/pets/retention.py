@@ -0,0 +1,241 @@
+"""
+سياسة الاحتفاظ بالإشعارات: مدة لكل نوع (NOTIFICATION_RETENTION_DAYS) وحذف المنتهي على
+دفعات متتالية حسب id حتى لا يطول أي قفل، مع أرشفة اختيارية للصفوف قبل حذفها.
+
+على PostgreSQL يُحوّل جدول pets_notification إلى جدول مقسّم شهرياً حسب created_at
+(RANGE) مع قسم افتراضي احتياطي، فالاستعلامات التي تحدد created_at لا تلمس إلا الأقسام
+المعنية، وتُحذف الأقسام القديمة بعد أن تفرغ.
+
+المفتاح الأساسي للجدول المقسّم هو (id, created_at) ولا يوجد قيد فريد على id وحده، لذلك
+لا يمكن أن يكون Notification هدفاً لأي ForeignKey أو OneToOneField: الـ migration سيفشل
+على PostgreSQL. الجداول التي تشير لإشعار تحفظ notification_id كحقل رقمي عادي مفهرس
+وتتعامل مع الإشعارات المحذوفة بنفسها.
+"""
+import json
+import operator
+import time
+from datetime import timedelta
+from functools import reduce
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Notification
+
+TABLE = 'pets_notification'
+DEFAULT_PARTITION = f'{TABLE}_default'
+# عدد الأشهر القادمة التي تُنشأ أقسامها مسبقاً
+PARTITIONS_AHEAD = 3
+
+
+def retention_days(notification_type):
+    return settings.NOTIFICATION_RETENTION_DAYS.get(
+        notification_type, settings.NOTIFICATION_RETENTION_DEFAULT_DAYS
+    )
+
+
+def retention_cutoff(notification_type, now=None):
+    """أقدم created_at ما زال محفوظاً لهذا النوع، أو None إذا كان يُحفظ دائماً."""
+    days = retention_days(notification_type)
+    if days is None:
+        return None
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+def expired_condition(now=None):
+    """شرط الإشعارات المنتهية لكل الأنواع، أو None إذا لم يكن هناك ما يُحذف."""
+    now = now or timezone.now()
+    configured = settings.NOTIFICATION_RETENTION_DAYS
+    conditions = [
+        Q(type=notification_type, created_at__lt=now - timedelta(days=days))
+        for notification_type, days in configured.items()
+        if days is not None
+    ]
+    default_days = settings.NOTIFICATION_RETENTION_DEFAULT_DAYS
+    if default_days is not None:
+        conditions.append(
+            Q(created_at__lt=now - timedelta(days=default_days)) & ~Q(type__in=list(configured))
+        )
+    if not conditions:
+        return None
+    return reduce(operator.or_, conditions)
+
+
+def expired_notifications(now=None, using='default'):
+    condition = expired_condition(now)
+    queryset = Notification.objects.using(using)
+    if condition is None:
+        return queryset.none()
+    return queryset.filter(condition)
+
+
+def purge_notifications(batch_size=1000, archive=None, pause=0, now=None, using='default'):
+    """
+    حذف الإشعارات المنتهية على دفعات من batch_size بترتيب id تصاعدي.
+
+    Args:
+        archive: ملف نصي مفتوح تُكتب فيه كل دفعة (سطر JSON لكل إشعار) قبل حذفها
+        pause: ثوانٍ بين الدفعات لإفساح المجال للكتابات الأخرى
+
+    Returns:
+        int: عدد الإشعارات المحذوفة
+    """
+    queryset = expired_notifications(now, using).order_by('pk')
+    deleted = 0
+    last_pk = 0
+    while True:
+        batch = queryset.filter(pk__gt=last_pk)[:batch_size]
+        if archive is not None:
+            rows = list(batch.values())
+            ids = [row['id'] for row in rows]
+            for row in rows:
+                archive.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+        else:
+            ids = list(batch.values_list('pk', flat=True))
+        if not ids:
+            return deleted
+        deleted += Notification.objects.using(using).filter(pk__in=ids).delete()[0]
+        last_pk = ids[-1]
+        if pause:
+            time.sleep(pause)
+
+
+def _month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(month, count):
+    years, index = divmod(month.month - 1 + count, 12)
+    return month.replace(year=month.year + years, month=index + 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_{month:%Y%m}'
+
+
+def is_partitioned(connection):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def _create_partitions(cursor, first_month, last_month):
+    created = []
+    month = first_month
+    while month <= last_month:
+        upper = _add_months(month, 1)
+        # أشهر وصلت صفوفها إلى القسم الافتراضي لا يمكن إنشاء قسمها (يرفضه PostgreSQL)
+        cursor.execute(
+            f'SELECT 1 FROM {DEFAULT_PARTITION} WHERE created_at >= %s AND created_at < %s LIMIT 1',
+            [month, upper],
+        )
+        if cursor.fetchone() is None:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {TABLE} '
+                f'FOR VALUES FROM (%s) TO (%s)',
+                [month, upper],
+            )
+            created.append(partition_name(month))
+        month = upper
+    return created
+
+
+def ensure_partitions(connection):
+    """إنشاء أقسام الشهر الحالي والأشهر PARTITIONS_AHEAD القادمة إن لم تكن موجودة."""
+    if not is_partitioned(connection):
+        return []
+    month = _month_start(timezone.now())
+    with connection.cursor() as cursor:
+        return _create_partitions(cursor, month, _add_months(month, PARTITIONS_AHEAD))
+
+
+def drop_empty_partitions(connection, now=None):
+    """حذف الأقسام الشهرية الفارغة التي انتهى شهرها (تفرغ بعد purge_notifications)."""
+    if not is_partitioned(connection):
+        return []
+    current = partition_name(_month_start(now or timezone.now()))
+    dropped = []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = to_regclass(%s) ORDER BY child.relname',
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+        for name in names:
+            if name == DEFAULT_PARTITION or name >= current:
+                continue
+            cursor.execute(f'SELECT 1 FROM {name} LIMIT 1')
+            if cursor.fetchone() is None:
+                cursor.execute(f'DROP TABLE {name}')
+                dropped.append(name)
+    return dropped
+
+
+def _rebuild_table(connection, partitioned):
+    """
+    إعادة إنشاء pets_notification (مقسّماً أو عادياً) ونقل الصفوف إليه، مع نفس الفهارس
+    والمفاتيح الأجنبية. المفتاح الأساسي للجدول المقسّم (id, created_at) لأن PostgreSQL
+    يشترط أن يتضمن عمود التقسيم، و id يبقى فريداً لأنه من تسلسل واحد.
+    """
+    old_table = f'{TABLE}_old'
+    sequence = f'{TABLE}_{"partitioned" if partitioned else "plain"}_id_seq'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_get_indexdef(indexrelid) FROM pg_index '
+            'WHERE indrelid = to_regclass(%s) AND NOT indisprimary',
+            [TABLE],
+        )
+        index_definitions = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f'SELECT min(created_at) FROM {TABLE}')
+        oldest = cursor.fetchone()[0]
+
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {old_table}')
+        cursor.execute(
+            f'CREATE TABLE {TABLE} (LIKE {old_table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+            + (' PARTITION BY RANGE (created_at)' if partitioned else '')
+        )
+        # تسلسل مستقل: تسلسل الجدول القديم يُحذف معه
+        cursor.execute(f'CREATE SEQUENCE {sequence} OWNED BY {TABLE}.id')
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+        if partitioned:
+            cursor.execute(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT')
+            current = _month_start(timezone.now())
+            first = _month_start(oldest) if oldest else current
+            _create_partitions(cursor, min(first, current), _add_months(current, PARTITIONS_AHEAD))
+
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {old_table}')
+        cursor.execute(f'SELECT setval(%s, coalesce(max(id), 0) + 1, false) FROM {TABLE}', [sequence])
+        cursor.execute(f'DROP TABLE {old_table}')
+
+        primary_key = '(id, created_at)' if partitioned else '(id)'
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY {primary_key}')
+        for definition in index_definitions:
+            # فهارس الجدول المقسّم تُعرض بصيغة ON ONLY
+            cursor.execute(definition.replace(' ON ONLY ', ' ON ', 1))
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}')
+
+
+def partition_notifications(connection):
+    """تحويل جدول الإشعارات إلى جدول مقسّم شهرياً (PostgreSQL فقط)."""
+    if connection.vendor == 'postgresql' and not is_partitioned(connection):
+        _rebuild_table(connection, partitioned=True)
+
+
+def unpartition_notifications(connection):
+    if is_partitioned(connection):
+        _rebuild_table(connection, partitioned=False)
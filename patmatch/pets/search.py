@@ -0,0 +1,162 @@
+"""
+البحث النصي في الحيوانات (الاسم، السلالة، الموقع، الوصف) مع توحيد الكتابة العربية.
+
+يُخزّن نص البحث الموحّد في Pet.search_document ويُفهرس حسب قاعدة البيانات:
+- SQLite: جدول FTS5 (pets_pet_fts) يُحدّث من الإشارات عند الحفظ والحذف
+- PostgreSQL: فهرس GIN على to_tsvector('simple', search_document)
+وأي قاعدة أخرى تستخدم icontains على النص الموحّد.
+"""
+import re
+import unicodedata
+
+from django.db import connections
+from django.db.models import F, FloatField, Func, Q, Value
+from django.db.models.expressions import RawSQL
+
+SEARCH_TEXT_FIELDS = ('name', 'breed', 'location', 'description')
+FTS_TABLE = 'pets_pet_fts'
+POSTGRES_INDEX = 'pets_pet_search_gin'
+
+# التشكيل وعلامات القرآن والتطويل
+_DIACRITICS_RE = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_LETTER_MAP = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي',
+    'ؤ': 'و',
+    'ة': 'ه',
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+})
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def normalize_arabic(text) -> str:
+    """توحيد أشكال الألف والياء والتاء المربوطة وحذف التشكيل (وتوحيد حالة الأحرف اللاتينية)."""
+    text = unicodedata.normalize('NFKC', str(text or ''))
+    text = _DIACRITICS_RE.sub('', text)
+    return text.translate(_LETTER_MAP).casefold()
+
+
+def _strip_article(token):
+    if token.startswith('ال') and len(token) > 4:
+        return token[2:]
+    return token
+
+
+def _terms(text):
+    """كلمات النص الموحّد، مع صيغة بدون "ال" التعريف لتطابق "القطط" مع "قطط"."""
+    terms = []
+    for token in _TOKEN_RE.findall(normalize_arabic(text)):
+        terms.extend((token, _strip_article(token)))
+    return list(dict.fromkeys(terms))
+
+
+def build_search_document(pet) -> str:
+    breed_name = pet.breed.name if pet.breed_id else ''
+    return ' '.join(_terms(' '.join(
+        str(part or '') for part in (pet.name, breed_name, pet.location, pet.description)
+    )))
+
+
+def search_pets(queryset, query):
+    """
+    تصفية queryset للحيوانات المطابقة لكل كلمات البحث (كبادئة) وإضافة search_rank (الأعلى أفضل).
+    """
+    terms = list(dict.fromkeys(_strip_article(token) for token in _TOKEN_RE.findall(normalize_arabic(query))))
+    if not terms:
+        return queryset.none()
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        table = queryset.model._meta.db_table
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        ).annotate(
+            # bm25 أصغر = أفضل
+            search_rank=RawSQL(
+                f'SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s AND rowid = "{table}"."id"',
+                [match],
+                output_field=FloatField(),
+            )
+        )
+
+    if vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+
+        # نفس تعبير فهرس GIN حتى يستخدمه المخطط
+        document = Func(
+            F('search_document'),
+            template="to_tsvector('simple'::regconfig, %(expressions)s)",
+            output_field=SearchVectorField(),
+        )
+        ts_query = SearchQuery(' & '.join(f'{term}:*' for term in terms), config='simple', search_type='raw')
+        return queryset.alias(search_vector=document).filter(search_vector=ts_query).annotate(
+            search_rank=SearchRank(document, ts_query)
+        )
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(search_document__icontains=term)
+    return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def index_pets(rows, using='default'):
+    """تحديث جدول FTS5 لصفوف (id, search_document)؛ لا شيء على قواعد البيانات الأخرى."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    rows = list(rows)
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pet_id,) for pet_id, _ in rows])
+        cursor.executemany(f'INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (%s, %s)', rows)
+
+
+def unindex_pet(pet_id, using='default'):
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [pet_id])
+
+
+def create_search_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                f"USING fts5(search_document, tokenize='unicode61 remove_diacritics 2')"
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {POSTGRES_INDEX} ON pets_pet "
+                f"USING gin (to_tsvector('simple'::regconfig, search_document))"
+            )
+
+
+def drop_search_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'DROP INDEX IF EXISTS {POSTGRES_INDEX}')
+
+
+def rebuild_search_index(pet_model, using='default'):
+    """إعادة حساب search_document لكل الحيوانات وإعادة بناء جدول FTS5."""
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        drop_search_index(connection)
+    create_search_index(connection)
+    batch = []
+    pets = pet_model._default_manager.using(using).select_related('breed').order_by('pk')
+    for pet in pets.iterator(chunk_size=500):
+        document = build_search_document(pet)
+        if document != pet.search_document:
+            pet_model._default_manager.using(using).filter(pk=pet.pk).update(search_document=document)
+        batch.append((pet.pk, document))
+        if len(batch) >= 500:
+            index_pets(batch, using)
+            batch = []
+    index_pets(batch, using)
@@ -1,7 +1,16 @@
 from rest_framework import serializers
 from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
 import re
-from .models import Breed, Pet, PetImage, BreedingRequest, Favorite, VeterinaryClinic, Notification, ChatRoom, AdoptionRequest
+import os
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Breed, Pet, PetImage, BreedingRequest, Favorite, VeterinaryClinic, Notification, ChatRoom, AdoptionRequest, UploadSession, PetMatchSuggestion
+from .images import derivative_urls
+from .chat_context import chat_context_entry
 import requests
 
 def reverse_geocode_address(lat: float, lng: float) -> str:
@@ -41,25 +50,42 @@ class VeterinaryClinicSerializer(serializers.ModelSerializer):
         model = VeterinaryClinic
         fields = ['id', 'name', 'code', 'address', 'city', 'phone', 'email', 'working_hours', 'is_active']
 
+class ImageVariantsField(serializers.ReadOnlyField):
+    """روابط مشتقات الصورة {thumb, card, full} لحقل صورة في النموذج"""
+
+    def to_representation(self, value):
+        return derivative_urls(value, request=self.context.get('request'))
+
+
 class PetImageSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField(source='image')
+
     class Meta:
         model = PetImage
-        fields = ['id', 'image', 'caption']
+        fields = ['id', 'image', 'image_variants', 'caption']
 
 
 class PublicPetSerializer(serializers.ModelSerializer):
     breed_name = serializers.CharField(source='breed.name', read_only=True)
     age_display = serializers.CharField(read_only=True)
     gender_display = serializers.CharField(read_only=True)
+    main_image_variants = ImageVariantsField(source='main_image')
 
     class Meta:
         model = Pet
         fields = [
             'id', 'name', 'pet_type', 'breed_name', 'age_display', 'gender_display',
-            'status', 'main_image'
+            'status', 'main_image', 'main_image_variants'
         ]
         read_only_fields = fields
 
+# حقول الملفات التي قد تحمل رابطاً كاملاً بدلاً من اسم ملف في التخزين
+EXTERNAL_URL_FIELDS = (
+    'main_image', 'image_2', 'image_3', 'image_4',
+    'vaccination_certificate', 'health_certificate', 'disease_free_certificate', 'additional_certificate',
+)
+
+
 class PetSerializer(serializers.ModelSerializer):
     latitude = serializers.CharField(required=False, allow_blank=True, allow_null=True)
     longitude = serializers.CharField(required=False, allow_blank=True, allow_null=True)
@@ -73,6 +99,7 @@ class PetSerializer(serializers.ModelSerializer):
     
     # Make main_image optional during updates
     main_image = serializers.ImageField(required=False)
+    main_image_variants = ImageVariantsField(source='main_image')
     
     # Make certificate fields optional
     vaccination_certificate = serializers.FileField(required=False)
@@ -105,14 +132,9 @@ class PetSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        # Fix image URLs - if it's an external URL, use the raw value instead of Django's processed URL
-        if instance.main_image:
-            main_image_name = instance.main_image.name
-            if main_image_name.startswith('https://') or main_image_name.startswith('http://'):
-                data['main_image'] = main_image_name
-            
-        # Apply same fix to other image fields
-        for field in ['image_2', 'image_3', 'image_4']:
+        # Fix file URLs - if it's an external URL (legacy images, direct uploads to the bucket),
+        # use the raw value instead of Django's processed URL
+        for field in EXTERNAL_URL_FIELDS:
             image_field = getattr(instance, field, None)
             if image_field and hasattr(image_field, 'name'):
                 if image_field.name.startswith('https://') or image_field.name.startswith('http://'):
@@ -126,7 +148,7 @@ class PetSerializer(serializers.ModelSerializer):
             'age_months', 'age_display', 'gender', 'gender_display', 
             'description', 'breeding_history', 'last_breeding_date', 'number_of_offspring',
             'is_trained', 'good_with_kids', 'good_with_pets',
-            'hosting_preference', 'main_image', 'image_2', 'image_3', 'image_4', 'additional_images',
+            'hosting_preference', 'main_image', 'main_image_variants', 'image_2', 'image_3', 'image_4', 'additional_images',
             'vaccination_certificate', 'health_certificate', 'disease_free_certificate', 'additional_certificate',
             'status', 'status_display', 'location', 
             'latitude', 'longitude', 'is_free', 'owner_name', 'owner_email', 'owner_is_verified',
@@ -226,6 +248,7 @@ class PetListSerializer(serializers.ModelSerializer):
     has_health_certificates = serializers.BooleanField(read_only=True)
     distance = serializers.SerializerMethodField()
     distance_display = serializers.SerializerMethodField()
+    main_image_variants = ImageVariantsField(source='main_image')
     
     def get_distance(self, obj):
         """حساب المسافة بالكيلومتر"""
@@ -279,9 +302,9 @@ class PetListSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'name', 'pet_type', 'pet_type_display', 'breed_name', 
             'age_display', 'age_months', 'gender', 'gender_display', 'description', 'main_image', 
-            'location', 'latitude', 'longitude', 'distance', 'distance_display',
+            'main_image_variants', 'location', 'latitude', 'longitude', 'distance', 'distance_display',
             'price_display', 'status', 'status_display', 'owner_name', 'owner_is_verified',
-            'has_health_certificates', 'hosting_preference', 'created_at'
+            'has_health_certificates', 'hosting_preference', 'created_at', 'updated_at'
         ]
 
 class BreedingRequestSerializer(serializers.ModelSerializer):
@@ -359,10 +382,20 @@ class FavoriteSerializer(serializers.ModelSerializer):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
 
+class PetMatchSuggestionSerializer(serializers.ModelSerializer):
+    partner = PetListSerializer(read_only=True)
+    
+    class Meta:
+        model = PetMatchSuggestion
+        fields = ['rank', 'distance_km', 'partner', 'computed_at']
+
 class NotificationSerializer(serializers.ModelSerializer):
     type_display = serializers.CharField(source='get_type_display', read_only=True)
     related_pet_details = PetListSerializer(source='related_pet', read_only=True)
     time_ago = serializers.SerializerMethodField()
+    # مشتقة من علامات القراءة (read_state في السياق) إضافة إلى القراءة الفردية
+    is_read = serializers.SerializerMethodField()
+    read_at = serializers.SerializerMethodField()
     
     class Meta:
         model = Notification
@@ -374,6 +407,15 @@ class NotificationSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['user', 'created_at', 'read_at']
     
+    def get_is_read(self, obj):
+        read_state = self.context.get('read_state')
+        return read_state.is_read(obj) if read_state else obj.is_read
+
+    def get_read_at(self, obj):
+        read_state = self.context.get('read_state')
+        read_at = read_state.read_at(obj) if read_state else obj.read_at
+        return serializers.DateTimeField().to_representation(read_at) if read_at else None
+
     def get_time_ago(self, obj):
         """حساب الوقت المنقضي منذ إنشاء الإشعار"""
         from django.utils import timezone
@@ -558,8 +600,8 @@ class ChatContextSerializer(serializers.ModelSerializer):
         fields = ['id', 'firebase_chat_id', 'chat_context']
     
     def get_chat_context(self, obj):
-        """الحصول على السياق الكامل للمحادثة"""
-        return obj.get_chat_context()
+        """الحصول على السياق الكامل للمحادثة (من الكاش إن كان صالحاً)"""
+        return chat_context_entry(obj)['data']['chat_context']
 
 
 class ChatStatusSerializer(serializers.ModelSerializer):
@@ -837,3 +879,86 @@ class AdoptionRequestResponseSerializer(serializers.Serializer):
     action = serializers.ChoiceField(choices=['approve', 'reject', 'complete'])
     notes = serializers.CharField(required=False, allow_blank=True)
     admin_notes = serializers.CharField(required=False, allow_blank=True) 
+
+
+IMAGE_CONTENT_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'image/heic', 'image/heif')
+
+# الحقول المسموح رفعها مباشرة لكل غرض (مسار الحفظ مأخوذ من upload_to في النموذج)
+DIRECT_UPLOAD_TARGETS = {
+    'pet_image': {
+        'fields': ('main_image', 'image_2', 'image_3', 'image_4'),
+        'content_types': IMAGE_CONTENT_TYPES,
+        'max_size': 20 * 1024 * 1024,
+    },
+    'pet_certificate': {
+        'fields': (
+            'vaccination_certificate', 'health_certificate',
+            'disease_free_certificate', 'additional_certificate',
+        ),
+        'content_types': ('application/pdf',) + IMAGE_CONTENT_TYPES,
+        'max_size': 20 * 1024 * 1024,
+    },
+    'chat_image': {
+        'fields': ('',),
+        'content_types': IMAGE_CONTENT_TYPES,
+        'max_size': 5 * 1024 * 1024,
+    },
+}
+
+
+class UploadSessionCreateSerializer(serializers.Serializer):
+    """طلب جلسة رفع مباشر إلى التخزين"""
+    purpose = serializers.ChoiceField(choices=UploadSession.PURPOSE_CHOICES)
+    pet = serializers.PrimaryKeyRelatedField(queryset=Pet.objects.all(), required=False, allow_null=True)
+    field = serializers.CharField(required=False, allow_blank=True, default='')
+    filename = serializers.CharField(max_length=255)
+    content_type = serializers.CharField(max_length=100)
+    size = serializers.IntegerField(min_value=1)
+
+    def validate(self, data):
+        target = DIRECT_UPLOAD_TARGETS[data['purpose']]
+        if data['field'] not in target['fields']:
+            raise serializers.ValidationError({'field': 'الحقل غير مسموح لهذا النوع من الرفع'})
+        if data['content_type'].lower() not in target['content_types']:
+            raise serializers.ValidationError({'content_type': 'نوع الملف غير مدعوم'})
+        if data['size'] > target['max_size']:
+            max_mb = target['max_size'] // (1024 * 1024)
+            raise serializers.ValidationError({'size': f'حجم الملف يجب أن يكون أقل من {max_mb} ميجابايت'})
+
+        pet = data.get('pet')
+        if data['purpose'].startswith('pet_'):
+            if pet is None:
+                raise serializers.ValidationError({'pet': 'يجب تحديد الحيوان'})
+            if pet.owner_id != self.context['request'].user.id:
+                raise serializers.ValidationError({'pet': 'لا يمكنك رفع ملفات لحيوان لا تملكه'})
+        elif pet is not None:
+            raise serializers.ValidationError({'pet': 'صور المحادثة لا ترتبط بحيوان'})
+        return data
+
+    def create(self, validated_data):
+        field = validated_data['field']
+        if field:
+            directory = Pet._meta.get_field(field).upload_to
+        else:
+            directory = 'chat_images/'
+        extension = os.path.splitext(validated_data['filename'])[1].lower()[:10]
+        return UploadSession.objects.create(
+            user=self.context['request'].user,
+            purpose=validated_data['purpose'],
+            pet=validated_data.get('pet'),
+            field_name=field,
+            key=f"{directory.rstrip('/')}/{uuid.uuid4().hex}{extension}",
+            content_type=validated_data['content_type'].lower(),
+            size=validated_data['size'],
+            expires_at=timezone.now() + timedelta(seconds=settings.DIRECT_UPLOAD_EXPIRES_SECONDS),
+        )
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    id = serializers.UUIDField(source='public_id', read_only=True)
+    field = serializers.CharField(source='field_name', read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'purpose', 'pet', 'field', 'key', 'content_type', 'size', 'status', 'expires_at', 'completed_at']
+        read_only_fields = fields
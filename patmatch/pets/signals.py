@@ -0,0 +1,157 @@
+"""Signal handlers for pet image derivatives, search index, caches (feed, stats, chat context), match suggestions, realtime events and push topics."""
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from accounts.models import User
+
+from .chat_context import PET_CONTEXT_FIELDS, USER_CONTEXT_FIELDS, bump_context_version_on_commit
+from .feed_cache import bump_feed_version
+from .images import generate_derivatives_on_commit
+from .models import AdoptionRequest, Breed, BreedingRequest, ChatRoom, Notification, Pet, PetImage
+from .push_topics import TOPIC_FIELDS, sync_user_topics_on_commit
+from .realtime import publish_notification_on_commit
+from .search import SEARCH_TEXT_FIELDS, build_search_document, index_pets, unindex_pet
+from .stats import invalidate_adoption_stats, invalidate_global_stats
+from .suggestions import (
+    MATCHING_FIELDS,
+    matching_values,
+    refresh_partner_lists_on_commit,
+    refresh_suggestions_on_commit,
+    stored_matching_values,
+)
+
+
+@receiver(post_save, sender=Pet)
+def build_pet_image_derivatives(sender, instance: Pet, update_fields=None, **kwargs):
+    """Generate thumb/card/full derivatives for newly uploaded pet images."""
+    image_fields = ['main_image', 'image_2', 'image_3', 'image_4']
+    if update_fields is not None:
+        image_fields = [field for field in image_fields if field in update_fields]
+    generate_derivatives_on_commit(getattr(instance, field).name for field in image_fields)
+
+
+@receiver(post_save, sender=PetImage)
+def build_additional_image_derivatives(sender, instance: PetImage, **kwargs):
+    generate_derivatives_on_commit([instance.image.name])
+
+
+def _touches_search_text(update_fields):
+    return update_fields is None or bool(set(update_fields) & set(SEARCH_TEXT_FIELDS))
+
+
+@receiver(pre_save, sender=Pet)
+def refresh_pet_search_document(sender, instance: Pet, update_fields=None, **kwargs):
+    if _touches_search_text(update_fields):
+        instance.search_document = build_search_document(instance)
+
+
+@receiver(post_save, sender=Pet)
+def index_pet_for_search(sender, instance: Pet, update_fields=None, using='default', **kwargs):
+    if not _touches_search_text(update_fields):
+        return
+    if update_fields is not None and 'search_document' not in update_fields:
+        Pet.objects.using(using).filter(pk=instance.pk).update(search_document=instance.search_document)
+    index_pets([(instance.pk, instance.search_document)], using)
+
+
+@receiver(post_delete, sender=Pet)
+def unindex_deleted_pet(sender, instance: Pet, using='default', **kwargs):
+    unindex_pet(instance.pk, using)
+
+
+@receiver(post_save, sender=Breed)
+def reindex_breed_pets(sender, instance: Breed, created=False, using='default', **kwargs):
+    if created:
+        return
+    rows = []
+    for pet in Pet.objects.using(using).filter(breed=instance).select_related('breed').iterator():
+        document = build_search_document(pet)
+        if document != pet.search_document:
+            Pet.objects.using(using).filter(pk=pet.pk).update(search_document=document)
+            rows.append((pet.pk, document))
+    index_pets(rows, using)
+
+
+@receiver(post_save, sender=Pet)
+@receiver(post_delete, sender=Pet)
+@receiver(post_save, sender=Breed)
+@receiver(post_delete, sender=Breed)
+def invalidate_pet_feed_cache(sender, **kwargs):
+    bump_feed_version()
+
+
+def _touches_matching(update_fields):
+    return update_fields is None or bool(set(update_fields) & MATCHING_FIELDS)
+
+
+@receiver(pre_save, sender=Pet)
+def snapshot_pet_matching_fields(sender, instance: Pet, update_fields=None, **kwargs):
+    if _touches_matching(update_fields):
+        instance._stored_matching_values = stored_matching_values(instance)
+
+
+@receiver(post_save, sender=Pet)
+def refresh_pet_match_suggestions(sender, instance: Pet, update_fields=None, **kwargs):
+    if not _touches_matching(update_fields):
+        return
+    # الحفظ الكامل من الـ serializer يمر هنا في كل تعديل؛ لا إعادة حساب إلا إذا تغيّر حقل توافق
+    before = instance.__dict__.pop('_stored_matching_values', None)
+    if before is None or before != matching_values(instance):
+        refresh_suggestions_on_commit(instance.pk)
+
+
+@receiver(pre_delete, sender=Pet)
+def refresh_suggestions_after_pet_delete(sender, instance: Pet, **kwargs):
+    refresh_partner_lists_on_commit(instance.pk)
+
+
+@receiver(post_save, sender=Pet)
+@receiver(post_delete, sender=Pet)
+@receiver(post_save, sender=BreedingRequest)
+@receiver(post_delete, sender=BreedingRequest)
+def invalidate_stats_cache(sender, **kwargs):
+    invalidate_global_stats()
+
+
+@receiver(post_save, sender=AdoptionRequest)
+@receiver(post_delete, sender=AdoptionRequest)
+def invalidate_adoption_stats_cache(sender, instance: AdoptionRequest, **kwargs):
+    owner_ids = list(Pet.objects.filter(pk=instance.pet_id).values_list('owner_id', flat=True))
+    invalidate_adoption_stats([instance.adopter_id, *owner_ids])
+
+
+@receiver(post_save, sender=Notification)
+def push_new_notification(sender, instance: Notification, created=False, **kwargs):
+    if created:
+        publish_notification_on_commit(instance)
+
+
+@receiver(post_save, sender=User)
+def sync_user_push_topics(sender, instance: User, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & TOPIC_FIELDS:
+        return
+    sync_user_topics_on_commit(instance)
+
+
+@receiver(post_save, sender=ChatRoom)
+@receiver(post_delete, sender=ChatRoom)
+@receiver(post_save, sender=BreedingRequest)
+@receiver(post_save, sender=AdoptionRequest)
+@receiver(post_save, sender=Breed)
+@receiver(post_save, sender='clinics.Clinic')
+@receiver(post_save, sender='clinics.ClinicClientRecord')
+@receiver(post_save, sender='clinics.ClinicPatientRecord')
+def invalidate_chat_context(sender, instance, **kwargs):
+    bump_context_version_on_commit(sender._meta.model_name, instance.pk)
+
+
+@receiver(post_save, sender=Pet)
+def invalidate_pet_chat_context(sender, instance: Pet, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) & PET_CONTEXT_FIELDS:
+        bump_context_version_on_commit('pet', instance.pk)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_chat_context(sender, instance: User, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) & USER_CONTEXT_FIELDS:
+        bump_context_version_on_commit('user', instance.pk)
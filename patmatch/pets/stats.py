@@ -0,0 +1,89 @@
+"""
+إحصائيات الحيوانات والتبني: استعلام تجميع شرطي واحد لكل جدول (Count مع filter)،
+مع كاش يُحذف من الإشارات عند تعديل البيانات (ومدة قصوى كاحتياط لتعديلات update()).
+"""
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import AdoptionRequest, BreedingRequest, Pet
+
+STATS_CACHE_SECONDS = 300
+GLOBAL_STATS_KEY = 'pets:stats:global'
+
+
+def _adoption_key(user_id):
+    return f'pets:stats:adoption:{user_id}'
+
+
+def global_stats():
+    """عدادات عامة لكل الحيوانات وطلبات التزاوج."""
+    stats = cache.get(GLOBAL_STATS_KEY)
+    if stats is not None:
+        return stats
+
+    pets = Pet.objects.aggregate(
+        total=Count('id'),
+        available=Count('id', filter=Q(status='available')),
+        available_for_adoption=Count('id', filter=Q(status='available_for_adoption')),
+        adoption_pending=Count('id', filter=Q(status='adoption_pending')),
+        adopted=Count('id', filter=Q(status='adopted')),
+        **{
+            f'type_{pet_type}': Count('id', filter=Q(pet_type=pet_type))
+            for pet_type, _ in Pet.PET_TYPE_CHOICES
+        },
+    )
+    breeding = BreedingRequest.objects.aggregate(
+        total=Count('id'),
+        completed=Count('id', filter=Q(status='completed')),
+    )
+    stats = {
+        'pets': pets,
+        'breeding_requests': breeding,
+    }
+    cache.set(GLOBAL_STATS_KEY, stats, STATS_CACHE_SECONDS)
+    return stats
+
+
+def user_adoption_counts(user):
+    counts = cache.get(_adoption_key(user.pk))
+    if counts is not None:
+        return counts
+
+    counts = AdoptionRequest.objects.filter(Q(adopter=user) | Q(pet__owner=user)).aggregate(
+        my_adoption_requests=Count('id', filter=Q(adopter=user)),
+        my_pending_requests=Count('id', filter=Q(adopter=user, status='pending')),
+        received_requests=Count('id', filter=Q(pet__owner=user)),
+    )
+    cache.set(_adoption_key(user.pk), counts, STATS_CACHE_SECONDS)
+    return counts
+
+
+def pet_stats_payload():
+    stats = global_stats()
+    return {
+        'total_pets': stats['pets']['total'],
+        'available_pets': stats['pets']['available'],
+        'breeding_requests': stats['breeding_requests']['total'],
+        'successful_matings': stats['breeding_requests']['completed'],
+        'by_type': {
+            pet_type: stats['pets'][f'type_{pet_type}'] for pet_type, _ in Pet.PET_TYPE_CHOICES
+        },
+    }
+
+
+def adoption_stats_payload(user):
+    pets = global_stats()['pets']
+    return {
+        'total_available_for_adoption': pets['available_for_adoption'],
+        'total_adoption_pending': pets['adoption_pending'],
+        'total_adopted': pets['adopted'],
+        **user_adoption_counts(user),
+    }
+
+
+def invalidate_global_stats():
+    cache.delete(GLOBAL_STATS_KEY)
+
+
+def invalidate_adoption_stats(user_ids):
+    cache.delete_many([_adoption_key(user_id) for user_id in user_ids if user_id])
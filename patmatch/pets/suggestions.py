@@ -0,0 +1,162 @@
+"""
+اقتراحات شركاء التزاوج المحسوبة مسبقاً (PetMatchSuggestion).
+
+لكل حيوان متاح للتزاوج تُحفظ أقرب SUGGESTIONS_PER_PET حيوانات متوافقة: نفس النوع
+والسلالة، جنس مختلف، مالك مختلف، فرق عمر لا يتجاوز MAX_AGE_GAP_MONTHS، وضمن
+MAX_DISTANCE_KM (إحداثيات الحيوان أو مالكه). تُحسب كل الاقتراحات ليلاً بأمر
+compute_match_suggestions، وتُحدّث اقتراحات الحيوان والحيوانات المتأثرة به عند تغيّر أحد
+حقول MATCHING_FIELDS (لا عند كل حفظ)، وقوائم من كان يعرضه عند حذفه.
+"""
+import logging
+from typing import Iterable, List, Mapping, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .matching import NearbyPetMatcher
+from .models import Pet, PetMatchSuggestion
+
+logger = logging.getLogger(__name__)
+
+SUGGESTIONS_PER_PET = 10
+MAX_DISTANCE_KM = 50.0
+MAX_AGE_GAP_MONTHS = 36
+BREEDING_STATUS = 'available'
+
+# الحقول التي تغيّر التوافق أو المسافة
+MATCHING_FIELDS = {'status', 'pet_type', 'breed', 'gender', 'age_months', 'latitude', 'longitude', 'owner'}
+MATCHING_ATTNAMES = tuple(sorted(Pet._meta.get_field(name).attname for name in MATCHING_FIELDS))
+
+
+def matching_values(pet) -> tuple:
+    return tuple(getattr(pet, attname) for attname in MATCHING_ATTNAMES)
+
+
+def stored_matching_values(pet) -> Optional[tuple]:
+    """قيم حقول التوافق المحفوظة حالياً (قبل الحفظ)، أو None لحيوان جديد."""
+    if pet.pk is None:
+        return None
+    return Pet.objects.filter(pk=pet.pk).values_list(*MATCHING_ATTNAMES).first()
+
+
+def _candidate_rows(breed_ids: Optional[Iterable[int]] = None):
+    queryset = Pet.objects.filter(status=BREEDING_STATUS)
+    if breed_ids is not None:
+        queryset = queryset.filter(breed_id__in=list(breed_ids))
+    return queryset.annotate(
+        lat=Coalesce(F('latitude'), F('owner__latitude')),
+        lng=Coalesce(F('longitude'), F('owner__longitude')),
+    ).filter(lat__isnull=False, lng__isnull=False).values(
+        'id', 'owner_id', 'pet_type', 'breed_id', 'gender', 'age_months', 'lat', 'lng',
+    )
+
+
+def build_matcher(rows: Iterable[Mapping]) -> NearbyPetMatcher:
+    return NearbyPetMatcher(
+        (
+            {**row, 'latitude': row['lat'], 'longitude': row['lng'], 'owner': row['owner_id']}
+            for row in rows
+        ),
+        max_distance_km=MAX_DISTANCE_KM,
+    )
+
+
+def compatible_partners(matcher: NearbyPetMatcher, pet: Mapping) -> List[Tuple[Mapping, float]]:
+    """كل الشركاء المتوافقين ضمن المسافة مرتبين من الأقرب."""
+    return [
+        (partner, distance)
+        for partner, distance in matcher.nearest(
+            pet['latitude'],
+            pet['longitude'],
+            pet_type=pet['pet_type'],
+            exclude_gender=pet['gender'],
+            exclude_owner=pet['owner'],
+        )
+        if partner['breed_id'] == pet['breed_id']
+        and abs(partner['age_months'] - pet['age_months']) <= MAX_AGE_GAP_MONTHS
+    ]
+
+
+def store_suggestions(matcher: NearbyPetMatcher, pet_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    إعادة حساب اقتراحات الحيوانات المحددة (أو الكل) من الـ matcher واستبدال المحفوظ منها.
+    الحيوانات غير الموجودة في الـ matcher (غير متاحة أو بدون موقع) تُحذف اقتراحاتها.
+    """
+    targets = None if pet_ids is None else set(pet_ids)
+    computed_at = timezone.now()
+    suggestions = []
+    for pet in matcher.pets:
+        if targets is not None and pet['id'] not in targets:
+            continue
+        partners = compatible_partners(matcher, pet)[:SUGGESTIONS_PER_PET]
+        suggestions.extend(
+            PetMatchSuggestion(
+                pet_id=pet['id'],
+                partner_id=partner['id'],
+                rank=rank,
+                distance_km=distance,
+                computed_at=computed_at,
+            )
+            for rank, (partner, distance) in enumerate(partners, start=1)
+        )
+
+    with transaction.atomic():
+        stale = PetMatchSuggestion.objects.all()
+        if targets is not None:
+            stale = stale.filter(pet_id__in=targets)
+        stale.delete()
+        PetMatchSuggestion.objects.bulk_create(suggestions, batch_size=1000)
+    return len(suggestions)
+
+
+def compute_all_suggestions() -> int:
+    return store_suggestions(build_matcher(_candidate_rows()))
+
+
+def refresh_suggestions_for_pet(pet_id: int) -> int:
+    """
+    تحديث اقتراحات حيوان بعد تعديله، واقتراحات الحيوانات التي قد يدخل قائمتها أو يخرج منها:
+    من كان يعرضه سابقاً، ومن أصبح متوافقاً معه الآن.
+    """
+    affected = {pet_id}
+    affected.update(PetMatchSuggestion.objects.filter(partner_id=pet_id).values_list('pet_id', flat=True))
+    breed_ids = set(Pet.objects.filter(id__in=affected).values_list('breed_id', flat=True))
+    matcher = build_matcher(_candidate_rows(breed_ids))
+
+    pet = next((row for row in matcher.pets if row['id'] == pet_id), None)
+    if pet is not None:
+        affected.update(partner['id'] for partner, _ in compatible_partners(matcher, pet))
+    return store_suggestions(matcher, affected)
+
+
+def refresh_suggestions(pet_ids: Iterable[int]) -> int:
+    """إعادة حساب اقتراحات حيوانات محددة فقط (مثلاً بعد حذف شريك كان في قوائمها)."""
+    pet_ids = set(pet_ids)
+    breed_ids = set(Pet.objects.filter(id__in=pet_ids).values_list('breed_id', flat=True))
+    return store_suggestions(build_matcher(_candidate_rows(breed_ids)), pet_ids)
+
+
+def _run_on_commit(refresh, argument):
+    def run():
+        try:
+            refresh(argument)
+        except Exception as exc:
+            logger.exception("Match suggestion refresh failed for %s: %s", argument, exc)
+
+    transaction.on_commit(run)
+
+
+def refresh_suggestions_on_commit(pet_id: int):
+    _run_on_commit(refresh_suggestions_for_pet, pet_id)
+
+
+def refresh_partner_lists_on_commit(pet_id: int):
+    """
+    يُستدعى قبل حذف الحيوان: الحيوانات التي يظهر في قوائمها تُحسب بعد الحذف حتى لا تبقى
+    فجوات في الترتيب (اقتراحاته تُحذف مع الحذف المتتالي).
+    """
+    pet_ids = list(PetMatchSuggestion.objects.filter(partner_id=pet_id).values_list('pet_id', flat=True))
+    if pet_ids:
+        _run_on_commit(refresh_suggestions, pet_ids)
@@ -1,12 +1,50 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import io
+from datetime import timedelta
 from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.sax.saxutils import escape
 
-from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase
+from PIL import Image
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import InMemoryUploadedFile, SimpleUploadedFile, TemporaryUploadedFile
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+import requests
 from django.db.models.signals import post_save
 
 from accounts.models import User
-from .models import Breed, Pet, Notification
-from .notifications import notify_new_pet_added
+from accounts.firebase_service import firebase_service
+from patmatch_backend.storage import cache_control_for, is_hashed_name, serve_media
+from patmatch_backend.upload_handlers import StreamingUploadHandler, UploadTooLarge, memory_budget
+from .campaigns import CampaignRunner
+from .images import derivative_name, derivative_urls, generate_derivatives
+from .management.commands.recommend_nearby_pets_from_prod import PetsApiClient
+from .matching import NearbyPetMatcher
+from .models import AdoptionRequest, Breed, BreedingRequest, ChatRoom, DeferredPush, Pet, Notification, NotificationReadMarker, PetMatchSuggestion, PushTopicSubscription, PendingChatPush, PushCampaign, PushCampaignDelivery, UploadSession
+from .notifications import _send_push_notification, notify_new_pet_added
+from . import push_policy
+from .push_topics import area_cell
+from .chat_push import flush_pending_chat_pushes
+from .read_state import ReadState, mark_all_read, mark_chat_read
+from .realtime import badge_counts, channel_name, get_broker
+from .retention import purge_notifications
+from .search import normalize_arabic
+from .suggestions import compute_all_suggestions, refresh_suggestions_for_pet
+from .serializers import PetListSerializer
 from clinics.signals import claim_invites_when_user_updates
 
 
@@ -57,3 +95,1528 @@ class NotifyNewPetAddedTests(TestCase):
 
         self.assertEqual(result, [])
         self.assertEqual(Notification.objects.count(), 0)
+
+
+class CampaignRunnerTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        post_save.disconnect(receiver=claim_invites_when_user_updates, sender=User)
+
+    @classmethod
+    def tearDownClass(cls):
+        post_save.connect(receiver=claim_invites_when_user_updates, sender=User)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(
+                username=f'user{index}',
+                email=f'user{index}@example.com',
+                password='testpass123',
+                phone=f'10000000{index}',
+                fcm_token=f'token-{index}' if index % 2 == 0 else '',
+            )
+            for index in range(5)
+        ]
+
+    def _runner(self, **kwargs):
+        return CampaignRunner(
+            key='test_campaign',
+            title='Title',
+            message='Body',
+            extra_data={'type': 'app_update'},
+            chunk_size=2,
+            concurrency=2,
+            **kwargs
+        )
+
+    @staticmethod
+    def _fake_send(tokens, title, body, data=None):
+        return [(token, token != 'token-2', '' if token != 'token-2' else 'UNREGISTERED') for token in tokens]
+
+    def test_run_records_outcomes_and_completes(self):
+        with mock.patch('pets.campaigns.firebase_service') as service:
+            service.is_initialized = True
+            service.send_multicast_batch.side_effect = self._fake_send
+            campaign = self._runner().run(User.objects.all())
+
+        self.assertEqual(campaign.status, 'completed')
+        self.assertEqual(campaign.last_user_id, self.users[-1].pk)
+        self.assertEqual(campaign.notifications_created, 5)
+        self.assertEqual(campaign.push_sent, 2)
+        self.assertEqual(campaign.push_failed, 1)
+        self.assertEqual(Notification.objects.count(), 5)
+        failed = PushCampaignDelivery.objects.get(campaign=campaign, status='failed')
+        self.assertEqual(failed.fcm_token, 'token-2')
+        self.assertEqual(failed.error_code, 'UNREGISTERED')
+        self.assertEqual(PushCampaignDelivery.objects.filter(status='skipped').count(), 2)
+
+    def test_rerunning_a_completed_app_update_campaign_says_so(self):
+        with mock.patch('pets.campaigns.firebase_service') as service, \
+                mock.patch('pets.management.commands.send_app_update_notifications.firebase_service', service):
+            service.is_initialized = True
+            service.send_multicast_batch.side_effect = self._fake_send
+            call_command('send_app_update_notifications', stdout=io.StringIO())
+            output = io.StringIO()
+            call_command('send_app_update_notifications', stdout=output)
+
+        self.assertIn('مكتملة مسبقاً', output.getvalue())
+        self.assertEqual(Notification.objects.count(), 3)
+        self.assertTrue(PushCampaign.objects.get().key.startswith('app_update_'))
+
+        output = io.StringIO()
+        call_command('send_app_update_notifications', '--dry-run', stdout=output)
+        self.assertIn('تشغيل تجريبي', output.getvalue())
+        self.assertNotIn('مكتملة مسبقاً', output.getvalue())
+
+    def test_apology_campaign_key_follows_its_content(self):
+        with mock.patch('pets.campaigns.firebase_service') as service:
+            service.is_initialized = True
+            service.send_multicast_batch.side_effect = self._fake_send
+            call_command('send_system_issue_apology', stdout=io.StringIO())
+            output = io.StringIO()
+            call_command('send_system_issue_apology', stdout=output)
+            self.assertIn('مكتملة مسبقاً', output.getvalue())
+
+            # اعتذار عن حادثة أخرى في نفس اليوم حملة جديدة
+            call_command('send_system_issue_apology', '--message', 'مشكلة أخرى تم حلها', stdout=io.StringIO())
+
+        self.assertEqual(PushCampaign.objects.filter(key__startswith='system_issue_apology_').count(), 2)
+        self.assertEqual(Notification.objects.count(), 10)
+
+    def test_resume_does_not_duplicate_notifications(self):
+        PushCampaign.objects.create(
+            key='test_campaign', title='Title', message='Body', last_user_id=self.users[1].pk
+        )
+
+        with mock.patch('pets.campaigns.firebase_service') as service:
+            service.is_initialized = True
+            service.send_multicast_batch.side_effect = self._fake_send
+            campaign = self._runner().run(User.objects.all())
+            sent_tokens = [
+                token for call in service.send_multicast_batch.call_args_list for token in call.args[0]
+            ]
+
+        self.assertEqual(campaign.notifications_created, 3)
+        self.assertNotIn('token-0', sent_tokens)
+        self.assertEqual(set(Notification.objects.values_list('user_id', flat=True)), {u.pk for u in self.users[2:]})
+
+
+class NearbyPetMatcherTests(TestCase):
+    def setUp(self):
+        self.pets = [
+            {'id': 1, 'latitude': 30.0444, 'longitude': 31.2357, 'pet_type': 'cats', 'gender': 'M', 'owner': 'a'},
+            {'id': 2, 'latitude': 30.0500, 'longitude': 31.2400, 'pet_type': 'cats', 'gender': 'F', 'owner': 'b'},
+            {'id': 3, 'latitude': 30.1000, 'longitude': 31.3000, 'pet_type': 'cats', 'gender': 'F', 'owner': 'c'},
+            {'id': 4, 'latitude': 30.0450, 'longitude': 31.2360, 'pet_type': 'dogs', 'gender': 'F', 'owner': 'd'},
+            {'id': 5, 'latitude': 30.0450, 'longitude': 31.2360, 'pet_type': 'cats', 'gender': 'F', 'owner': 'a'},
+            {'id': 6, 'latitude': 31.2001, 'longitude': 29.9187, 'pet_type': 'cats', 'gender': 'F', 'owner': 'e'},
+            {'id': 7, 'latitude': None, 'longitude': 31.2, 'pet_type': 'cats', 'gender': 'F', 'owner': 'f'},
+        ]
+        self.matcher = NearbyPetMatcher(self.pets, max_distance_km=50)
+
+    def test_recommend_by_owner_filters_and_orders(self):
+        recommendations = self.matcher.recommend_by_owner(limit_per_user=5, owners=['a'])
+
+        self.assertEqual([pet['id'] for pet, _ in recommendations['a']], [2, 3])
+        distances = [distance for _, distance in recommendations['a']]
+        self.assertEqual(distances, sorted(distances))
+
+    def test_recommend_by_owner_respects_limit(self):
+        recommendations = self.matcher.recommend_by_owner(limit_per_user=1)
+
+        self.assertEqual([pet['id'] for pet, _ in recommendations['a']], [2])
+        self.assertTrue(all(len(matches) <= 1 for matches in recommendations.values()))
+
+    def test_nearest_within_radius(self):
+        results = self.matcher.nearest(30.0444, 31.2357, pet_type='cats', exclude_owner='a')
+
+        self.assertEqual([pet['id'] for pet, _ in results], [2, 3])
+
+
+class _StandInPetsApi(BaseHTTPRequestHandler):
+    """Minimal stand-in for the production pets API (paginated list + detail)."""
+    pets = [
+        {'id': index, 'latitude': 30.0, 'longitude': 31.0, 'updated_at': '2025-01-01T00:00:00Z'}
+        for index in range(1, 8)
+    ]
+    page_size = 3
+    requested = []
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        type(self).requested.append(parts.path)
+        segments = [segment for segment in parts.path.split('/') if segment]
+        if segments[-1].isdigit():
+            body = {'id': int(segments[-1]), 'owner_email': f'owner{segments[-1]}@example.com'}
+        else:
+            page = int(parse_qs(parts.query).get('page', ['1'])[0])
+            start = (page - 1) * self.page_size
+            has_next = start + self.page_size < len(self.pets)
+            host = self.headers['Host']
+            body = {
+                'count': len(self.pets),
+                'next': f'http://{host}{parts.path}?page={page + 1}' if has_next else None,
+                'results': self.pets[start:start + self.page_size],
+            }
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class PetsApiClientTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _StandInPetsApi)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        _StandInPetsApi.requested = []
+
+    def test_fetches_all_pages_and_caches_details(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            client = PetsApiClient(self.base_url, concurrency=4, cache_dir=cache_dir)
+            pets = client.fetch_pets('status=available')
+            emails = client.fetch_owner_emails(pets)
+
+            self.assertEqual(sorted(p['id'] for p in pets), list(range(1, 8)))
+            self.assertEqual(emails[5], 'owner5@example.com')
+            self.assertEqual(client.stats['pages'], 3)
+            self.assertEqual(client.stats['details'], 7)
+
+            second = PetsApiClient(self.base_url, concurrency=4, cache_dir=cache_dir)
+            self.assertEqual(second.fetch_owner_emails(pets), emails)
+            self.assertEqual(second.stats['details'], 0)
+            self.assertEqual(second.stats['detail_cache_hits'], 7)
+
+
+class _StandInS3(BaseHTTPRequestHandler):
+    """Minimal S3-compatible stand-in: paginated ListObjectsV2, PutObject and HeadObject on one bucket."""
+    protocol_version = 'HTTP/1.1'
+    objects = {}
+    page_size = 2
+    requests_seen = []
+
+    def _reply(self, status, body=b'', headers=None):
+        self.send_response(status)
+        headers = dict(headers or {})
+        headers.setdefault('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _key(self):
+        return unquote(urlsplit(self.path).path).split('/', 2)[2]
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        type(self).requests_seen.append(('LIST', query.get('continuation-token', [''])[0]))
+        prefix = query.get('prefix', [''])[0]
+        keys = sorted(key for key in self.objects if key.startswith(prefix))
+        start = int(query.get('continuation-token', ['0'])[0])
+        page = keys[start:start + self.page_size]
+        truncated = start + self.page_size < len(keys)
+        contents = ''.join(
+            f'<Contents><Key>{escape(key)}</Key><Size>{len(self.objects[key])}</Size>'
+            f'<ETag>&quot;{hashlib.md5(self.objects[key]).hexdigest()}&quot;</ETag></Contents>'
+            for key in page
+        )
+        token = f'<NextContinuationToken>{start + self.page_size}</NextContinuationToken>' if truncated else ''
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+            f'<Name>media</Name><Prefix>{escape(prefix)}</Prefix><KeyCount>{len(page)}</KeyCount>'
+            f'<IsTruncated>{"true" if truncated else "false"}</IsTruncated>{token}{contents}</ListBucketResult>'
+        ).encode()
+        self._reply(200, body, {'Content-Type': 'application/xml'})
+
+    def do_PUT(self):
+        key = self._key()
+        type(self).requests_seen.append(('PUT', key))
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.objects[key] = body
+        self._reply(200, headers={'ETag': f'"{hashlib.md5(body).hexdigest()}"'})
+
+    def do_HEAD(self):
+        key = self._key()
+        type(self).requests_seen.append(('HEAD', key))
+        if key not in self.objects:
+            self._reply(404)
+        else:
+            self._reply(200, headers={'Content-Length': str(len(self.objects[key]))})
+
+    def log_message(self, *args):
+        pass
+
+
+class SyncMediaToBucketTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _StandInS3)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.env = {
+            'HETZNER_S3_ENDPOINT_URL': f'http://127.0.0.1:{cls.server.server_address[1]}',
+            'HETZNER_S3_REGION': 'us-east-1',
+            'HETZNER_S3_ACCESS_KEY': 'test',
+            'HETZNER_S3_SECRET_KEY': 'test',
+            'HETZNER_MEDIA_BUCKET': 'media',
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def test_inventory_diff_uploads_only_changed_files(self):
+        _StandInS3.objects = {
+            'pets/same.jpg': b'same-bytes',
+            'pets/changed.jpg': b'old-bytes!',
+            'pets/orphan.jpg': b'remote only',
+        }
+        _StandInS3.requests_seen = []
+        with tempfile.TemporaryDirectory() as media_root:
+            (Path(media_root) / 'pets').mkdir()
+            (Path(media_root) / 'pets' / 'same.jpg').write_bytes(b'same-bytes')
+            (Path(media_root) / 'pets' / 'changed.jpg').write_bytes(b'new-bytes!')
+            (Path(media_root) / 'pets' / 'new.jpg').write_bytes(b'brand new')
+
+            with override_settings(MEDIA_ROOT=media_root), mock.patch.dict(os.environ, self.env):
+                call_command('sync_media_to_bucket', '--inventory', '--workers', '2', stdout=mock.MagicMock())
+
+        puts = sorted(key for method, key in _StandInS3.requests_seen if method == 'PUT')
+        self.assertEqual(puts, ['pets/changed.jpg', 'pets/new.jpg'])
+        self.assertEqual([m for m, _ in _StandInS3.requests_seen].count('LIST'), 2)
+        self.assertNotIn('HEAD', [m for m, _ in _StandInS3.requests_seen])
+        self.assertEqual(_StandInS3.objects['pets/changed.jpg'], b'new-bytes!')
+
+    def _puts(self):
+        return sorted(key for method, key in _StandInS3.requests_seen if method == 'PUT')
+
+    def test_manifest_skips_unchanged_files_without_requests(self):
+        _StandInS3.objects = {}
+        with tempfile.TemporaryDirectory() as media_root, tempfile.TemporaryDirectory() as state_dir:
+            (Path(media_root) / 'pets').mkdir()
+            (Path(media_root) / 'pets' / 'a.jpg').write_bytes(b'aaa')
+            (Path(media_root) / 'pets' / 'b.jpg').write_bytes(b'bbb')
+            manifest = os.path.join(state_dir, 'manifest.sqlite3')
+
+            with override_settings(MEDIA_ROOT=media_root), mock.patch.dict(os.environ, self.env):
+                _StandInS3.requests_seen = []
+                call_command('sync_media_to_bucket', '--manifest', manifest, stdout=mock.MagicMock())
+                self.assertEqual(self._puts(), ['pets/a.jpg', 'pets/b.jpg'])
+
+                _StandInS3.requests_seen = []
+                call_command('sync_media_to_bucket', '--manifest', manifest, stdout=mock.MagicMock())
+                self.assertEqual(_StandInS3.requests_seen, [])
+
+                (Path(media_root) / 'pets' / 'b.jpg').write_bytes(b'bbbb')
+                call_command('sync_media_to_bucket', '--manifest', manifest, stdout=mock.MagicMock())
+                self.assertEqual(self._puts(), ['pets/b.jpg'])
+
+    def test_watch_uploads_files_landing_in_watched_dirs(self):
+        _StandInS3.objects = {}
+        _StandInS3.requests_seen = []
+        with tempfile.TemporaryDirectory() as media_root, tempfile.TemporaryDirectory() as state_dir:
+            for directory in ('chat_images', 'profiles'):
+                (Path(media_root) / directory).mkdir()
+
+            def land_files(_seconds):
+                for relative in ('chat_images/new.jpg', 'profiles/ignored.jpg'):
+                    path = Path(media_root) / relative
+                    path.write_bytes(b'image')
+                    os.utime(path, (time.time() - 60, time.time() - 60))
+
+            with override_settings(MEDIA_ROOT=media_root), mock.patch.dict(os.environ, self.env), \
+                    mock.patch('pets.management.commands.sync_media_to_bucket.time.sleep', side_effect=land_files):
+                call_command(
+                    'sync_media_to_bucket', '--manifest', os.path.join(state_dir, 'manifest.sqlite3'),
+                    '--watch', '--watch-cycles', '1', stdout=mock.MagicMock(),
+                )
+
+        self.assertEqual(self._puts(), ['chat_images/new.jpg'])
+
+
+class ImageDerivativeTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        post_save.disconnect(receiver=claim_invites_when_user_updates, sender=User)
+
+    @classmethod
+    def tearDownClass(cls):
+        post_save.connect(receiver=claim_invites_when_user_updates, sender=User)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _jpeg(self, width=2400, height=1600):
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, height), (200, 120, 40)).save(buffer, 'JPEG')
+        return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_generate_derivatives_resizes_next_to_original(self):
+        name = default_storage.save('pets/main/photo.jpg', self._jpeg())
+
+        derivatives = generate_derivatives(name)
+
+        self.assertEqual(derivatives['thumb'], derivative_name(name, 'thumb'))
+        for size, edge in (('thumb', 200), ('card', 600), ('full', 1600)):
+            with default_storage.open(derivatives[size]) as handle, Image.open(handle) as image:
+                self.assertEqual(max(image.size), edge)
+        self.assertLess(default_storage.size(derivatives['thumb']), default_storage.size(name))
+
+    def test_chat_image_upload_is_content_addressed_and_stripped(self):
+        exif = Image.Exif()
+        exif[0x0110] = 'Secret Phone'
+        buffer = io.BytesIO()
+        Image.new('RGB', (3000, 1000), (10, 20, 30)).save(buffer, 'JPEG', exif=exif)
+        payload = buffer.getvalue()
+
+        urls = []
+        for _ in range(2):
+            upload = SimpleUploadedFile('forwarded.jpg', payload, content_type='image/jpeg')
+            response = self.client.post('/api/pets/chat/upload-image/', {'image': upload})
+            self.assertEqual(response.status_code, 200)
+            urls.append(response.json()['image_url'])
+
+        self.assertEqual(urls[0], urls[1])
+        name = urls[0][len('/media/'):]
+        digest = hashlib.sha256(payload).hexdigest()
+        self.assertEqual(name, f'chat_images/{digest[:2]}/{digest}.jpg')
+        _, files = default_storage.listdir(os.path.dirname(name))
+        self.assertEqual(len([f for f in files if '__' not in f]), 1)
+        with default_storage.open(name) as handle, Image.open(handle) as stored:
+            self.assertEqual(stored.size, (2048, 683))
+            self.assertEqual(len(stored.getexif()), 0)
+
+    def test_pet_upload_exposes_variants_in_list_serializer(self):
+        owner = User.objects.create_user(username='img-owner', email='img@example.com', password='x')
+        breed = Breed.objects.create(name='Image Breed', pet_type='dogs')
+        with self.captureOnCommitCallbacks(execute=True):
+            pet = Pet.objects.create(
+                owner=owner, name='Rex', pet_type='dogs', breed=breed, age_months=10, gender='M',
+                description='d', main_image=self._jpeg(), location='Cairo',
+            )
+
+        with mock.patch('patmatch_backend.storage.HashedMediaStorage.exists', side_effect=AssertionError):
+            variants = PetListSerializer(pet).data['main_image_variants']
+
+        self.assertEqual(variants['thumb'], default_storage.url(derivative_name(pet.main_image.name, 'thumb')))
+        self.assertEqual(variants['card'], default_storage.url(derivative_name(pet.main_image.name, 'card')))
+
+    def test_variants_fall_back_to_the_original_until_derivatives_are_recorded(self):
+        name = default_storage.save('pets/main/photo.jpg', self._jpeg(800, 600))
+
+        self.assertEqual(set(derivative_urls(name).values()), {default_storage.url(name)})
+        generate_derivatives(name)
+        self.assertEqual(derivative_urls(name)['thumb'], default_storage.url(derivative_name(name, 'thumb')))
+
+        # بعد فقد السجل، تشغيل الأمر يسجل المشتقات الموجودة دون إعادة إنشائها
+        cache.clear()
+        with mock.patch('pets.images.ContentFile') as content_file:
+            generate_derivatives(name)
+        content_file.assert_not_called()
+        self.assertEqual(derivative_urls(name)['card'], default_storage.url(derivative_name(name, 'card')))
+
+
+class UploadSessionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        post_save.disconnect(receiver=claim_invites_when_user_updates, sender=User)
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _StandInS3)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        endpoint = f'http://127.0.0.1:{cls.server.server_address[1]}'
+        cls.storage_settings = override_settings(
+            HETZNER_S3_ENDPOINT_URL=endpoint,
+            HETZNER_S3_REGION='us-east-1',
+            HETZNER_S3_ACCESS_KEY='test',
+            HETZNER_S3_SECRET_KEY='test',
+            HETZNER_MEDIA_BUCKET='media',
+            MEDIA_BUCKET_PUBLIC_URL='https://cdn.example.com',
+        )
+        cls.storage_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.storage_settings.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        post_save.connect(receiver=claim_invites_when_user_updates, sender=User)
+        super().tearDownClass()
+
+    def setUp(self):
+        _StandInS3.objects = {}
+        self.owner = User.objects.create_user(username='uploader', email='uploader@example.com', password='x')
+        breed = Breed.objects.create(name='Upload Breed', pet_type='cats')
+        self.pet = Pet.objects.create(
+            owner=self.owner, name='Mish', pet_type='cats', breed=breed, age_months=8, gender='F',
+            description='d', main_image='pets/main/old.jpg', location='Cairo',
+        )
+        self.api = APIClient()
+        self.api.force_authenticate(self.owner)
+
+    def test_presigned_upload_is_attached_on_complete(self):
+        payload = b'\xff\xd8\xff' + b'0' * 1024
+        response = self.api.post('/api/pets/uploads/', {
+            'purpose': 'pet_image', 'pet': self.pet.id, 'field': 'main_image',
+            'filename': 'photo.JPG', 'content_type': 'image/jpeg', 'size': len(payload),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        session = response.json()
+        self.assertTrue(session['key'].startswith('pets/main/') and session['key'].endswith('.jpg'))
+
+        complete_url = f"/api/pets/uploads/{session['id']}/complete/"
+        self.assertEqual(self.api.post(complete_url).status_code, 409)
+
+        put = requests.put(session['upload_url'], data=payload, headers=session['headers'], timeout=10)
+        self.assertEqual(put.status_code, 200)
+        self.assertEqual(_StandInS3.objects[session['key']], payload)
+
+        response = self.api.post(complete_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['url'], f"https://cdn.example.com/{session['key']}")
+        self.pet.refresh_from_db()
+        self.assertEqual(self.pet.main_image.name, f"https://cdn.example.com/{session['key']}")
+        self.assertEqual(UploadSession.objects.get().status, 'completed')
+
+    def test_certificate_upload_is_served_as_bucket_url(self):
+        payload = b'%PDF-1.4' + b'0' * 512
+        session = self.api.post('/api/pets/uploads/', {
+            'purpose': 'pet_certificate', 'pet': self.pet.id, 'field': 'disease_free_certificate',
+            'filename': 'cert.pdf', 'content_type': 'application/pdf', 'size': len(payload),
+        }, format='json').json()
+        requests.put(session['upload_url'], data=payload, headers=session['headers'], timeout=10)
+
+        bucket_url = 'https://patmatch-media.fsn1.your-objectstorage.com'
+        with override_settings(MEDIA_BUCKET_PUBLIC_URL=bucket_url):
+            self.assertEqual(self.api.post(f"/api/pets/uploads/{session['id']}/complete/").status_code, 200)
+
+        # أطول من max_length الافتراضي (100) الذي كان يرفضه PostgreSQL
+        url = f"{bucket_url}/{session['key']}"
+        self.assertGreater(len(url), 100)
+        self.assertLessEqual(len(url), Pet._meta.get_field('disease_free_certificate').max_length)
+        self.assertEqual(self.api.get(f'/api/pets/{self.pet.id}/').json()['disease_free_certificate'], url)
+
+    def test_rejects_pets_owned_by_someone_else(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='x')
+        self.api.force_authenticate(other)
+
+        response = self.api.post('/api/pets/uploads/', {
+            'purpose': 'pet_certificate', 'pet': self.pet.id, 'field': 'health_certificate',
+            'filename': 'cert.pdf', 'content_type': 'application/pdf', 'size': 1000,
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pet', response.json())
+
+
+@override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1024, UPLOAD_MAX_PART_SIZE=4096, UPLOAD_MAX_REQUEST_SIZE=6144)
+class StreamingUploadHandlerTests(TestCase):
+    def _upload(self, handler, size, chunk=512):
+        handler.new_file('image', 'a.jpg', 'image/jpeg', None)
+        for start in range(0, size, chunk):
+            handler.receive_data_chunk(b'x' * min(chunk, size - start), start)
+        return handler.file_complete(size)
+
+    def test_small_files_stay_in_memory_until_released(self):
+        used_before = memory_budget.used
+        uploaded = self._upload(StreamingUploadHandler(), 1000)
+
+        self.assertIsInstance(uploaded, InMemoryUploadedFile)
+        self.assertEqual(memory_budget.used, used_before + 1000)
+        del uploaded
+        self.assertEqual(memory_budget.used, used_before)
+
+    def test_large_files_and_exhausted_budget_spill_to_disk(self):
+        handler = StreamingUploadHandler()
+        self.assertIsInstance(self._upload(handler, 3000), TemporaryUploadedFile)
+
+        with mock.patch.object(memory_budget, 'limit', memory_budget.used):
+            spilled = self._upload(StreamingUploadHandler(), 500)
+        self.assertIsInstance(spilled, TemporaryUploadedFile)
+        self.assertEqual(spilled.read(), b'x' * 500)
+
+    def test_oversize_part_and_request_are_rejected_early(self):
+        with self.assertRaises(UploadTooLarge):
+            self._upload(StreamingUploadHandler(), 5000)
+
+        handler = StreamingUploadHandler()
+        self._upload(handler, 4000)
+        with self.assertRaises(UploadTooLarge):
+            self._upload(handler, 3000)
+
+    def test_oversize_chat_upload_returns_413(self):
+        upload = SimpleUploadedFile('big.jpg', b'x' * 5000, content_type='image/jpeg')
+
+        response = self.client.post('/api/pets/chat/upload-image/', {'image': upload})
+
+        self.assertEqual(response.status_code, 413)
+
+
+class HashedMediaStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        post_save.disconnect(receiver=claim_invites_when_user_updates, sender=User)
+
+    @classmethod
+    def tearDownClass(cls):
+        post_save.connect(receiver=claim_invites_when_user_updates, sender=User)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_names_follow_content_and_are_never_overwritten(self):
+        first = default_storage.save('pets/main/Rex.JPG', SimpleUploadedFile('Rex.JPG', b'one'))
+        again = default_storage.save('pets/main/Rex.JPG', SimpleUploadedFile('Rex.JPG', b'one'))
+        changed = default_storage.save('pets/main/Rex.JPG', SimpleUploadedFile('Rex.JPG', b'two'))
+
+        self.assertRegex(first, r'^pets/main/Rex\.[0-9a-f]{16}\.jpg$')
+        self.assertEqual(first, again)
+        self.assertNotEqual(first, changed)
+        with default_storage.open(first) as handle:
+            self.assertEqual(handle.read(), b'one')
+
+    def test_hashed_media_is_served_immutable(self):
+        name = default_storage.save('pets/main/Rex.jpg', SimpleUploadedFile('Rex.jpg', b'one'))
+
+        response = serve_media(RequestFactory().get(f'/media/{name}'), name, document_root=default_storage.location)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+    def test_derivatives_of_hashed_originals_are_not_immutable(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 600), (90, 60, 30)).save(buffer, 'JPEG')
+        name = default_storage.save('pets/main/rex.jpg', SimpleUploadedFile('rex.jpg', buffer.getvalue()))
+        thumb = generate_derivatives(name)['thumb']
+
+        # --overwrite يعيد كتابة المشتق بنفس الاسم
+        response = serve_media(RequestFactory().get(f'/media/{thumb}'), thumb, document_root=default_storage.location)
+
+        self.assertTrue(is_hashed_name(thumb))
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertNotIn('immutable', cache_control_for(thumb))
+
+    def test_derivatives_of_legacy_originals_keep_their_lookup_names(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 600), (90, 60, 30)).save(buffer, 'JPEG')
+        legacy_path = Path(default_storage.path('pets/main/rex.jpg'))
+        legacy_path.parent.mkdir(parents=True)
+        legacy_path.write_bytes(buffer.getvalue())
+
+        targets = generate_derivatives('pets/main/rex.jpg')
+
+        self.assertEqual(targets, {size: derivative_name('pets/main/rex.jpg', size) for size in targets})
+        variants = derivative_urls('pets/main/rex.jpg')
+        self.assertEqual(variants['thumb'], default_storage.url(derivative_name('pets/main/rex.jpg', 'thumb')))
+
+    def test_hash_media_names_moves_legacy_rows(self):
+        owner = User.objects.create_user(username='legacy', email='legacy@example.com', password='x')
+        breed = Breed.objects.create(name='Legacy Breed', pet_type='cats')
+        pet = Pet.objects.create(
+            owner=owner, name='Old', pet_type='cats', breed=breed, age_months=30, gender='M',
+            description='d', main_image='pets/main/legacy.jpg', location='Cairo',
+        )
+        legacy_path = Path(default_storage.path('pets/main/legacy.jpg'))
+        legacy_path.parent.mkdir(parents=True)
+        legacy_path.write_bytes(b'legacy-bytes')
+
+        call_command('hash_media_names', stdout=mock.MagicMock())
+
+        pet.refresh_from_db()
+        self.assertTrue(is_hashed_name(pet.main_image.name))
+        self.assertEqual(pet.main_image.read(), b'legacy-bytes')
+        self.assertTrue(legacy_path.exists())
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        post_save.disconnect(receiver=claim_invites_when_user_updates, sender=User)
+
+    @classmethod
+    def tearDownClass(cls):
+        post_save.connect(receiver=claim_invites_when_user_updates, sender=User)
+        super().tearDownClass()
+
+    def setUp(self):
+        owner = User.objects.create_user(username='feed', email='feed@example.com', password='x')
+        breed = Breed.objects.create(name='Feed Breed', pet_type='dogs')
+        self.pets = [
+            Pet.objects.create(
+                owner=owner, name=f'Dog {index}', pet_type='dogs', breed=breed, age_months=12,
+                gender='M', description='d', main_image='pets/main/dog.jpg', location='Cairo',
+                latitude=Decimal('30.0') + index, longitude=Decimal('31.0'),
+            )
+            for index in range(5)
+        ]
+        # تعادل في created_at لاختبار كسر التعادل بالمعرف
+        same_time = timezone.now()
+        Pet.objects.filter(id__in=[pet.id for pet in self.pets[1:4]]).update(created_at=same_time)
+
+    def _walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_cursor_pages_follow_created_at_then_id(self):
+        ids = self._walk('/api/pets/?cursor=&page_size=2')
+
+        expected = list(Pet.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_cursor_pages_follow_distance(self):
+        ids = self._walk('/api/pets/?cursor=&page_size=2&ordering=distance&lat=34.1&lng=31.0')
+
+        self.assertEqual(ids, [pet.id for pet in reversed(self.pets)])
+
+    def test_page_numbers_remain_default(self):
+        response = self.client.get('/api/pets/')
+
+        self.assertEqual(response.data['count'], 5)
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get('/api/pets/?cursor=not-a-cursor')
+
+        self.assertEqual(response.status_code, 404)
+
+
+class PetSearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        post_save.disconnect(receiver=claim_invites_when_user_updates, sender=User)
+
+    @classmethod
+    def tearDownClass(cls):
+        post_save.connect(receiver=claim_invites_when_user_updates, sender=User)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='search', email='search@example.com', password='x')
+        self.breed = Breed.objects.create(name='شيرازي', pet_type='cats')
+        self.cat = self._pet('قِطّة لولو', 'الإسكندرية', 'قطة هادئة جداً')
+        self.dog = self._pet('Max', 'القاهرة', 'كلب حراسة', status='available_for_adoption')
+
+    def _pet(self, name, location, description, status='available'):
+        return Pet.objects.create(
+            owner=self.owner, name=name, pet_type='cats', breed=self.breed, age_months=12,
+            gender='F', description=description, main_image='pets/main/p.jpg', location=location,
+            status=status,
+        )
+
+    def _ids(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        return [item['id'] for item in results]
+
+    def test_normalize_arabic(self):
+        self.assertEqual(normalize_arabic('أَحْمَد إسلام آمنة مصطفى'), 'احمد اسلام امنه مصطفي')
+
+    def test_search_ignores_spelling_variants_and_article(self):
+        self.assertEqual(self._ids('/api/pets/?q=اسكندريه'), [self.cat.id])
+        self.assertEqual(self._ids('/api/pets/?q=قطه لول'), [self.cat.id])
+        self.assertEqual(self._ids('/api/pets/?q=شيراز'), [self.cat.id])
+        self.assertEqual(self._ids('/api/pets/?q=غير موجود'), [])
+
+    def test_search_index_follows_updates_and_deletes(self):
+        self.cat.location = 'أسوان'
+        self.cat.save(update_fields=['location'])
+        self.assertEqual(self._ids('/api/pets/?q=اسوان'), [self.cat.id])
+
+        self.breed.name = 'Persian'
+        self.breed.save()
+        self.assertEqual(self._ids('/api/pets/?q=persian'), [self.cat.id])
+
+        self.cat.delete()
+        self.assertEqual(self._ids('/api/pets/?q=اسوان'), [])
+
+    def test_adoption_pets_search(self):
+        self.client.force_login(self.owner)
+        self.assertEqual(self._ids('/api/pets/adoption/pets/?q=max'), [self.dog.id])
+
+
+class PetFeedCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        post_save.disconnect(receiver=claim_invites_when_user_updates, sender=User)
+
+    @classmethod
+    def tearDownClass(cls):
+        post_save.connect(receiver=claim_invites_when_user_updates, sender=User)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user(username='cached', email='cached@example.com', password='x')
+        breed = Breed.objects.create(name='Cache Breed', pet_type='cats')
+        self.pet = Pet.objects.create(
+            owner=owner, name='Mishmish', pet_type='cats', breed=breed, age_months=12, gender='F',
+            description='d', main_image='pets/main/m.jpg', location='Cairo',
+            latitude=Decimal('30.05'), longitude=Decimal('31.25'),
+        )
+
+    def test_repeated_anonymous_feed_is_served_from_cache(self):
+        first = self.client.get('/api/pets/?pet_type=cats&lat=30.0441&lng=31.2357')
+
+        with self.assertNumQueries(0):
+            # نفس المعاملات بترتيب مختلف وإحداثيات في نفس الخلية
+            second = self.client.get('/api/pets/?lng=31.2399&pet_type=cats&user_lat=30.0449')
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+
+    def test_saving_a_pet_invalidates_cached_feed(self):
+        self.client.get('/api/pets/')
+
+        self.pet.name = 'Simsim'
+        self.pet.save()
+
+        response = self.client.get('/api/pets/')
+        self.assertEqual(response.data['results'][0]['name'], 'Simsim')
+
+    def test_cached_page_links_are_built_from_each_request(self):
+        Pet.objects.create(
+            owner=self.pet.owner, name='Lulu', pet_type='cats', breed=self.pet.breed, age_months=6, gender='F',
+            description='d', main_image='pets/main/l.jpg', location='Cairo',
+        )
+        self.client.get('/api/pets/?lat=30.0441&lng=31.2357&page_size=1', HTTP_HOST='first.example.com')
+
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/pets/?lat=30.0449&lng=31.2399&page_size=1', HTTP_HOST='second.example.com')
+
+        query = parse_qs(urlsplit(second.data['next']).query)
+        self.assertEqual(urlsplit(second.data['next']).netloc, 'second.example.com')
+        self.assertEqual((query['lat'], query['lng'], query['page']), (['30.0449'], ['31.2399'], ['2']))
+        self.assertIsNone(second.data['previous'])
+
+
+class PetMatchSuggestionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        post_save.disconnect(receiver=claim_invites_when_user_updates, sender=User)
+
+    @classmethod
+    def tearDownClass(cls):
+        post_save.connect(receiver=claim_invites_when_user_updates, sender=User)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.breed = Breed.objects.create(name='Husky', pet_type='dogs')
+        self.other_breed = Breed.objects.create(name='Pug', pet_type='dogs')
+        self.owner = User.objects.create_user(username='sugg', email='sugg@example.com', password='x')
+        self.pet = self._pet(self.owner, 'M', latitude='30.00')
+        other = User.objects.create_user(username='other', email='other@example.com', password='x')
+        self.near = self._pet(other, 'F', latitude='30.05')
+        self.far_in_range = self._pet(other, 'F', latitude='30.20')
+        self._pet(other, 'F', latitude='35.00')                    # خارج المسافة
+        self._pet(other, 'M', latitude='30.01')                    # نفس الجنس
+        self._pet(other, 'F', latitude='30.01', breed=self.other_breed)
+        self._pet(other, 'F', latitude='30.01', age_months=80)     # فرق عمر كبير
+        self._pet(other, 'F', latitude='30.01', status='mating')
+        self._pet(self.owner, 'F', latitude='30.01')               # نفس المالك
+
+    def _pet(self, owner, gender, latitude, breed=None, age_months=24, status='available'):
+        return Pet.objects.create(
+            owner=owner, name='P', pet_type='dogs', breed=breed or self.breed, age_months=age_months,
+            gender=gender, description='d', main_image='pets/main/p.jpg', location='Cairo',
+            latitude=Decimal(latitude), longitude=Decimal('31.00'), status=status,
+        )
+
+    def test_suggestions_are_compatible_partners_by_distance(self):
+        compute_all_suggestions()
+        self.client.force_login(self.owner)
+
+        with self.assertNumQueries(3):  # session + user + suggestions
+            response = self.client.get(f'/api/pets/{self.pet.id}/suggestions/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(item['rank'], item['partner']['id']) for item in response.data],
+            [(1, self.near.id), (2, self.far_in_range.id)],
+        )
+
+    def test_refresh_after_change_updates_affected_pets(self):
+        compute_all_suggestions()
+        self.near.status = 'mating'
+        self.near.save()
+
+        refresh_suggestions_for_pet(self.near.id)
+
+        self.assertEqual(
+            list(PetMatchSuggestion.objects.filter(pet=self.pet).values_list('partner_id', flat=True)),
+            [self.far_in_range.id],
+        )
+        self.assertFalse(PetMatchSuggestion.objects.filter(pet=self.near).exists())
+
+    def test_only_matching_changes_trigger_a_refresh(self):
+        with mock.patch('pets.signals.refresh_suggestions_on_commit') as refresh:
+            self.pet.description = 'updated'
+            self.pet.save()
+            refresh.assert_not_called()
+
+            self.pet.age_months = 30
+            self.pet.save()
+            refresh.assert_called_once_with(self.pet.id)
+
+    def test_deleting_a_partner_reranks_the_lists_it_was_in(self):
+        compute_all_suggestions()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.near.delete()
+
+        self.assertEqual(
+            list(PetMatchSuggestion.objects.filter(pet=self.pet).values_list('rank', 'partner_id')),
+            [(1, self.far_in_range.id)],
+        )
+
+    def test_other_users_pet_is_not_found(self):
+        self.client.force_login(self.owner)
+
+        response = self.client.get(f'/api/pets/{self.near.id}/suggestions/')
+
+        self.assertEqual(response.status_code, 404)
+
+
+class StatsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        post_save.disconnect(receiver=claim_invites_when_user_updates, sender=User)
+
+    @classmethod
+    def tearDownClass(cls):
+        post_save.connect(receiver=claim_invites_when_user_updates, sender=User)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='stats', email='stats@example.com', password='x')
+        self.adopter = User.objects.create_user(username='adopter', email='adopter@example.com', password='x')
+        breed = Breed.objects.create(name='Stats Breed', pet_type='cats')
+        self.pets = [
+            Pet.objects.create(
+                owner=self.owner, name=f'S{index}', pet_type='cats', breed=breed, age_months=12,
+                gender='F', description='d', main_image='pets/main/s.jpg', location='Cairo', status=status,
+            )
+            for index, status in enumerate(['available', 'available_for_adoption', 'adopted'])
+        ]
+
+    def _adoption_request(self):
+        return AdoptionRequest.objects.create(
+            adopter=self.adopter, pet=self.pets[1], adopter_name='A', adopter_email='a@example.com',
+            adopter_phone='1', adopter_age=30, adopter_occupation='x', adopter_address='x',
+        )
+
+    def test_home_stats_in_one_round_trip_and_cached(self):
+        self._adoption_request()
+        self.client.force_login(self.adopter)
+
+        response = self.client.get('/api/pets/stats/home/')
+        with self.assertNumQueries(2):  # session + user
+            cached = self.client.get('/api/pets/stats/home/')
+
+        self.assertEqual(cached.json(), response.json())
+        self.assertEqual(response.data['pets']['total_pets'], 3)
+        self.assertEqual(response.data['pets']['available_pets'], 1)
+        self.assertEqual(response.data['pets']['by_type'], {'cats': 3, 'dogs': 0})
+        self.assertEqual(response.data['adoption']['total_adopted'], 1)
+        self.assertEqual(response.data['adoption']['my_adoption_requests'], 1)
+        self.assertEqual(response.data['adoption']['my_pending_requests'], 1)
+
+    def test_changes_invalidate_cached_stats(self):
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get('/api/pets/adoption/stats/').data['received_requests'], 0)
+
+        self._adoption_request()
+        self.pets[0].status = 'adopted'
+        self.pets[0].save()
+
+        response = self.client.get('/api/pets/adoption/stats/')
+        self.assertEqual(response.data['received_requests'], 1)
+        self.assertEqual(response.data['total_adopted'], 2)
+        self.assertEqual(self.client.get('/api/pets/stats/').data['available_pets'], 0)
+
+
+class RequestInboxTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        post_save.disconnect(receiver=claim_invites_when_user_updates, sender=User)
+
+    @classmethod
+    def tearDownClass(cls):
+        post_save.connect(receiver=claim_invites_when_user_updates, sender=User)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='inbox', email='inbox@example.com', password='x')
+        other = User.objects.create_user(username='peer', email='peer@example.com', password='x')
+        breed = Breed.objects.create(name='Inbox Breed', pet_type='cats')
+
+        def pet(owner, gender, status='available'):
+            return Pet.objects.create(
+                owner=owner, name='I', pet_type='cats', breed=breed, age_months=12, gender=gender,
+                description='d', main_image='pets/main/i.jpg', location='Cairo', status=status,
+            )
+
+        mine, theirs = pet(self.user, 'M'), pet(other, 'F')
+        sent = BreedingRequest.objects.create(
+            target_pet=theirs, requester_pet=mine, requester=self.user, receiver=other, contact_phone='1',
+        )
+        received = BreedingRequest.objects.create(
+            target_pet=mine, requester_pet=theirs, requester=other, receiver=self.user, contact_phone='1',
+            status='approved',
+        )
+        adoption_sent = AdoptionRequest.objects.create(
+            adopter=self.user, pet=pet(other, 'F', 'available_for_adoption'), adopter_name='A',
+            adopter_email='a@example.com', adopter_phone='1', adopter_age=30, adopter_occupation='x',
+            adopter_address='x',
+        )
+        adoption_received = AdoptionRequest.objects.create(
+            adopter=other, pet=pet(self.user, 'F', 'available_for_adoption'), adopter_name='B',
+            adopter_email='b@example.com', adopter_phone='1', adopter_age=30, adopter_occupation='x',
+            adopter_address='x',
+        )
+        # نفس الوقت لطلبين من جدولين مختلفين لاختبار كسر التعادل
+        same_time = timezone.now()
+        BreedingRequest.objects.filter(pk=received.pk).update(created_at=same_time)
+        AdoptionRequest.objects.filter(pk=adoption_sent.pk).update(created_at=same_time)
+        self.expected = [
+            ('breeding', 'received', received.id),
+            ('adoption', 'sent', adoption_sent.id),
+            ('adoption', 'received', adoption_received.id),
+            ('breeding', 'sent', sent.id),
+        ]
+        BreedingRequest.objects.filter(pk=sent.pk).update(created_at=same_time - timedelta(hours=2))
+        AdoptionRequest.objects.filter(pk=adoption_received.pk).update(created_at=same_time - timedelta(hours=1))
+        self.client.force_login(self.user)
+
+    def test_pages_merge_both_kinds_and_directions(self):
+        seen = []
+        url = '/api/pets/inbox/?page_size=3'
+        first = self.client.get(url)
+        self.assertEqual(first.data['counts']['breeding']['received']['approved'], 1)
+        self.assertEqual(first.data['counts']['adoption']['sent'], {
+            'pending': 1, 'approved': 0, 'rejected': 0, 'completed': 0, 'total': 1,
+        })
+        response = first
+        while True:
+            seen.extend((item['kind'], item['direction'], item['id']) for item in response.data['results'])
+            if not response.data['next']:
+                break
+            with self.assertNumQueries(4):  # session + user + one query per table
+                response = self.client.get(response.data['next'])
+            self.assertNotIn('counts', response.data)
+
+        self.assertEqual(seen, self.expected)
+
+    def test_filters(self):
+        response = self.client.get('/api/pets/inbox/?kind=adoption&direction=received')
+
+        self.assertEqual([item['id'] for item in response.data['results']], [self.expected[2][2]])
+        self.assertEqual(self.client.get('/api/pets/inbox/?kind=bogus').status_code, 400)
+
+
+class NotificationSyncTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        post_save.disconnect(receiver=claim_invites_when_user_updates, sender=User)
+
+    @classmethod
+    def tearDownClass(cls):
+        post_save.connect(receiver=claim_invites_when_user_updates, sender=User)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='sync', email='sync@example.com', password='x')
+        self.old = self._notify('old')
+        self.client.force_login(self.user)
+
+    def _notify(self, title):
+        return Notification.objects.create(user=self.user, type='system_message', title=title, message='m')
+
+    def test_delta_contains_only_new_and_read_notifications(self):
+        since = self.client.get('/api/pets/notifications/sync/').data['since']
+
+        with self.assertNumQueries(5):  # session + user + delta + read markers + unread count
+            empty = self.client.get('/api/pets/notifications/sync/', {'since': since})
+        self.assertEqual(empty.data['notifications'], [])
+        self.assertEqual(empty.data['since'], since)
+
+        new = self._notify('new')
+        self.old.mark_as_read()
+
+        response = self.client.get('/api/pets/notifications/sync/', {'since': since})
+        self.assertEqual([item['id'] for item in response.data['notifications']], [new.id, self.old.id])
+        self.assertEqual(response.data['unread_count'], 1)
+
+        # تعيين الكل كمقروء لا يعدّل الإشعارات، بل يظهر في read_through
+        self.client.post('/api/pets/notifications/mark-all-read/')
+        response = self.client.get('/api/pets/notifications/sync/', {'since': response.data['since']})
+        self.assertEqual(response.data['notifications'], [])
+        self.assertIsNotNone(response.data['read_through'])
+        self.assertEqual(response.data['unread_count'], 0)
+
+
+class NotificationReadMarkerTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        post_save.disconnect(receiver=claim_invites_when_user_updates, sender=User)
+
+    @classmethod
+    def tearDownClass(cls):
+        post_save.connect(receiver=claim_invites_when_user_updates, sender=User)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='marker', email='marker@example.com', password='x')
+        self.chat = ChatRoom.objects.create(firebase_chat_id='marker-chat')
+        self.client.force_login(self.user)
+
+    def _notify(self, notification_type='system_message', chat_room=None):
+        return Notification.objects.create(
+            user=self.user, type=notification_type, title='t', message='m', related_chat_room=chat_room
+        )
+
+    def _unread_count(self):
+        return self.client.get('/api/pets/notifications/unread-count/').data['unread_count']
+
+    def test_mark_all_read_writes_only_the_marker(self):
+        notifications = [self._notify() for _ in range(5)]
+
+        response = self.client.post('/api/pets/notifications/mark-all-read/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Notification.objects.filter(user=self.user, is_read=False).count(), len(notifications))
+        self.assertEqual(NotificationReadMarker.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(self._unread_count(), 0)
+
+        later = self._notify()
+        Notification.objects.filter(pk=later.pk).update(created_at=timezone.now() + timedelta(seconds=1))
+        self.assertEqual(self._unread_count(), 1)
+        items = {item['id']: item for item in self.client.get('/api/pets/notifications/').data['results']}
+        self.assertTrue(items[notifications[0].id]['is_read'])
+        self.assertIsNotNone(items[notifications[0].id]['read_at'])
+        self.assertFalse(items[later.id]['is_read'])
+
+    def test_chat_marker_covers_only_that_chat(self):
+        other_chat = ChatRoom.objects.create(firebase_chat_id='marker-other')
+        self._notify('chat_message_received', self.chat)
+        self._notify('chat_message_received', other_chat)
+        self._notify('system_message', self.chat)
+
+        mark_chat_read(self.user, self.chat)
+
+        state = ReadState(self.user)
+        self.assertEqual(
+            list(state.unread().values_list('type', 'related_chat_room_id').order_by('id')),
+            [('chat_message_received', other_chat.id), ('system_message', self.chat.id)],
+        )
+        self.assertEqual(self._unread_count(), 2)
+
+        mark_all_read(self.user)
+        self.assertEqual(list(NotificationReadMarker.objects.filter(user=self.user).values_list('chat_room', flat=True)), [None])
+        self.assertEqual(self._unread_count(), 0)
+
+
+class NotificationRetentionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        post_save.disconnect(receiver=claim_invites_when_user_updates, sender=User)
+
+    @classmethod
+    def tearDownClass(cls):
+        post_save.connect(receiver=claim_invites_when_user_updates, sender=User)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='retention', email='retention@example.com', password='x')
+
+    def _notify(self, notification_type, days_ago):
+        notification = Notification.objects.create(
+            user=self.user, type=notification_type, title=notification_type, message='m'
+        )
+        Notification.objects.filter(pk=notification.pk).update(
+            created_at=timezone.now() - timedelta(days=days_ago)
+        )
+        return notification
+
+    def test_purge_applies_retention_per_type_in_batches(self):
+        expired = [self._notify('pet_nearby', 20) for _ in range(3)] + [self._notify('favorite_added', 400)]
+        kept = [
+            self._notify('pet_nearby', 1),
+            self._notify('chat_message_received', 20),
+            self._notify('clinic_broadcast', 1000),
+            self._notify('breeding_request_approved', 200),
+        ]
+        archive = io.StringIO()
+
+        deleted = purge_notifications(batch_size=2, archive=archive)
+
+        self.assertEqual(deleted, len(expired))
+        self.assertEqual(
+            set(Notification.objects.values_list('id', flat=True)), {item.id for item in kept}
+        )
+        archived = [json.loads(line) for line in archive.getvalue().splitlines()]
+        self.assertEqual([row['id'] for row in archived], [item.id for item in expired])
+        self.assertEqual(purge_notifications(batch_size=2), 0)
+
+
+class NotificationStreamTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        post_save.disconnect(receiver=claim_invites_when_user_updates, sender=User)
+
+    @classmethod
+    def tearDownClass(cls):
+        post_save.connect(receiver=claim_invites_when_user_updates, sender=User)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='stream', email='stream@example.com', password='x')
+        self.client.force_login(self.user)
+
+    def _event(self, chunks):
+        event, data = next(chunks).decode().strip().split('\n')[-2:]
+        return event.split(': ', 1)[1], json.loads(data.split(': ', 1)[1])
+
+    def test_stream_pushes_notifications_and_badges(self):
+        response = self.client.get('/api/pets/notifications/stream/', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = iter(response.streaming_content)
+        self.assertEqual(self._event(chunks), ('badge', {'unread_count': 0, 'unread_messages_count': 0}))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(user=self.user, type='system_message', title='مرحبا', message='m')
+        event, data = self._event(chunks)
+        self.assertEqual((event, data['title'], data['unread_count']), ('notification', 'مرحبا', 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/pets/notifications/mark-all-read/')
+        self.assertEqual(self._event(chunks), ('badge', {'unread_count': 0, 'unread_messages_count': 0}))
+
+        response.close()
+        self.assertEqual(get_broker().subscribed([channel_name(self.user.pk)]), set())
+
+    def test_anonymous_stream_is_rejected_as_event(self):
+        self.client.logout()
+        response = self.client.get('/api/pets/notifications/stream/', HTTP_ACCEPT='text/event-stream')
+        self.assertIn(response.status_code, (401, 403))
+        self.assertTrue(response.content.startswith(b'event: error'))
+
+
+class ChatMessageCoalescingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        post_save.disconnect(receiver=claim_invites_when_user_updates, sender=User)
+
+    @classmethod
+    def tearDownClass(cls):
+        post_save.connect(receiver=claim_invites_when_user_updates, sender=User)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.sender = User.objects.create_user(
+            username='chat-sender', email='chat-sender@example.com', password='x', first_name='سارة'
+        )
+        self.recipient = User.objects.create_user(username='chat-recipient', email='chat-recipient@example.com', password='x')
+        self.chat = ChatRoom.objects.create(firebase_chat_id='coalesce-chat')
+
+    def _send(self, text):
+        return Notification.create_chat_message_notification(self.recipient, self.sender, self.chat, text)
+
+    @mock.patch('pets.chat_push._send_push_notification')
+    def test_messages_update_one_unread_notification_and_debounce_push(self, send_push):
+        for text in ('أهلاً', 'كيف الحال؟', 'متى نلتقي؟'):
+            notification = self._send(text)
+
+        rows = Notification.objects.filter(user=self.recipient, related_chat_room=self.chat)
+        self.assertEqual(rows.count(), 1)
+        notification.refresh_from_db()
+        self.assertEqual(notification.extra_data['message_count'], 3)
+        self.assertEqual(notification.message, 'متى نلتقي؟')
+        self.assertTrue(notification.title.startswith('3 '))
+        send_push.assert_called_once()
+        self.assertEqual(send_push.call_args.kwargs['collapse_key'], f'chat-{self.chat.pk}')
+
+        # نهاية النافذة: push واحد بالحالة الأخيرة بدلاً من "رسالة جديدة" القديمة
+        self.assertEqual(flush_pending_chat_pushes(now=timezone.now()), 0)
+        self.assertEqual(flush_pending_chat_pushes(now=timezone.now() + timedelta(minutes=5)), 1)
+        self.assertEqual(send_push.call_count, 2)
+        self.assertTrue(send_push.call_args.args[1].startswith('3 '))
+        self.assertEqual(send_push.call_args.args[3]['message_count'], '3')
+        self.assertFalse(PendingChatPush.objects.exists())
+
+        mark_chat_read(self.recipient, self.chat)
+        self._send('ما زلت هنا')
+
+        self.assertEqual(rows.count(), 2)
+        self.assertEqual(send_push.call_count, 3)
+
+    @mock.patch('pets.chat_push._send_push_notification')
+    def test_pending_push_is_dropped_once_the_chat_is_read(self, send_push):
+        self._send('أهلاً')
+        self._send('كيف الحال؟')
+        mark_chat_read(self.recipient, self.chat)
+
+        self.assertEqual(flush_pending_chat_pushes(now=timezone.now() + timedelta(minutes=5)), 0)
+        send_push.assert_called_once()
+
+    @mock.patch('pets.chat_push._send_push_notification')
+    def test_pending_push_of_a_deleted_notification_is_cleaned_up(self, send_push):
+        self._send('أهلاً')
+        self._send('كيف الحال؟').delete()
+
+        self.assertEqual(flush_pending_chat_pushes(now=timezone.now() + timedelta(minutes=5)), 0)
+        self.assertFalse(PendingChatPush.objects.exists())
+
+    @mock.patch('pets.chat_push._send_push_notification')
+    def test_unread_counts_are_messages_not_conversations(self, send_push):
+        for text in ('أهلاً', 'كيف الحال؟', 'متى نلتقي؟'):
+            self._send(text)
+        Notification.create_chat_message_notification(
+            self.recipient, self.sender, ChatRoom.objects.create(firebase_chat_id='coalesce-other'), 'مرحباً'
+        )
+
+        self.assertEqual(badge_counts(self.recipient)['unread_messages_count'], 4)
+        client = APIClient()
+        client.force_authenticate(self.recipient)
+        response = client.get('/api/pets/chat/user-status/')
+        self.assertEqual(response.data['unread_messages_count'], 4)
+
+    def test_no_model_points_a_foreign_key_at_the_partitioned_notification_table(self):
+        related = [
+            f'{model.__name__}.{field.name}'
+            for model in apps.get_models()
+            for field in model._meta.get_fields()
+            if field.concrete and field.is_relation and field.related_model is Notification
+        ]
+        self.assertEqual(related, [])
+
+
+@override_settings(PUSH_RATE_BURST=2, PUSH_RATE_PER_HOUR=60, PUSH_QUIET_HOURS_START=0, PUSH_QUIET_HOURS_END=0)
+class PushPolicyTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        post_save.disconnect(receiver=claim_invites_when_user_updates, sender=User)
+
+    @classmethod
+    def tearDownClass(cls):
+        post_save.connect(receiver=claim_invites_when_user_updates, sender=User)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='push-policy', email='push-policy@example.com', password='x', fcm_token='token'
+        )
+
+    def test_token_bucket_refills_over_time(self):
+        self.assertEqual([push_policy.take_token(self.user.pk, now=1000) for _ in range(3)], [True, True, False])
+        self.assertEqual([push_policy.take_token(self.user.pk, now=1060) for _ in range(2)], [True, False])
+
+    @override_settings(PUSH_QUIET_HOURS_START=23, PUSH_QUIET_HOURS_END=7)
+    def test_quiet_hours_wrap_midnight(self):
+        local = timezone.get_current_timezone()
+        at = lambda hour: timezone.make_aware(timezone.datetime(2026, 10, 19, hour, 30), local)
+        self.assertEqual([push_policy.in_quiet_hours(at(hour)) for hour in (22, 23, 3, 7)], [False, True, True, False])
+
+    @mock.patch.object(firebase_service, 'send_notification', return_value=True)
+    @mock.patch.object(firebase_service, 'is_initialized', True)
+    def test_excess_pushes_roll_into_one_digest(self, send_notification):
+        results = [
+            _send_push_notification(self.user, f'حيوان {index}', 'm', {'type': 'pet_nearby'})
+            for index in range(4)
+        ]
+        _send_push_notification(self.user, 'رسالة', 'm', {'type': 'chat_message_received'})
+
+        self.assertEqual(results, [True, True, False, False])
+        self.assertEqual(send_notification.call_count, 3)
+        self.assertEqual(DeferredPush.objects.filter(user=self.user).count(), 2)
+
+        self.assertEqual(push_policy.send_digests(), 1)
+        digest = send_notification.call_args.kwargs
+        self.assertEqual(digest['title'], 'لديك 2 إشعارات جديدة')
+        self.assertEqual(digest['body'], 'حيوان 2 • حيوان 3')
+        self.assertFalse(DeferredPush.objects.exists())
+
+
+@override_settings(NEARBY_ALERT_TOPICS=True)
+@mock.patch.object(firebase_service, 'is_initialized', True)
+class PushTopicTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        post_save.disconnect(receiver=claim_invites_when_user_updates, sender=User)
+
+    @classmethod
+    def tearDownClass(cls):
+        post_save.connect(receiver=claim_invites_when_user_updates, sender=User)
+        super().tearDownClass()
+
+    def _create_user(self, username, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return User.objects.create_user(
+                username=username, email=f'{username}@example.com', password='x', **fields
+            )
+
+    @mock.patch.object(firebase_service, 'unsubscribe_from_topic', return_value=True)
+    @mock.patch.object(firebase_service, 'subscribe_to_topic', return_value=True)
+    def test_subscriptions_follow_location_and_preferences(self, subscribe, unsubscribe):
+        user = self._create_user(
+            'topics', fcm_token='token-1', latitude=Decimal('30.05'), longitude=Decimal('31.25')
+        )
+        cell = area_cell(Decimal('30.05'), Decimal('31.25'))
+        self.assertEqual(
+            [call.args for call in subscribe.call_args_list],
+            [(['token-1'], f'area_{cell}_breeding'), (['token-1'], f'area_{cell}_adoption')],
+        )
+
+        user.notify_adoption_pets = False
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save(update_fields=['notify_adoption_pets'])
+        unsubscribe.assert_called_once_with(['token-1'], f'area_{cell}_adoption')
+        self.assertEqual(PushTopicSubscription.objects.get(user=user).topics, [f'area_{cell}_breeding'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save(update_fields=['last_login'])
+        self.assertEqual((subscribe.call_count, unsubscribe.call_count), (2, 1))
+
+    @mock.patch.object(push_policy, 'in_quiet_hours', return_value=False)
+    @mock.patch.object(firebase_service, 'send_notification', return_value=True)
+    @mock.patch.object(firebase_service, 'send_topic_notification', return_value=True)
+    def test_new_pet_push_goes_to_area_topics_and_keeps_in_app_rows(self, send_topic, send_push, _quiet):
+        breed = Breed.objects.create(name='Topic', pet_type='cats')
+
+        def pet(owner, gender):
+            return Pet.objects.create(
+                owner=owner, name='Nearby', pet_type='cats', breed=breed, age_months=12, gender=gender,
+                description='d', main_image='pets/main/t.jpg', status='available', location='Cairo',
+                latitude=Decimal('30.05'), longitude=Decimal('31.25'),
+            )
+
+        neighbour = self._create_user('topic-neighbour', fcm_token='token-2')
+        pet(neighbour, 'M')
+        new_pet = pet(self._create_user('topic-owner'), 'F')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications = notify_new_pet_added(new_pet)
+
+        self.assertEqual([notification.user_id for notification in notifications], [neighbour.id])
+        self.assertTrue(Notification.objects.filter(user=neighbour, type='pet_nearby').exists())
+        send_push.assert_not_called()
+        topics = [call.args[0] for call in send_topic.call_args_list]
+        self.assertIn(f"area_{area_cell(new_pet.latitude, new_pet.longitude)}_breeding", topics)
+        self.assertTrue(all(topic.endswith('_breeding') for topic in topics))
+        self.assertEqual(send_topic.call_args.args[3]['owner_id'], str(new_pet.owner_id))
+
+
+class ChatContextCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        post_save.disconnect(receiver=claim_invites_when_user_updates, sender=User)
+
+    @classmethod
+    def tearDownClass(cls):
+        post_save.connect(receiver=claim_invites_when_user_updates, sender=User)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.requester = User.objects.create_user(username='ctx-req', email='ctx-req@example.com', password='x')
+        self.owner = User.objects.create_user(username='ctx-own', email='ctx-own@example.com', password='x')
+        breed = Breed.objects.create(name='Context', pet_type='cats')
+
+        def pet(owner, gender):
+            return Pet.objects.create(
+                owner=owner, name='Mishmish', pet_type='cats', breed=breed, age_months=12, gender=gender,
+                description='d', main_image='pets/main/c.jpg', location='Cairo', status='available',
+            )
+
+        self.pet = pet(self.owner, 'F')
+        breeding_request = BreedingRequest.objects.create(
+            target_pet=self.pet, requester_pet=pet(self.requester, 'M'), requester=self.requester,
+            receiver=self.owner, contact_phone='1',
+        )
+        self.chat = ChatRoom.objects.create(breeding_request=breeding_request)
+        self.url = f'/api/pets/chat/rooms/{self.chat.id}/context/'
+        self.api = APIClient()
+        self.api.force_authenticate(self.requester)
+
+    def test_context_is_served_from_cache_until_a_dependency_changes(self):
+        first = self.api.get(self.url).json()
+        self.assertEqual(first['chat_context']['pet']['name'], 'Mishmish')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.api.get(self.url).json(), first)
+
+        self.pet.name = 'Loz'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pet.save(update_fields=['name'])
+        self.assertEqual(self.api.get(self.url).json()['chat_context']['pet']['name'], 'Loz')
+
+        self.owner.first_name = 'Mona'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner.save()
+        participants = self.api.get(self.url).json()['chat_context']['participants']
+        self.assertEqual(participants[str(self.owner.id)]['name'], 'Mona')
+
+    def test_cached_context_still_checks_participants(self):
+        self.api.get(self.url)
+        outsider = User.objects.create_user(username='ctx-out', email='ctx-out@example.com', password='x')
+        self.api.force_authenticate(outsider)
+        self.assertEqual(self.api.get(self.url).status_code, 403)
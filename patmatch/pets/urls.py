@@ -11,6 +11,7 @@ urlpatterns = [
     path('', views.PetListCreateView.as_view(), name='pet-list-create'),
     path('<int:pk>/', views.PetDetailView.as_view(), name='pet-detail'),
     path('my/', views.MyPetsView.as_view(), name='my-pets'),
+    path('<int:pk>/suggestions/', views.pet_match_suggestions, name='pet-match-suggestions'),
     
     # العيادات البيطرية
     path('veterinary-clinics/', views.VeterinaryClinicListView.as_view(), name='veterinary-clinic-list'),
@@ -22,11 +23,16 @@ urlpatterns = [
     path('breeding-requests/my/', views.my_breeding_requests, name='my-breeding-requests'),
     path('breeding-requests/received/', views.received_breeding_requests, name='received-breeding-requests'),
     
+    # صندوق الطلبات الموحّد (مقابلة + تبني)
+    path('inbox/', views.request_inbox, name='request-inbox'),
+    
     # الإشعارات
     path('notifications/', views.NotificationListView.as_view(), name='notification-list'),
     path('notifications/<int:notification_id>/mark-read/', views.mark_notification_as_read, name='mark-notification-read'),
     path('notifications/mark-all-read/', views.mark_all_notifications_as_read, name='mark-all-notifications-read'),
     path('notifications/unread-count/', views.get_unread_notifications_count, name='unread-notifications-count'),
+    path('notifications/sync/', views.sync_notifications, name='sync-notifications'),
+    path('notifications/stream/', views.notification_stream, name='notification-stream'),
     path('notifications/mark-chat-read/', views.mark_chat_notifications_as_read, name='mark-chat-notifications-read'),
     path('notifications/chat-message/', views.send_chat_message_notification, name='send-chat-message-notification'),
     
@@ -37,6 +43,7 @@ urlpatterns = [
     
     # إحصائيات
     path('stats/', views.pet_stats, name='pet-stats'),
+    path('stats/home/', views.home_stats, name='home-stats'),
     
     # إدارة القطط (للمشرفين فقط)
     path('admin/cats/', views.cats_summary, name='cats-summary'),
@@ -58,6 +65,10 @@ urlpatterns = [
     path('chat/user-status/', views.user_chat_status, name='user-chat-status'),
     path('chat/upload-image/', views.upload_chat_image, name='upload-chat-image'),
     
+    # الرفع المباشر إلى التخزين
+    path('uploads/', views.create_upload_session, name='upload-session-create'),
+    path('uploads/<uuid:upload_id>/complete/', views.complete_upload_session, name='upload-session-complete'),
+    
     # Adoption URLs
     path('adoption/', views.AdoptionRequestListCreateView.as_view(), name='adoption-request-list-create'),
     path('adoption/<int:pk>/', views.AdoptionRequestDetailView.as_view(), name='adoption-request-detail'),
@@ -1,18 +1,27 @@
 from rest_framework import generics, status, filters
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, AllowAny, IsAdminUser
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
+from django.db.models import DateTimeField, Q
 from django.db import transaction
-from .models import Breed, Pet, BreedingRequest, Favorite, VeterinaryClinic, Notification, ChatRoom, AdoptionRequest
+from django.conf import settings
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from .models import Breed, Pet, BreedingRequest, Favorite, VeterinaryClinic, Notification, ChatRoom, AdoptionRequest, UploadSession, PetMatchSuggestion
 from .serializers import (
     BreedSerializer, PetSerializer, PetListSerializer, 
     BreedingRequestSerializer, FavoriteSerializer, VeterinaryClinicSerializer,
     NotificationSerializer, ChatRoomSerializer, ChatRoomListSerializer,
     ChatContextSerializer, ChatStatusSerializer, ChatCreationSerializer,
     AdoptionRequestSerializer, AdoptionRequestCreateSerializer, 
-    AdoptionRequestListSerializer, AdoptionRequestResponseSerializer
+    AdoptionRequestListSerializer, AdoptionRequestResponseSerializer,
+    UploadSessionCreateSerializer, UploadSessionSerializer, PetMatchSuggestionSerializer
 )
 from .notifications import (
     notify_breeding_request_received, notify_breeding_request_approved,
@@ -20,8 +29,38 @@ from .notifications import (
     notify_favorite_added, notify_adoption_request_received,
     notify_adoption_request_approved, notify_new_pet_added
 )
+from .images import derivative_urls, generate_derivatives, store_chat_image
+from . import object_storage
+from .pagination import INVALID_CURSOR_MESSAGE, KeysetPagination, decode_cursor, encode_cursor
+from .inbox import (
+    ADOPTION_REQUEST_RELATED,
+    BREEDING_REQUEST_RELATED,
+    DIRECTIONS,
+    KIND_RANKS,
+    cursor_values,
+    inbox_counts,
+    inbox_page,
+    parse_cursor,
+)
+from .search import search_pets
+from .chat_context import CHAT_ROOM_CONTEXT_RELATED, cached_chat_context, store_chat_context
+from .stats import adoption_stats_payload, pet_stats_payload
+from .retention import retention_cutoff
+from .read_state import ReadState, mark_all_read, mark_chat_read, unread_messages_sum
+from .realtime import EventStreamRenderer, channel_name, event_stream, get_broker, publish_badges_on_commit
+from .feed_cache import (
+    LATITUDE_PARAMS,
+    LONGITUDE_PARAMS,
+    feed_cache_key,
+    first_param,
+    is_cacheable,
+    restore_links,
+    snap_coordinate,
+    strip_links,
+)
 # إضافة imports للإشعارات الجديدة
 from accounts.firebase_service import firebase_service
+from patmatch_backend.upload_handlers import UploadTooLarge
 import logging
 import time
 from django.db import models
@@ -70,6 +109,7 @@ class PetListCreateView(generics.ListCreateAPIView):
     queryset = Pet.objects.all()
     serializer_class = PetListSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
     
     def get_permissions(self):
         """Allow read access without authentication, require auth for create"""
@@ -192,16 +232,7 @@ class PetListCreateView(generics.ListCreateAPIView):
         
         # مسافة الأقرب أولاً: إذا تم تمرير احداثيات المستخدم، رتب حسب الأقرب فقط عند الطلب
         try:
-            user_lat = self.request.query_params.get('user_lat') or \
-                       self.request.query_params.get('lat') or \
-                       self.request.query_params.get('user_latitude') or \
-                       self.request.query_params.get('latitude') or \
-                       self.request.query_params.get('current_lat')
-            user_lng = self.request.query_params.get('user_lng') or \
-                       self.request.query_params.get('lng') or \
-                       self.request.query_params.get('user_longitude') or \
-                       self.request.query_params.get('longitude') or \
-                       self.request.query_params.get('current_lng')
+            user_lat, user_lng = self._user_coordinates()
 
             if user_lat is not None and user_lng is not None:
                 try:
@@ -237,6 +268,13 @@ class PetListCreateView(generics.ListCreateAPIView):
             # لا تُفشل القائمة لأية أخطاء غير متوقعة في الحساب
             queryset = queryset.order_by('-created_at')
 
+        # البحث النصي: الأكثر صلة أولاً إلا إذا طُلب الترتيب حسب المسافة
+        search_query = (self.request.query_params.get('q') or '').strip()
+        if search_query:
+            queryset = search_pets(queryset, search_query)
+            if self.request.query_params.get('ordering') != 'distance':
+                queryset = queryset.order_by('-search_rank', '-created_at')
+
         return queryset
     
     def get_serializer_context(self):
@@ -244,15 +282,7 @@ class PetListCreateView(generics.ListCreateAPIView):
         context = super().get_serializer_context()
         
         # إضافة إحداثيات المستخدم من query parameters
-        user_lat = self.request.query_params.get('user_lat')
-        user_lng = self.request.query_params.get('user_lng')
-        
-        # محاولة الحصول من معاملات أخرى إذا لم تكن موجودة
-        if not user_lat:
-            user_lat = self.request.query_params.get('lat') or self.request.query_params.get('user_latitude') or self.request.query_params.get('latitude') or self.request.query_params.get('current_lat')
-        
-        if not user_lng:
-            user_lng = self.request.query_params.get('lng') or self.request.query_params.get('user_longitude') or self.request.query_params.get('longitude') or self.request.query_params.get('current_lng')
+        user_lat, user_lng = self._user_coordinates()
         
         if user_lat and user_lng:
             context['user_lat'] = user_lat
@@ -260,6 +290,28 @@ class PetListCreateView(generics.ListCreateAPIView):
         
         return context
 
+    def _user_coordinates(self):
+        """إحداثيات المستخدم من أي من أسماء المعاملات المدعومة، مقرّبة لخلية الكاش للزوار"""
+        params = self.request.query_params
+        user_lat = first_param(params, LATITUDE_PARAMS)
+        user_lng = first_param(params, LONGITUDE_PARAMS)
+        if user_lat and user_lng and is_cacheable(self.request):
+            # حتى تكون الاستجابة المخزنة صحيحة لكل من يقع في نفس الخلية
+            user_lat, user_lng = snap_coordinate(user_lat), snap_coordinate(user_lng)
+        return user_lat, user_lng
+
+    def list(self, request, *args, **kwargs):
+        cache_key = feed_cache_key(request) if is_cacheable(request) else None
+        if cache_key:
+            data = cache.get(cache_key)
+            if data is not None:
+                return Response(restore_links(request, data))
+
+        response = super().list(request, *args, **kwargs)
+        if cache_key and response.status_code == status.HTTP_200_OK:
+            cache.set(cache_key, strip_links(response.data), settings.PET_FEED_CACHE_SECONDS)
+        return response
+
 class PetDetailView(generics.RetrieveUpdateDestroyAPIView):
     """تفاصيل الحيوان"""
     queryset = Pet.objects.select_related('breed', 'owner').prefetch_related('additional_images')
@@ -310,9 +362,10 @@ class MyPetsView(generics.ListAPIView):
     """حيواناتي الأليفة"""
     serializer_class = PetListSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
-        return Pet.objects.filter(owner=self.request.user).select_related('breed')
+        return Pet.objects.filter(owner=self.request.user).select_related('breed').order_by('-created_at')
 
 class BreedingRequestListCreateView(generics.ListCreateAPIView):
     """قائمة طلبات التزاوج وإنشاء طلب جديد"""
@@ -386,9 +439,12 @@ class FavoriteListCreateView(generics.ListCreateAPIView):
     """قائمة المفضلات وإضافة للمفضلات"""
     serializer_class = FavoriteSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
-        return Favorite.objects.filter(user=self.request.user).select_related('pet__breed', 'pet__owner')
+        return Favorite.objects.filter(user=self.request.user).select_related(
+            'pet__breed', 'pet__owner'
+        ).order_by('-created_at')
 
 class FavoriteDetailView(generics.DestroyAPIView):
     """حذف من المفضلات"""
@@ -398,6 +454,23 @@ class FavoriteDetailView(generics.DestroyAPIView):
     def get_queryset(self):
         return Favorite.objects.filter(user=self.request.user)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def pet_match_suggestions(request, pk):
+    """شركاء التزاوج المقترحين لحيوان المستخدم (محسوبة مسبقاً)"""
+    suggestions = list(
+        PetMatchSuggestion.objects.filter(pet_id=pk, pet__owner=request.user)
+        .select_related('partner__breed', 'partner__owner')
+        .order_by('rank')
+    )
+    if not suggestions and not Pet.objects.filter(pk=pk, owner=request.user).exists():
+        return Response(
+            {'error': 'الحيوان غير موجود'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    serializer = PetMatchSuggestionSerializer(suggestions, many=True, context={'request': request})
+    return Response(serializer.data)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def toggle_favorite(request, pet_id):
@@ -424,21 +497,16 @@ def toggle_favorite(request, pet_id):
 @permission_classes([])
 def pet_stats(request):
     """إحصائيات الحيوانات"""
-    stats = {
-        'total_pets': Pet.objects.count(),
-        'available_pets': Pet.objects.filter(status='available').count(),
-        'breeding_requests': BreedingRequest.objects.count(),
-        'successful_matings': BreedingRequest.objects.filter(status='completed').count(),
-        'by_type': {}
-    }
-    
-    # إحصائيات حسب النوع
-    for choice in Pet.PET_TYPE_CHOICES:
-        pet_type = choice[0]
-        count = Pet.objects.filter(pet_type=pet_type).count()
-        stats['by_type'][pet_type] = count
-    
-    return Response(stats)
+    return Response(pet_stats_payload())
+
+@api_view(['GET'])
+@permission_classes([])
+def home_stats(request):
+    """كل إحصائيات الشاشة الرئيسية في طلب واحد (التبني للمستخدم المسجل فقط)"""
+    return Response({
+        'pets': pet_stats_payload(),
+        'adoption': adoption_stats_payload(request.user) if request.user.is_authenticated else None,
+    })
 
 # العيادات البيطرية
 class VeterinaryClinicListView(generics.ListAPIView):
@@ -490,7 +558,9 @@ class BreedingRequestDetailView(generics.RetrieveUpdateAPIView):
 def my_breeding_requests(request):
     """طلبات المقابلة المرسلة من المستخدم"""
     user = request.user
-    sent_requests = BreedingRequest.objects.filter(requester=user).order_by('-created_at')
+    sent_requests = BreedingRequest.objects.filter(requester=user).select_related(
+        *BREEDING_REQUEST_RELATED
+    ).order_by('-created_at')
     serializer = BreedingRequestSerializer(sent_requests, many=True)
     return Response(serializer.data)
 
@@ -499,10 +569,60 @@ def my_breeding_requests(request):
 def received_breeding_requests(request):
     """طلبات المقابلة الواردة للمستخدم"""
     user = request.user
-    received_requests = BreedingRequest.objects.filter(receiver=user).order_by('-created_at')
+    received_requests = BreedingRequest.objects.filter(receiver=user).select_related(
+        *BREEDING_REQUEST_RELATED
+    ).order_by('-created_at')
     serializer = BreedingRequestSerializer(received_requests, many=True)
     return Response(serializer.data)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def request_inbox(request):
+    """صندوق الطلبات الموحّد: طلبات المقابلة والتبني المرسلة والواردة بترقيم المؤشر"""
+    params = request.query_params
+    kind = params.get('kind') or None
+    direction = params.get('direction') or None
+    if kind and kind not in KIND_RANKS:
+        return Response({'error': 'نوع الطلب غير صحيح'}, status=status.HTTP_400_BAD_REQUEST)
+    if direction and direction not in DIRECTIONS:
+        return Response({'error': 'الاتجاه غير صحيح'}, status=status.HTTP_400_BAD_REQUEST)
+
+    cursor = parse_cursor(params.get('cursor'))
+    items, has_more = inbox_page(
+        request.user,
+        KeysetPagination().get_page_size(request),
+        cursor=cursor,
+        kinds=[kind] if kind else None,
+        direction=direction,
+        status=params.get('status') or None,
+    )
+
+    context = {'request': request}
+    results = []
+    for item_kind, item_direction, row in items:
+        serializer_class = BreedingRequestSerializer if item_kind == 'breeding' else AdoptionRequestListSerializer
+        results.append({
+            'kind': item_kind,
+            'direction': item_direction,
+            'id': row.id,
+            'status': row.status,
+            'created_at': row.created_at,
+            'request': serializer_class(row, context=context).data,
+        })
+
+    next_link = None
+    if has_more:
+        last_kind, _, last_row = items[-1]
+        next_link = replace_query_param(
+            request.build_absolute_uri(), 'cursor', encode_cursor(cursor_values(last_kind, last_row))
+        )
+
+    data = {'next': next_link, 'results': results}
+    if cursor is None:
+        # العدادات مع الصفحة الأولى فقط
+        data['counts'] = inbox_counts(request.user)
+    return Response(data)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def respond_to_breeding_request(request, request_id):
@@ -546,12 +666,18 @@ class NotificationListView(generics.ListAPIView):
     """قائمة إشعارات المستخدم"""
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         return Notification.objects.filter(user=self.request.user).select_related(
             'related_pet', 'related_breeding_request', 'related_chat_room'
         )
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['read_state'] = ReadState(self.request.user)
+        return context
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_notification_as_read(request, notification_id):
@@ -562,6 +688,7 @@ def mark_notification_as_read(request, notification_id):
             user=request.user
         )
         notification.mark_as_read()
+        publish_badges_on_commit([request.user])
         return Response({'message': 'تم تعيين الإشعار كمقروء'}, status=status.HTTP_200_OK)
     except Notification.DoesNotExist:
         return Response(
@@ -572,26 +699,85 @@ def mark_notification_as_read(request, notification_id):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_all_notifications_as_read(request):
-    """تعيين جميع الإشعارات كمقروءة"""
-    from django.utils import timezone
-    
-    updated_count = Notification.objects.filter(
-        user=request.user, 
-        is_read=False
-    ).update(is_read=True, read_at=timezone.now())
+    """تعيين جميع الإشعارات كمقروءة (تحديث علامة القراءة فقط، بدون تعديل الإشعارات)"""
+    updated_count = ReadState(request.user).unread().count()
+    mark_all_read(request.user)
+    publish_badges_on_commit([request.user])
     
     return Response({
         'message': f'تم تعيين {updated_count} إشعار كمقروء'
     }, status=status.HTTP_200_OK)
 
+# الحد الأقصى للتغييرات في استجابة مزامنة واحدة (has_more يعني أن هناك المزيد)
+NOTIFICATION_SYNC_LIMIT = 100
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync_notifications(request):
+    """
+    الإشعارات التي أُنشئت أو تغيّرت (قُرئت منفردة) بعد مؤشر since، مع عدد غير المقروءة
+    وعلامات القراءة الحالية (read_through) ليطبقها التطبيق على ما لديه.
+    بدون since يُعاد المؤشر الحالي فقط ليُستخدم بعد تحميل الصفحة الأولى من القائمة.
+    """
+    notifications = Notification.objects.filter(user=request.user)
+    since = request.query_params.get('since')
+    limit = NOTIFICATION_SYNC_LIMIT
+
+    if since:
+        updated_at, pk = decode_cursor(since, 2)
+        try:
+            updated_at = DateTimeField().to_python(updated_at)
+        except Exception:
+            raise NotFound(INVALID_CURSOR_MESSAGE)
+        changed = list(
+            notifications.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk))
+            .select_related('related_pet', 'related_breeding_request', 'related_chat_room')
+            .order_by('updated_at', 'id')[:limit + 1]
+        )
+        has_more = len(changed) > limit
+        changed = changed[:limit]
+        watermark = changed[-1] if changed else None
+        cursor = since
+    else:
+        changed, has_more = [], False
+        watermark = notifications.order_by('-updated_at', '-id').only('id', 'updated_at').first()
+        cursor = encode_cursor([timezone.now(), 0])
+
+    if watermark is not None:
+        cursor = encode_cursor([watermark.updated_at, watermark.id])
+
+    read_state = ReadState(request.user)
+    return Response({
+        'notifications': NotificationSerializer(
+            changed, many=True, context={'request': request, 'read_state': read_state}
+        ).data,
+        'unread_count': read_state.unread(notifications).count(),
+        **read_state.as_payload(),
+        'since': cursor,
+        'has_more': has_more,
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([EventStreamRenderer, JSONRenderer])
+def notification_stream(request):
+    """
+    بث أحداث الإشعارات الجديدة وعدادات الشارات (text/event-stream) بدلاً من استطلاع
+    notifications/unread-count و chat/user-status.
+    """
+    # الاشتراك قبل حساب العدادات الأولى حتى لا يضيع حدث بينهما
+    subscription = get_broker().subscribe(channel_name(request.user.pk))
+    response = StreamingHttpResponse(event_stream(request.user, subscription), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # تعطيل التخزين المؤقت في nginx حتى تصل الأحداث فوراً
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_unread_notifications_count(request):
     """عدد الإشعارات غير المقروءة"""
-    count = Notification.objects.filter(
-        user=request.user, 
-        is_read=False
-    ).count()
+    count = ReadState(request.user).unread().count()
     
     return Response({'unread_count': count}, status=status.HTTP_200_OK)
 
@@ -625,14 +811,12 @@ def mark_chat_notifications_as_read(request):
             status=status.HTTP_403_FORBIDDEN
         )
 
-    from django.utils import timezone
-
-    updated_count = Notification.objects.filter(
-        user=request.user,
-        is_read=False,
+    updated_count = ReadState(request.user).unread().filter(
         type='chat_message_received',
         related_chat_room=chat_room
-    ).update(is_read=True, read_at=timezone.now())
+    ).count()
+    mark_chat_read(request.user, chat_room)
+    publish_badges_on_commit([request.user])
 
     return Response({
         'message': f'تم تعيين {updated_count} إشعار كمقروء',
@@ -1050,12 +1234,15 @@ def user_chat_status(request):
         # إجمالي المحادثات
         total_chats = active_chats + archived_chats
         
-        # عدد الرسائل غير المقروءة (من إشعارات الرسائل)
-        unread_chat_messages = Notification.objects.filter(
-            user=user,
-            is_read=False,
+        # عدد الرسائل غير المقروءة (مجموع message_count في إشعارات الرسائل)
+        unread_chat_messages = ReadState(user).unread().filter(
             type='chat_message_received'
-        ).count()
+        )
+        # الإشعارات الأقدم من مدة الاحتفاظ ستُحذف، ولا داعي لقراءة أقسامها
+        chat_cutoff = retention_cutoff('chat_message_received')
+        if chat_cutoff is not None:
+            unread_chat_messages = unread_chat_messages.filter(created_at__gte=chat_cutoff)
+        unread_chat_messages = unread_chat_messages.aggregate(count=unread_messages_sum())['count']
         
         # طلبات التزاوج المقبولة بدون محادثة
         pending_chat_creation = BreedingRequest.objects.filter(
@@ -1122,24 +1309,22 @@ def archived_chat_rooms(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def chat_room_context(request, chat_id):
-    """الحصول على السياق الكامل لمحادثة محددة"""
+    """الحصول على السياق الكامل لمحادثة محددة (من الكاش بدون استعلامات إن كان صالحاً)"""
     try:
-        chat_room = ChatRoom.objects.select_related(
-            'breeding_request__requester',
-            'breeding_request__target_pet__owner',
-            'breeding_request__target_pet'
-        ).get(id=chat_id)
+        entry = cached_chat_context(chat_id)
+        if entry is None:
+            chat_room = ChatRoom.objects.select_related(*CHAT_ROOM_CONTEXT_RELATED).get(id=chat_id)
+            entry = store_chat_context(chat_room)
         
         # التحقق من أن المستخدم مشارك في المحادثة
-        if not chat_room.can_user_access(request.user):
+        if request.user.id not in entry['participant_ids']:
             return Response(
                 {'error': 'غير مسموح لك بالوصول لهذه المحادثة'}, 
                 status=status.HTTP_403_FORBIDDEN
             )
         
         # إرجاع السياق الكامل للمحادثة
-        context_serializer = ChatContextSerializer(chat_room, context={'request': request})
-        return Response(context_serializer.data)
+        return Response(entry['data'])
         
     except ChatRoom.DoesNotExist:
         return Response(
@@ -1231,38 +1416,38 @@ def upload_chat_image(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # حفظ الصورة
+        # حفظ الصورة بعنوان مبني على المحتوى (نفس الصورة تُخزن مرة واحدة)
         import os
         from django.conf import settings
         
-        # إنشاء مجلد للصور إذا لم يكن موجود
-        upload_dir = os.path.join(settings.MEDIA_ROOT, 'chat_images')
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # إنشاء اسم فريد للملف
-        import uuid
-        file_extension = os.path.splitext(image_file.name)[1]
-        unique_filename = f"{uuid.uuid4().hex}{file_extension}"
-        
-        # حفظ الملف
-        file_path = os.path.join(upload_dir, unique_filename)
-        with open(file_path, 'wb+') as destination:
-            for chunk in image_file.chunks():
-                destination.write(chunk)
+        try:
+            image_name = store_chat_image(image_file)
+        except ValueError as exc:
+            logger.warning(f"Rejected chat image: {exc}")
+            return Response(
+                {'error': 'يجب أن يكون الملف صورة'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        logger.info(f"Image saved successfully: {file_path}")
+        logger.info(f"Image saved successfully: {image_name}")
         
         # إرجاع URL الصورة (relative path فقط)
-        image_url = f"/media/chat_images/{unique_filename}"
+        image_url = f"{settings.MEDIA_URL}{image_name}"
         
         logger.info(f"Image URL generated: {image_url}")
         
+        # إنشاء المشتقات (thumb/card/full) لعرض الصورة المصغرة في المحادثة
+        generate_derivatives(image_name)
+        
         return Response({
             'success': True,
             'image_url': image_url,
-            'filename': unique_filename
+            'image_variants': derivative_urls(image_name),
+            'filename': os.path.basename(image_name)
         })
         
+    except UploadTooLarge:
+        raise
     except Exception as e:
         logger.error(f"Error uploading chat image: {str(e)}")
         return Response(
@@ -1271,6 +1456,62 @@ def upload_chat_image(request):
         )
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def create_upload_session(request):
+    """إنشاء جلسة رفع مباشر: يحصل التطبيق على رابط PUT موقّع ويرفع الملف إلى التخزين مباشرة"""
+    if not object_storage.is_configured():
+        return Response(
+            {'error': 'الرفع المباشر غير متاح حالياً'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+    serializer = UploadSessionCreateSerializer(data=request.data, context={'request': request})
+    serializer.is_valid(raise_exception=True)
+    session = serializer.save()
+
+    upload_url, headers = object_storage.presigned_put(
+        session.key,
+        session.content_type,
+        session.size,
+        expires_in=settings.DIRECT_UPLOAD_EXPIRES_SECONDS,
+    )
+    data = UploadSessionSerializer(session).data
+    data.update({'upload_url': upload_url, 'method': 'PUT', 'headers': headers})
+    return Response(data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def complete_upload_session(request, upload_id):
+    """إكمال جلسة الرفع: التحقق من الملف في التخزين وربطه بالحيوان"""
+    session = get_object_or_404(UploadSession, public_id=upload_id, user=request.user)
+    url = object_storage.public_url(session.key)
+
+    if session.status != 'completed':
+        if session.is_expired:
+            return Response({'error': 'انتهت صلاحية جلسة الرفع'}, status=status.HTTP_410_GONE)
+
+        metadata = object_storage.head(session.key)
+        if metadata is None:
+            return Response({'error': 'لم يتم رفع الملف بعد'}, status=status.HTTP_409_CONFLICT)
+        if metadata['size'] != session.size:
+            return Response({'error': 'حجم الملف المرفوع غير مطابق'}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            if session.pet_id and session.field_name:
+                pet = Pet.objects.select_for_update().get(pk=session.pet_id)
+                setattr(pet, session.field_name, url)
+                pet.save(update_fields=[session.field_name, 'updated_at'])
+            session.status = 'completed'
+            session.completed_at = timezone.now()
+            session.save(update_fields=['status', 'completed_at'])
+
+    data = UploadSessionSerializer(session).data
+    data['url'] = url
+    return Response(data)
+
+
 # Adoption Views
 class AdoptionRequestListCreateView(generics.ListCreateAPIView):
     """قائمة وإنشاء طلبات التبني"""
@@ -1313,7 +1554,7 @@ class MyAdoptionRequestsView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return AdoptionRequest.objects.filter(adopter=self.request.user)
+        return AdoptionRequest.objects.filter(adopter=self.request.user).select_related(*ADOPTION_REQUEST_RELATED)
 
 
 class ReceivedAdoptionRequestsView(generics.ListAPIView):
@@ -1322,7 +1563,7 @@ class ReceivedAdoptionRequestsView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return AdoptionRequest.objects.filter(pet__owner=self.request.user)
+        return AdoptionRequest.objects.filter(pet__owner=self.request.user).select_related(*ADOPTION_REQUEST_RELATED)
 
 
 @api_view(['POST'])
@@ -1433,6 +1674,10 @@ def adoption_pets(request):
     if location:
         pets = pets.filter(location__icontains=location)
     
+    search_query = (request.GET.get('q') or '').strip()
+    if search_query:
+        pets = search_pets(pets, search_query)
+    
     # الحصول على موقع المستخدم للترتيب حسب المسافة
     user_lat = request.GET.get('user_lat')
     user_lng = request.GET.get('user_lng')
@@ -1453,7 +1698,7 @@ def adoption_pets(request):
     
     # ترتيب افتراضي: الأحدث أولاً
     if not (user_lat and user_lng):
-        pets = pets.order_by('-created_at')
+        pets = pets.order_by('-search_rank', '-created_at') if search_query else pets.order_by('-created_at')
         print(f"🔍 Django: Sorted {len(pets)} pets by creation date")
     
     # إضافة موقع المستخدم للـ context
@@ -1479,28 +1724,7 @@ def adoption_pets(request):
 @permission_classes([IsAuthenticated])
 def adoption_stats(request):
     """إحصائيات التبني"""
-    total_available = Pet.objects.filter(status='available_for_adoption').count()
-    total_pending = Pet.objects.filter(status='adoption_pending').count()
-    total_adopted = Pet.objects.filter(status='adopted').count()
-    
-    my_requests = AdoptionRequest.objects.filter(adopter=request.user).count()
-    my_pending_requests = AdoptionRequest.objects.filter(
-        adopter=request.user,
-        status='pending'
-    ).count()
-    
-    received_requests = AdoptionRequest.objects.filter(
-        pet__owner=request.user
-    ).count()
-    
-    return Response({
-        'total_available_for_adoption': total_available,
-        'total_adoption_pending': total_pending,
-        'total_adopted': total_adopted,
-        'my_adoption_requests': my_requests,
-        'my_pending_requests': my_pending_requests,
-        'received_requests': received_requests
-    })
+    return Response(adoption_stats_payload(request.user))
 
 
 @api_view(['DELETE'])